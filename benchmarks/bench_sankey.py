@@ -0,0 +1,94 @@
+"""
+Benchmark: Butterfly Sankey voor de hele school, oude vs. gevectoriseerde opbouw.
+
+De oude versie (explode op de tagtekst + iterrows over de links) staat hieronder als
+referentie; tests/test_charts.py controleert dat beide exact dezelfde nodes en links
+geven. Dit script meet enkel de tijd per aantal registraties.
+
+    python benchmarks/bench_sankey.py [aantal_rijen ...]
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from charts import draw_sankey_butterfly  # noqa: E402
+from tags import NEG_MOODS, POS_MOODS, with_tag_mask  # noqa: E402
+
+KLASSEN = [f"{graad}{letter}" for graad in range(1, 7) for letter in "ABCDE"]
+
+
+def referentie_links(df):
+    """De oorspronkelijke implementatie (tot en met de node- en linklijsten)."""
+    def clean_labels(df, kolom):
+        temp = df.copy()
+        temp[kolom] = temp[kolom].astype(str).str.split(',')
+        temp = temp.explode(kolom)
+        temp[kolom] = temp[kolom].str.strip()
+        return temp[(temp[kolom] != 'nan') & (temp[kolom] != '')]
+
+    df_pos = clean_labels(df, 'Positief')
+    df_neg = clean_labels(df, 'Negatief')
+    counts_pos = df_pos.groupby(['Klas', 'Positief']).size().reset_index(name='Aantal')
+    counts_neg = df_neg.groupby(['Negatief', 'Klas']).size().reset_index(name='Aantal')
+    klassen_uniek = sorted(list(df['Klas'].unique()))
+
+    neg_uniek = sorted(list(counts_neg['Negatief'].unique()))
+    pos_uniek = sorted(list(counts_pos['Positief'].unique()))
+    all_nodes = neg_uniek + klassen_uniek + pos_uniek
+    node_map = {name: i for i, name in enumerate(all_nodes)}
+
+    sources, targets, values = [], [], []
+    for _, row in counts_neg.iterrows():
+        sources.append(node_map[row['Negatief']])
+        targets.append(node_map[row['Klas']])
+        values.append(row['Aantal'])
+    for _, row in counts_pos.iterrows():
+        sources.append(node_map[row['Klas']])
+        targets.append(node_map[row['Positief']])
+        values.append(row['Aantal'])
+    return [f" {n} " for n in all_nodes], sources, targets, values
+
+
+def referentie_figuur(df):
+    """Oude links + dezelfde go.Sankey-opbouw, zodat beide kolommen een volledige figuur meten."""
+    labels, sources, targets, values = referentie_links(df)
+    return go.Figure(data=[go.Sankey(node=dict(label=labels), link=dict(source=sources, target=targets, value=values))])
+
+
+def synthetische_lessen(n, seed=42):
+    rnd = random.Random(seed)
+    return pd.DataFrame({
+        "Klas": [rnd.choice(KLASSEN) for _ in range(n)],
+        "Positief": [", ".join(rnd.sample(POS_MOODS, rnd.randint(0, 3))) for _ in range(n)],
+        "Negatief": [", ".join(rnd.sample(NEG_MOODS, rnd.randint(0, 2))) for _ in range(n)],
+    })
+
+
+def meet(fn, *args, herhalingen=3):
+    beste = float("inf")
+    for _ in range(herhalingen):
+        start = time.perf_counter()
+        fn(*args)
+        beste = min(beste, time.perf_counter() - start)
+    return beste
+
+
+def main(groottes):
+    print(f"{'rijen':>9} | {'oud':>10} | {'nieuw':>10} | {'nieuw + masker':>15} | {'factor':>6}")
+    for n in groottes:
+        df = synthetische_lessen(n)
+        gecodeerd = with_tag_mask(df)
+        oud = meet(referentie_figuur, df)
+        nieuw = meet(draw_sankey_butterfly, gecodeerd)
+        met_masker = meet(lambda d: draw_sankey_butterfly(with_tag_mask(d)), df)
+        print(f"{n:>9} | {oud * 1000:>7.1f} ms | {nieuw * 1000:>7.1f} ms | {met_masker * 1000:>12.1f} ms | {oud / nieuw:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000, 500_000])
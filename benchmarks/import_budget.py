@@ -0,0 +1,145 @@
+"""
+Importbudget: wat laadt elke pagina bij een koude start, en hoe lang duurt de eerste run?
+
+Per scenario start een vers Python-proces (zoals na een slaapstand op Streamlit
+Cloud) dat de app één keer draait met AppTest tegen de nep-Sheets (fakesheets.py):
+
+    login     de loginpagina, nog niemand ingelogd
+    teacher   het eerste scherm van een leerkracht: het daggevoel (auto-login via ?user=)
+    director  het eerste scherm van de directie
+
+Per scenario controleren we twee dingen:
+- geen zware modules die die pagina niet nodig heeft (VERBODEN hieronder);
+- import van streamlit + de eerste run blijft onder het budget in ms.
+
+    python benchmarks/import_budget.py [--budget login=1500] [--importtime] [--json pad]
+
+Stopt met code 1 als een scenario een verboden module laadt of over budget gaat.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reflectietool.py")
+sys.path.insert(0, os.path.dirname(APP))
+
+ZWAAR = ["plotly.express", "streamlit_gsheets", "matplotlib", "seaborn", "reportlab", "wordcloud"]
+VERBODEN = {
+    "login": ZWAAR,
+    # Enkel het open tabblad rendert; grafieken en wolken laden pas in Visualisaties
+    "teacher": ZWAAR,
+    "director": ["streamlit_gsheets", "matplotlib", "seaborn", "reportlab", "wordcloud"],
+}
+GEBRUIKER = {"login": None, "teacher": "leerkracht001@school.test", "director": "directeur@school.test"}
+# Koude start (import streamlit + eerste run) in ms, ~1.5x wat we nu meten
+BUDGET = {"login": 1300, "teacher": 1400, "director": 2000}
+
+
+def kind(scenario):
+    """Draait in het kindproces: één koude run, resultaat als JSON op stdout."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import_s = time.perf_counter() - start
+
+    at = AppTest.from_file(APP, default_timeout=300)
+    if GEBRUIKER[scenario]:
+        at.query_params["user"] = GEBRUIKER[scenario]
+    at.run()
+    koud_s = time.perf_counter() - start
+    fout = at.exception[0].value if at.exception else None
+
+    start_warm = time.perf_counter()
+    at.run()
+    warm_s = time.perf_counter() - start_warm
+
+    geladen = [m for m in ZWAAR if m in sys.modules]
+    print(json.dumps({"scenario": scenario, "import_streamlit_ms": round(import_s * 1000),
+                      "koud_ms": round(koud_s * 1000), "warm_ms": round(warm_s * 1000),
+                      "geladen": geladen, "fout": fout}))
+
+
+def traagste_imports(stderr, n=8):
+    """Top-n imports op cumulatieve tijd uit de uitvoer van python -X importtime."""
+    rijen = []
+    for regel in stderr.splitlines():
+        if not regel.startswith("import time:") or "|" not in regel:
+            continue
+        _, cumulatief, naam = regel[len("import time:"):].split("|")
+        if cumulatief.strip().isdigit() and not naam.startswith("  "):
+            rijen.append((int(cumulatief) / 1000, naam.strip()))
+    return sorted(rijen, reverse=True)[:n]
+
+
+def meet(scenario, importtime=False):
+    with tempfile.TemporaryDirectory() as map_:
+        omgeving = dict(os.environ, LKM_STORAGE="sheets", LKM_SHEETS_MODE="fake", LKM_FAKE_DATASET="klein",
+                        LKM_FAKE_LATENCY="0", LKM_TIMING_LOG="off")
+        cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [os.path.abspath(__file__),
+                                                                                  "--kind", scenario]
+        proces = subprocess.run(cmd, cwd=map_, env=omgeving, capture_output=True, text=True)
+    regels = [r for r in proces.stdout.splitlines() if r.startswith("{")]
+    if proces.returncode or not regels:
+        raise RuntimeError(f"scenario {scenario} faalde:\n{proces.stderr[-2000:]}")
+    resultaat = json.loads(regels[-1])
+    if importtime:
+        resultaat["traagste_imports"] = traagste_imports(proces.stderr)
+    return resultaat
+
+
+def controleer(resultaat, budget):
+    problemen = []
+    scenario = resultaat["scenario"]
+    if resultaat["fout"]:
+        problemen.append(f"{scenario}: fout in de app: {resultaat['fout']}")
+    for module in resultaat["geladen"]:
+        if module in VERBODEN[scenario]:
+            problemen.append(f"{scenario}: laadt {module}")
+    if resultaat["koud_ms"] > budget[scenario]:
+        problemen.append(f"{scenario}: koude start {resultaat['koud_ms']} ms > budget {budget[scenario]} ms")
+    return problemen
+
+
+def main(opties):
+    budget = dict(BUDGET)
+    for b in opties.budget:
+        scenario, ms = b.split("=")
+        budget[scenario] = int(ms)
+
+    resultaten, problemen = [], []
+    print(f"{'scenario':<9} | {'import st':>9} | {'koud':>8} | {'budget':>8} | {'warm':>7} | zware modules")
+    for scenario in opties.scenario or list(GEBRUIKER):
+        r = meet(scenario, opties.importtime)
+        resultaten.append(r)
+        problemen += controleer(r, budget)
+        print(f"{scenario:<9} | {r['import_streamlit_ms']:>6} ms | {r['koud_ms']:>5} ms | {budget[scenario]:>5} ms | "
+              f"{r['warm_ms']:>4} ms | {', '.join(r['geladen']) or '-'}")
+        for ms, naam in r.get("traagste_imports", []):
+            print(f"{'':<12}{ms:>8.0f} ms  {naam}")
+
+    if opties.json:
+        with open(opties.json, "w", encoding="utf-8") as f:
+            json.dump({"budget": budget, "resultaten": resultaten}, f, indent=2)
+    for p in problemen:
+        print(f"BUDGET {p}")
+    return 1 if problemen else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenario", nargs="*", help=f"een of meer van {', '.join(GEBRUIKER)} (standaard: alle)")
+    parser.add_argument("--budget", action="append", default=[], metavar="SCENARIO=MS")
+    parser.add_argument("--importtime", action="store_true", help="toon de traagste imports per scenario")
+    parser.add_argument("--json", help="resultaat ook als JSON wegschrijven")
+    parser.add_argument("--kind", help=argparse.SUPPRESS)
+    opties = parser.parse_args()
+    if opties.kind:
+        kind(opties.kind)
+        sys.exit(0)
+    for scenario in opties.scenario:
+        if scenario not in GEBRUIKER:
+            parser.error(f"onbekend scenario {scenario!r}")
+    sys.exit(main(opties))
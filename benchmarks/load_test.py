@@ -0,0 +1,423 @@
+"""
+Load-test: meerdere leerkrachten en directieleden tegelijk op één app-proces.
+
+Elke virtuele gebruiker is een Streamlit AppTest in een eigen thread (zoals de
+sessies op één server) tegen de nep-Sheets uit fakesheets.py. Leerkrachten loggen
+in, registreren daggevoel en een les, wisselen de periode in Visualisaties en maken
+soms een PDF; directieleden zetten klassen aan/uit en wisselen periodes. Een deel
+van de leerkrachten maakt eerst een nieuw account aan (lezen-aanpassen-schrijven op
+Users, waar updates verloren kunnen gaan).
+
+Rapport: p50/p95 van de rerun-tijd per rol en tab, piek-RSS van het proces, en de
+schrijfconflicten (registraties die niet in de sheet belandden, quota-fouten).
+
+    python benchmarks/load_test.py --teachers 20 --directors 2 --duration 60 \\
+        --dataset school --latency 0.05-0.3 --json resultaat.json
+
+Met --baseline vorige.json stopt het script met code 1 als een p95 meer dan
+--max-regression (standaard 25%) trager is dan in de baseline.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reflectietool.py")
+sys.path.insert(0, os.path.dirname(APP))
+
+WACHTWOORD = "test"
+
+
+class Meting:
+    """Verzamelt (rol, tab) -> duur; thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.duur = defaultdict(list)
+        self.fouten = defaultdict(int)
+        self.eerste_fout = {}
+        self.teller = defaultdict(int)
+
+    def stap(self, rol, tab, at, actie):
+        start = time.perf_counter()
+        fout = None
+        try:
+            actie()
+            at.run()
+            if at.exception:
+                fout = at.exception[0].value
+        except Exception as e:
+            # Widget niet gevonden e.d.: de pagina zag er anders uit dan verwacht
+            fout = f"{type(e).__name__}: {e}"
+        duur = time.perf_counter() - start
+        with self._lock:
+            self.duur[(rol, tab)].append(duur)
+            if fout is not None:
+                self.fouten[(rol, tab)] += 1
+                self.eerste_fout.setdefault((rol, tab), str(fout)[:200])
+        return fout is None
+
+    def tel(self, wat, n=1):
+        with self._lock:
+            self.teller[wat] += n
+
+
+def _zoek(widgets, soort, label):
+    for w in widgets:
+        if w.label == label:
+            return w
+    raise LookupError(f"{soort} '{label}' niet op de pagina")
+
+
+def _knop(at, label):
+    return _zoek(at.button, "knop", label)
+
+
+def _tekst(at, label):
+    return _zoek(at.text_input, "tekstveld", label)
+
+
+def _succes(at, begin):
+    return any(s.value.startswith(begin) for s in at.success)
+
+
+def parallelle_apptests():
+    """
+    AppTest zet bij elke run een eigen (mock) Runtime als singleton en wist die op het
+    einde. Met sessies in parallelle threads wist de ene run zo de runtime van een andere
+    die nog bezig is ("Runtime hasn't been created!"). Val daarom terug op de laatst
+    gezette runtime; de app zelf merkt daar niets van.
+
+    Idem voor de config: elke run patcht get_option (global.appTest) en zet bij het
+    einde de vorige terug, waardoor een andere run halverwege zonder testmodus kan
+    vallen. Met een blijvende override komt elke run weer bij dezelfde uit.
+
+    En AppTest maakt per run een nieuwe ScriptCache, dus compileert elke run het script
+    opnieuw. Dat meet iets wat de echte server niet doet (die compileert één keer), en
+    gelijktijdig compileren struikelt over ast.parse, dat in Python 3.11 niet thread-safe
+    is ("AST constructor recursion depth mismatch"). Alle sessies delen er dus één.
+    """
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    gedeelde_cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: gedeelde_cache
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    laatste = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            laatste[:] = [cls._instance]
+            return cls._instance
+        if laatste:
+            return laatste[0]
+        raise RuntimeError("Runtime hasn't been created!")
+
+    def exists(cls):
+        return cls._instance is not None or bool(laatste)
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+
+
+def nieuwe_sessie():
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.run()
+    return at
+
+
+def inloggen(meting, rol, at, email):
+    def actie():
+        _tekst(at, "E-mail").input(email)
+        at.text_input(key="login_password").input(WACHTWOORD)
+        _knop(at, "Inloggen").click()
+    return meting.stap(rol, "Inloggen", at, actie)
+
+
+def registreren(meting, at, email):
+    def actie():
+        _tekst(at, "School-e-mail").input(email)
+        at.text_input(key="reg_password").input(WACHTWOORD)
+        _knop(at, "Account aanmaken").click()
+    meting.stap("leerkracht", "Registreren", at, actie)
+    if _succes(at, "Account aangemaakt"):
+        meting.tel("users_aangemaakt")
+
+
+TABS = {"Daggevoel": "🧠 Daggevoel", "Lesregistratie": "📝 Lesregistratie",
+        "Visualisaties": "📊 Visualisaties", "Rapport": "📄 rapport genereren"}
+
+
+def tabblad(at, tab):
+    """
+    Open tabblad van de leerkracht (st.tabs met key): AppTest kan niet op een tab
+    klikken en stuurt de tabstatus ook niet terug, dus zetten we ze voor elke run.
+    """
+    at.session_state["teacher_tab"] = TABS[tab]
+
+
+def leerkracht(meting, email, einde, opties, rnd):
+    at = nieuwe_sessie()
+    if rnd.random() < opties.nieuw:
+        email = f"nieuw.{email}"
+        registreren(meting, at, email)
+    if not inloggen(meting, "leerkracht", at, email) or "user" not in at.session_state:
+        meting.tel("login_mislukt")
+        return
+    while True:
+        # Enkel het open tabblad rendert: eerst het tabblad openen (een rerun), dan de actie
+        meting.stap("leerkracht", "Daggevoel", at, lambda: tabblad(at, "Daggevoel"))
+
+        def dag():
+            tabblad(at, "Daggevoel")
+            at.select_slider[0].set_value(rnd.randint(1, 5))
+            _knop(at, "Opslaan").click()
+        meting.stap("leerkracht", "Daggevoel", at, dag)
+        if _succes(at, "Geregistreerd!"):
+            meting.tel("dag_verstuurd")
+        time.sleep(rnd.uniform(*opties.think))
+
+        meting.stap("leerkracht", "Lesregistratie", at, lambda: tabblad(at, "Lesregistratie"))
+
+        def les():
+            tabblad(at, "Lesregistratie")
+            for m in rnd.sample(["Actief", "Gefocust", "Veilig"], 2):
+                at.checkbox(key=f"p_{m}").check()
+            _knop(at, "Les opslaan").click()
+        meting.stap("leerkracht", "Lesregistratie", at, les)
+        if _succes(at, "Les in "):
+            meting.tel("les_verstuurd")
+        time.sleep(rnd.uniform(*opties.think))
+
+        meting.stap("leerkracht", "Visualisaties", at, lambda: tabblad(at, "Visualisaties"))
+        periode = rnd.choice(["Volledig Schooljaar", "Afgelopen Maand", "Afgelopen 2 Weken"])
+
+        def visualisaties():
+            tabblad(at, "Visualisaties")
+            at.selectbox(key="tab3_filter_periode").set_value(periode)
+        meting.stap("leerkracht", "Visualisaties", at, visualisaties)
+        time.sleep(rnd.uniform(*opties.think))
+
+        if rnd.random() < opties.pdf:
+            meting.stap("leerkracht", "Rapport", at, lambda: tabblad(at, "Rapport"))
+            knoppen = [b for b in at.button if "Rapport genereren" in b.label]
+            if knoppen:
+                def rapport():
+                    tabblad(at, "Rapport")
+                    knoppen[0].click()
+                meting.stap("leerkracht", "Rapport", at, rapport)
+                if at.get("download_button"):
+                    meting.tel("pdf")
+            time.sleep(rnd.uniform(*opties.think))
+        if time.monotonic() > einde:
+            return
+
+
+def directie(meting, email, einde, opties, rnd):
+    at = nieuwe_sessie()
+    if not inloggen(meting, "directie", at, email) or "user" not in at.session_state:
+        meting.tel("login_mislukt")
+        return
+    while True:
+        klassen = [c for c in at.checkbox if c.key and c.key.startswith("t1_chk_")]
+        if klassen:
+            vak = rnd.choice(klassen)
+            meting.stap("directie", "Statistieken", at, vak.uncheck if vak.value else vak.check)
+            time.sleep(rnd.uniform(*opties.think))
+        periode = rnd.choice(["Volledig schooljaar", "Afgelopen maand", "Afgelopen 2 weken"])
+        meting.stap("directie", "Statistieken", at, lambda: at.radio(key="t1_per").set_value(periode))
+        time.sleep(rnd.uniform(*opties.think))
+        welzijn = rnd.choice(["Afgelopen maand", "Afgelopen 3 maanden", "Volledig schooljaar"])
+        meting.stap("directie", "Welzijn", at, lambda: at.selectbox(key="w_filt").set_value(welzijn))
+        time.sleep(rnd.uniform(*opties.think))
+        cultuur = rnd.choice(["Volledig schooljaar", "Afgelopen maand"])
+        meting.stap("directie", "Cultuur", at, lambda: at.radio(key="s_p_rad").set_value(cultuur))
+        time.sleep(rnd.uniform(*opties.think))
+        if time.monotonic() > einde:
+            return
+
+
+class RssMonitor(threading.Thread):
+    """Piek van het resident geheugen (MB), elke 0.2s gemeten."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.piek = self.huidig()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def huidig():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+        except OSError:
+            # Geen /proc: ru_maxrss (KB op Linux, bytes op macOS)
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+    def run(self):
+        while not self._stop.wait(0.2):
+            self.piek = max(self.piek, self.huidig())
+
+    def stop(self):
+        self._stop.set()
+        self.piek = max(self.piek, self.huidig())
+
+
+def _rijen(conn):
+    from storage import WS_DAG, WS_LESSEN, WS_USERS, SheetsStore
+    return {ws: len(conn.worksheet_frame(SheetsStore.TABBLADEN[ws])) for ws in (WS_USERS, WS_DAG, WS_LESSEN)}
+
+
+def main(opties):
+    os.chdir(tempfile.mkdtemp(prefix="lkm-load-"))
+    os.environ.update(LKM_STORAGE="sheets", LKM_SHEETS_MODE="fake", LKM_FAKE_DATASET=opties.dataset,
+                      LKM_FAKE_LATENCY=opties.latency, LKM_FAKE_QUOTA=str(opties.quota),
+                      LKM_FAKE_ERROR_RATE=str(opties.error_rate), LKM_FAKE_SEED=str(opties.seed))
+    # Eén JSON-regel per rerun is hier ruis; LKM_TIMING_LOG=<pad> bewaart ze wel
+    os.environ.setdefault("LKM_TIMING_LOG", "off")
+    from fakesheets import DATASETS, active_connections
+    from storage import WS_DAG, WS_LESSEN, WS_USERS
+
+    parallelle_apptests()
+    rss = RssMonitor()
+    rss.start()
+    meting = Meting()
+
+    # Opwarmen: de eerste sessie bouwt de gedeelde caches (niet in de percentielen)
+    start = time.perf_counter()
+    at = nieuwe_sessie()
+    inloggen(Meting(), "directie", at, "directeur@school.test")
+    opstart = time.perf_counter() - start
+    conn = active_connections()[-1]
+    voor = _rijen(conn)
+    stats_voor = dict(conn.stats)
+
+    n_leerkrachten = (DATASETS[opties.dataset] or {}).get("leerkrachten", 0)
+    einde = time.monotonic() + opties.duration
+    threads = []
+    for i in range(opties.teachers):
+        email = f"leerkracht{i % max(n_leerkrachten, 1) + 1:03d}@school.test"
+        threads.append(threading.Thread(target=leerkracht, args=(meting, email, einde, opties,
+                                                                   random.Random(opties.seed + i))))
+    for i in range(opties.directors):
+        threads.append(threading.Thread(target=directie, args=(meting, "directeur@school.test", einde, opties,
+                                                                 random.Random(opties.seed + 1000 + i))))
+    for t in threads:
+        t.start()
+        time.sleep(opties.ramp / max(len(threads), 1))
+    for t in threads:
+        t.join()
+
+    # Schrijfwachtrij laten leeglopen tot de sheet niet meer verandert
+    na, stil = _rijen(conn), 0
+    while stil < 3:
+        time.sleep(1.0)
+        nieuw = _rijen(conn)
+        stil = stil + 1 if nieuw == na else 0
+        na = nieuw
+    rss.stop()
+
+    verwacht = {WS_USERS: meting.teller["users_aangemaakt"], WS_DAG: meting.teller["dag_verstuurd"],
+                WS_LESSEN: meting.teller["les_verstuurd"]}
+    resultaat = {
+        "config": {k: v for k, v in vars(opties).items() if k not in ("json", "baseline")},
+        "opstart_s": round(opstart, 3),
+        "piek_rss_mb": round(rss.piek, 1),
+        "tabs": {},
+        "schrijven": {
+            ws: {"verstuurd": verwacht[ws], "in_sheet": na[ws] - voor[ws],
+                 "verloren": verwacht[ws] - (na[ws] - voor[ws])}
+            for ws in verwacht
+        },
+        "sheets_oproepen": {k: conn.stats[k] - stats_voor.get(k, 0) for k in conn.stats},
+        "tellers": dict(meting.teller),
+    }
+    for (rol, tab), duur in sorted(meting.duur.items()):
+        d = np.asarray(duur) * 1000
+        resultaat["tabs"][f"{rol}/{tab}"] = {
+            "n": len(d), "p50_ms": round(float(np.percentile(d, 50)), 1),
+            "p95_ms": round(float(np.percentile(d, 95)), 1), "max_ms": round(float(d.max()), 1),
+            "fouten": meting.fouten[(rol, tab)],
+            "eerste_fout": meting.eerste_fout.get((rol, tab)),
+        }
+    return resultaat
+
+
+def toon(resultaat):
+    c = resultaat["config"]
+    print(f"\n{c['teachers']} leerkrachten + {c['directors']} directie, {c['duration']}s, "
+          f"dataset '{c['dataset']}', latency {c['latency']}s, quota {c['quota'] or '-'}/min")
+    print(f"Opstart (eerste sessie): {resultaat['opstart_s']:.2f}s   Piek-RSS: {resultaat['piek_rss_mb']:.0f} MB\n")
+    print(f"{'rol/tab':<28} | {'n':>5} | {'p50':>9} | {'p95':>9} | {'max':>9} | {'fouten':>6}")
+    for naam, r in resultaat["tabs"].items():
+        print(f"{naam:<28} | {r['n']:>5} | {r['p50_ms']:>6.0f} ms | {r['p95_ms']:>6.0f} ms | "
+              f"{r['max_ms']:>6.0f} ms | {r['fouten']:>6}")
+    for naam, r in resultaat["tabs"].items():
+        if r["eerste_fout"]:
+            print(f"  {naam}: {r['eerste_fout']}")
+    print("\nSchrijven:")
+    for ws, r in resultaat["schrijven"].items():
+        print(f"  {ws:<10} verstuurd {r['verstuurd']:>5}  in sheet {r['in_sheet']:>5}  verloren {r['verloren']:>4}")
+    oproepen = resultaat["sheets_oproepen"]
+    print(f"Sheets-oproepen: {oproepen['read']} read, {oproepen['update']} update, {oproepen['append']} append, "
+          f"{oproepen['quota']} quota-fouten, {oproepen['error']} andere fouten")
+
+
+def vergelijk(resultaat, baseline, max_regressie):
+    """Lijst van (tab, oud, nieuw) waar p95 meer dan max_regressie trager werd."""
+    slechter = []
+    for naam, r in resultaat["tabs"].items():
+        oud = baseline.get("tabs", {}).get(naam)
+        if oud and r["p95_ms"] > oud["p95_ms"] * (1 + max_regressie):
+            slechter.append((naam, oud["p95_ms"], r["p95_ms"]))
+    return slechter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--teachers", type=int, default=10)
+    parser.add_argument("--directors", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=30, help="seconden na de laatste start")
+    parser.add_argument("--ramp", type=float, default=5, help="seconden om alle gebruikers te starten")
+    parser.add_argument("--dataset", default="klein")
+    parser.add_argument("--latency", default="0.05-0.3", help="seconden per Sheets-oproep, vast of 'min-max'")
+    parser.add_argument("--quota", type=int, default=0, help="Sheets-oproepen per minuut (0 = onbeperkt)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--think", type=float, nargs=2, default=(0.5, 2.0), help="denktijd tussen stappen (min max)")
+    parser.add_argument("--pdf", type=float, default=0.2, help="kans op een PDF per ronde")
+    parser.add_argument("--nieuw", type=float, default=0.1, help="fractie leerkrachten die eerst registreert")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="resultaat ook als JSON wegschrijven")
+    parser.add_argument("--baseline", help="JSON van een vorige run om p95 mee te vergelijken")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    opties = parser.parse_args()
+    opties.think = tuple(opties.think)
+    # main() werkt in een tijdelijke map
+    opties.json = os.path.abspath(opties.json) if opties.json else None
+    opties.baseline = os.path.abspath(opties.baseline) if opties.baseline else None
+
+    resultaat = main(opties)
+    toon(resultaat)
+    if opties.json:
+        with open(opties.json, "w", encoding="utf-8") as f:
+            json.dump(resultaat, f, indent=2)
+    if opties.baseline:
+        with open(opties.baseline, encoding="utf-8") as f:
+            slechter = vergelijk(resultaat, json.load(f), opties.max_regression)
+        for naam, oud, nieuw in slechter:
+            print(f"REGRESSIE {naam}: p95 {oud:.0f} ms -> {nieuw:.0f} ms")
+        sys.exit(1 if slechter else 0)
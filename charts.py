@@ -0,0 +1,438 @@
+"""
+Grafieken voor de app en de PDF-rapporten.
+Pure functies (geen Streamlit), zodat ook achtergrond- en worker-processen ze kunnen oproepen
+en de app de figuren kan hergebruiken zolang data en filters gelijk blijven (figure_cache.py).
+"""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from tags import bit_layout, tag_count_matrix
+
+NIVEAUS = np.arange(1, 6)
+
+
+def score_histograms(df, kolom, groep="Klas"):
+    """Per groep het aantal lessen met score 1..5 (één groupby; kolommen 1-5)."""
+    scores = pd.to_numeric(df[kolom], errors="coerce").round()
+    geldig = scores.between(1, 5)
+    tellingen = df[geldig].groupby([df.loc[geldig, groep].astype(str), scores[geldig].astype(int)]).size()
+    return tellingen.unstack(fill_value=0).reindex(columns=NIVEAUS, fill_value=0)
+
+
+def histogram_density(counts, punten=81):
+    """
+    Gladde dichtheid (0-1) over 0.5-5.5 uit een histogram van scores 1-5: een Gauss-KDE
+    met Silverman-bandbreedte, zoals go.Violin die anders in de browser over alle
+    registraties berekent. Geeft (x, y) enkel waar de dichtheid zichtbaar is.
+    """
+    counts = np.asarray(counts, dtype=float)
+    n = counts.sum()
+    x = np.linspace(0.5, 5.5, punten)
+    if n <= 0:
+        return x[:0], x[:0]
+    gem = (counts * NIVEAUS).sum() / n
+    std = np.sqrt((counts * (NIVEAUS - gem) ** 2).sum() / max(n - 1, 1))
+    cum = np.cumsum(counts) / n
+    iqr = NIVEAUS[np.searchsorted(cum, 0.75)] - NIVEAUS[np.searchsorted(cum, 0.25)]
+    spreiding = min(std, iqr / 1.349) if iqr > 0 else std
+    bandbreedte = max(1.059 * spreiding * n ** -0.2, 0.15) if spreiding > 0 else 0.3
+
+    y = (counts[:, None] * np.exp(-0.5 * ((x[None, :] - NIVEAUS[:, None]) / bandbreedte) ** 2)).sum(axis=0)
+    y /= y.max()
+    zichtbaar = np.flatnonzero(y >= 0.005)
+    deel = slice(zichtbaar[0], zichtbaar[-1] + 1)
+    return x[deel], y[deel]
+
+
+def _density_polygon(counts, basis, hoogte, kant=1):
+    """Gesloten vorm (xs, ys) boven (kant=1) of onder (kant=-1) de basislijn."""
+    x, y = histogram_density(counts)
+    if not len(x):
+        return [], []
+    xs = np.concatenate([x, x[::-1]])
+    ys = np.concatenate([basis + kant * hoogte * y, np.full(len(x), float(basis))])
+    return xs.tolist(), ys.tolist()
+
+
+def draw_mirror_density(hist_boven, hist_onder, klassen, kleur_boven, kleur_onder,
+                        naam_boven, naam_onder, breedte=0.75, meanline=False):
+    """
+    Spiegel-'violin' per klas uit histogrammen (Klas x 1-5): boven de ene score,
+    onder de andere. Alle vormen van één kant zitten in één trace (gescheiden door
+    None), dus de grootte van de figuur hangt af van het aantal klassen, niet lessen.
+    """
+    fig = go.Figure()
+    for hist, kleur, naam, kant in ((hist_boven, kleur_boven, naam_boven, 1),
+                                   (hist_onder, kleur_onder, naam_onder, -1)):
+        xs, ys, mx, my = [], [], [], []
+        for i, klas in enumerate(klassen):
+            if klas not in hist.index:
+                continue
+            counts = hist.loc[klas].to_numpy()
+            px_, py_ = _density_polygon(counts, i, breedte / 2, kant)
+            if not px_:
+                continue
+            xs += px_ + [None]
+            ys += py_ + [None]
+            if meanline:
+                gem = (counts * NIVEAUS).sum() / counts.sum()
+                x, y = histogram_density(counts)
+                mx += [gem, gem, None]
+                my += [i, i + kant * breedte / 2 * float(np.interp(gem, x, y)), None]
+        fig.add_trace(go.Scatter(x=xs, y=ys, mode="lines", fill="toself", fillcolor=kleur,
+                                 line=dict(color=kleur, width=1), opacity=0.6, name=naam, hoverinfo="skip"))
+        if meanline and mx:
+            fig.add_trace(go.Scatter(x=mx, y=my, mode="lines", line=dict(color=kleur, width=2),
+                                     showlegend=False, hoverinfo="skip"))
+    fig.update_layout(yaxis=dict(tickvals=list(range(len(klassen))), ticktext=list(klassen),
+                                 range=[-0.6, len(klassen) - 0.4]))
+    return fig
+
+
+def draw_ridgeline_artistic(df, kolom, titel, basis_kleur_naam="Teal"):
+    """
+    Maakt een 'Joyplot' met overlappende 'bergen' en een gradiënt.
+    De bergen komen uit een histogram per klas (één groupby), niet uit de ruwe scores.
+    """
+    if df.empty: return None
+    
+    hist = score_histograms(df, kolom)
+    klassen = sorted(hist.index, reverse=True)
+    fig = go.Figure()
+
+    # Genereer een kleurenpalet op basis van het aantal klassen
+    # We pakken een spectrum (bijv. Teal of Sunset)
+    colors = px.colors.sample_colorscale(basis_kleur_naam, [n/(len(klassen)) for n in range(len(klassen))])
+
+    for i, klas in enumerate(klassen):
+        xs, ys = _density_polygon(hist.loc[klas].to_numpy(), i, 1.25)  # Breder = meer overlap = mooier effect
+        fig.add_trace(go.Scatter(
+            x=xs,
+            y=ys,
+            name=klas,
+            mode='lines',
+            fill='toself',
+            line=dict(color='white', width=1), # Witte rand maakt het 'clean'
+            fillcolor=colors[i], # Gradiënt kleur
+            opacity=0.8,
+            hoverinfo='skip'
+        ))
+
+    fig.update_layout(
+        title=dict(text=titel, font=dict(size=20, family="Arial", color="#333")),
+        xaxis_title=None,
+        yaxis_title=None,
+        showlegend=False,
+        height=120 + (len(klassen) * 40),
+        margin=dict(l=0, r=0, t=50, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(range=[0.5, 5.5], showgrid=False, zeroline=False, visible=True),
+        yaxis=dict(showgrid=False, showline=False, showticklabels=True,
+                   tickvals=list(range(len(klassen))), ticktext=klassen, zeroline=False)
+    )
+    return fig
+
+def draw_sankey_butterfly(df):
+    """
+    Creëert een Butterfly Sankey: Negatief (links) -> Klassen (midden) -> Positief (rechts).
+    """
+    if df.empty: return None
+
+    # 1. Data Voorbereiding: (klas x tag)-matrix via bincount over het tag-bitmasker
+    klassen_uniek, matrix = tag_count_matrix(df, 'Klas')
+    layout = bit_layout()
+    is_neg = np.array([kolom == 'Negatief' for kolom, _ in layout])
+    tag_namen = np.array([woord for _, woord in layout], dtype=object)
+
+    # Enkel tags die voorkomen, alfabetisch (zoals voorheen)
+    gebruikt = matrix.sum(axis=0) > 0
+    neg_bits = np.flatnonzero(is_neg & gebruikt)
+    pos_bits = np.flatnonzero(~is_neg & gebruikt)
+    neg_bits = neg_bits[np.argsort(tag_namen[neg_bits], kind='stable')]
+    pos_bits = pos_bits[np.argsort(tag_namen[pos_bits], kind='stable')]
+
+    n_neg, n_kl = len(neg_bits), len(klassen_uniek)
+    # Negatief -> Klas: rij = tag, kolom = klas
+    neg_t, neg_k = np.nonzero(matrix[:, neg_bits].T)
+    # Klas -> Positief
+    pos_k, pos_t = np.nonzero(matrix[:, pos_bits])
+
+    return _sankey_figure(
+        neg_uniek=list(tag_namen[neg_bits]), klassen_uniek=klassen_uniek, pos_uniek=list(tag_namen[pos_bits]),
+        neg_links=(neg_t, n_neg + neg_k, matrix[neg_k, neg_bits[neg_t]]),
+        pos_links=(n_neg + pos_k, n_neg + n_kl + pos_t, matrix[pos_k, pos_bits[pos_t]]),
+    )
+
+def draw_sankey_from_counts(counts_neg, counts_pos, klassen_uniek):
+    """
+    Tekent de Butterfly Sankey uit voorgetelde links.
+    counts_neg: kolommen Negatief, Klas, Aantal | counts_pos: kolommen Klas, Positief, Aantal
+    """
+    if not klassen_uniek: return None
+
+    # 2. Nodes bepalen (Negatief -> Klassen -> Positief)
+    neg_uniek = sorted(list(counts_neg['Negatief'].unique()))
+    pos_uniek = sorted(list(counts_pos['Positief'].unique()))
+    n_neg, n_kl = len(neg_uniek), len(klassen_uniek)
+
+    # 4. Links: categorische codes i.p.v. een lus over de rijen
+    def codes(kolom, categorieen):
+        return pd.Categorical(kolom, categories=categorieen).codes.astype(np.int64)
+
+    neg_src, neg_dst = codes(counts_neg['Negatief'], neg_uniek), codes(counts_neg['Klas'], klassen_uniek)
+    pos_src, pos_dst = codes(counts_pos['Klas'], klassen_uniek), codes(counts_pos['Positief'], pos_uniek)
+    neg_ok = neg_dst >= 0
+    pos_ok = pos_src >= 0
+
+    return _sankey_figure(
+        neg_uniek=neg_uniek, klassen_uniek=klassen_uniek, pos_uniek=pos_uniek,
+        neg_links=(neg_src[neg_ok], n_neg + neg_dst[neg_ok], counts_neg['Aantal'].to_numpy()[neg_ok]),
+        pos_links=(n_neg + pos_src[pos_ok], n_neg + n_kl + pos_dst[pos_ok], counts_pos['Aantal'].to_numpy()[pos_ok]),
+    )
+
+def _sankey_figure(neg_uniek, klassen_uniek, pos_uniek, neg_links, pos_links):
+    """
+    De figuur zelf. neg_links / pos_links: (sources, targets, values) als arrays met
+    node-indexen in de volgorde neg_uniek + klassen_uniek + pos_uniek.
+    """
+    all_nodes = list(neg_uniek) + list(klassen_uniek) + list(pos_uniek)
+
+    # 3. Kleuren voor de Nodes
+    # Roodachtig voor negatief, Grijs voor klassen, Groenachtig voor positief
+    node_colors = (["#ff7675"] * len(neg_uniek) + 
+                   ["#636e72"] * len(klassen_uniek) + 
+                   ["#55efc4"] * len(pos_uniek))
+
+    sources = np.concatenate([neg_links[0], pos_links[0]]).astype(int).tolist()
+    targets = np.concatenate([neg_links[1], pos_links[1]]).astype(int).tolist()
+    values = np.concatenate([neg_links[2], pos_links[2]]).astype(int).tolist()
+    link_colors = (["rgba(214, 48, 49, 0.3)"] * len(neg_links[0])   # Transparant rood
+                   + ["rgba(0, 184, 148, 0.3)"] * len(pos_links[0]))  # Transparant groen
+
+    # 5. Dynamische Hoogte
+    dynamic_height = max(600, len(all_nodes) * 35)
+
+    fig = go.Figure(data=[go.Sankey(
+        textfont=dict(size=13, color="black", family="Arial Black"),
+        node = dict(
+          pad = 35, thickness = 20,
+          line = dict(color = "white", width = 1),
+          label = [f" {n} " for n in all_nodes],
+          color = node_colors
+        ),
+        link = dict(
+          source = sources,
+          target = targets,
+          value = values,
+          color = link_colors
+        )
+    )])
+
+    fig.update_layout(
+        title=dict(text="⚖️ Balans per Klas: Negatief vs Positief", font=dict(size=22)),
+        height=dynamic_height,
+        font=dict(size=12),
+        margin=dict(l=40, r=40, t=80, b=40),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+
+# --- Figuren van de app (pure builders, gecachet via figure_cache.FigureCache) ---
+def draw_day_trend(df):
+    """Energie en Rust per dag van één leerkracht (df: getypeerd daggevoel, al gefilterd)."""
+    fig = px.line(
+        df,
+        x="Datum",
+        y=["Energie", "Rust"],
+        markers=True,
+        color_discrete_map={"Energie": "#2ecc71", "Rust": "#3498db"},
+        title=None
+    )
+
+    fig.update_layout(
+        yaxis_range=[0.5, 5.5],
+        height=300,
+        margin=dict(l=10, r=10, t=30, b=10),
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, title=None),
+        dragmode=False # Sleepmodus uit
+    )
+
+    fig.update_yaxes(showgrid=True, gridcolor='lightgray', fixedrange=True)
+    fig.update_xaxes(showgrid=False, tickformat="%d %b", dtick="D1" if len(df) < 15 else None, fixedrange=True)
+    fig.add_hrect(y0=0, y1=2.5, fillcolor="#e74c3c", opacity=0.08, line_width=0)
+    return fig
+
+
+def draw_class_mirror(df, klas):
+    """Spiegelplot Lesaanpak/Klasmanagement van één klas (df: de lessen van die klas)."""
+    fig = draw_mirror_density(
+        score_histograms(df, "Lesaanpak"), score_histograms(df, "Klasmanagement"), [klas],
+        '#00CC96', '#AB63FA', "Lesaanpak", "Klasmanagement"
+    )
+
+    fig.update_layout(
+        height=300,
+        showlegend=True,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        margin=dict(l=0, r=0, t=30, b=10),
+        xaxis=dict(range=[0.5, 5.5], showgrid=True, tickvals=[1,3,5], fixedrange=True),
+        yaxis=dict(showticklabels=False, fixedrange=True),
+        dragmode=False # Sleepmodus uit
+    )
+    return fig
+
+
+def draw_monthly_heatmaps(pivots):
+    """
+    Management (links) en aanpak (rechts) per klas x maand uit LessonCube.monthly().
+    None als er geen maanden zijn.
+    """
+    from plotly.subplots import make_subplots
+
+    hm_mgmt = pivots["Klasmanagement"]
+    hm_didac = pivots["Lesaanpak"]
+    hm_count = pivots["count"]
+    if hm_mgmt.empty:
+        return None
+
+    fig = make_subplots(
+        rows=1, cols=2,
+        shared_yaxes=True,
+        subplot_titles=("Klasmanagement", "Didactische Aanpak"),
+        horizontal_spacing=0.02
+    )
+
+    fig.add_trace(go.Heatmap(
+        z=hm_mgmt.values, x=hm_mgmt.columns, y=hm_mgmt.index,
+        colorscale="RdBu", zmin=1, zmax=5, showscale=False,
+        customdata=hm_count.values,
+        hovertemplate="<b>Management: %{z:.1f}</b><br>Regs: %{customdata}<extra></extra>"
+    ), row=1, col=1)
+
+    fig.add_trace(go.Heatmap(
+        z=hm_didac.values, x=hm_didac.columns, y=hm_didac.index,
+        colorscale="RdBu", zmin=1, zmax=5, showscale=False,
+        customdata=hm_count.values,
+        hovertemplate="<b>Aanpak: %{z:.1f}</b><br>Regs: %{customdata}<extra></extra>"
+    ), row=1, col=2)
+
+    fig.update_layout(
+        height=150 + (len(hm_mgmt)*30),
+        margin=dict(l=0, r=0, t=30, b=0),
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        dragmode=False
+    )
+    fig.update_xaxes(showticklabels=False, fixedrange=True)
+    fig.update_yaxes(fixedrange=True)
+    return fig
+
+
+def draw_mirror_overview(hist, klassen):
+    """Spiegelplot per klas (aanpak boven, management onder) uit LessonCube.histograms()."""
+    klassen = sorted(klassen, reverse=True)
+    fig = draw_mirror_density(
+        hist["Lesaanpak"], hist["Klasmanagement"], klassen,
+        '#00CC96', '#AB63FA', 'Aanpak', 'Management', meanline=True
+    )
+
+    fig.update_layout(
+        height=200 + (len(klassen) * 50),
+        showlegend=False,
+        dragmode=False,
+        xaxis=dict(
+            range=[0.5, 5.5],
+            tickvals=[1, 2, 3, 4, 5],
+            ticktext=["1 (Laag)", "2", "3", "4", "5 (Hoog)"],
+            showgrid=True,
+            gridcolor='rgba(200, 200, 200, 0.15)',
+            title=None,
+            side='bottom',
+            fixedrange=True
+        ),
+        yaxis=dict(
+            showgrid=False,
+            title=None,
+            fixedrange=True
+        ),
+        margin=dict(l=0, r=0, t=10, b=0),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig
+
+
+def draw_team_trend(daily_avg):
+    """Gemiddelde Energie en Rust van het team per dag (daily_avg: Datum, Energie, Rust; zie DaySeries.trend)."""
+    fig = go.Figure()
+
+    # LIJN 1: Energie
+    fig.add_trace(go.Scatter(
+        x=daily_avg['Datum'], y=daily_avg['Energie'],
+        mode='lines+markers',
+        name='Energie',
+        line=dict(color='#2ecc71', width=3),
+        marker=dict(size=6)
+    ))
+
+    # LIJN 2: Rust
+    fig.add_trace(go.Scatter(
+        x=daily_avg['Datum'], y=daily_avg['Rust'],
+        mode='lines+markers',
+        name='Rust',
+        line=dict(color='#3498db', width=3),
+        marker=dict(size=6)
+    ))
+
+    # Layout optimalisatie
+    fig.update_layout(
+        height=350,
+        dragmode=False,
+        margin=dict(l=10, r=10, t=30, b=10),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        legend=dict(
+            orientation="h",
+            yanchor="bottom", y=1.02,
+            xanchor="right", x=1
+        ),
+        xaxis=dict(
+            showgrid=False,
+            tickformat="%d %b",
+            dtick="D1" if len(daily_avg) < 15 else None,
+            fixedrange=True
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='rgba(200,200,200,0.2)',
+            range=[0.5, 5.5],
+            fixedrange=True
+        )
+    )
+
+    # Gevarenzone
+    fig.add_hrect(
+        y0=0, y1=2.5,
+        fillcolor="#e74c3c", opacity=0.08, line_width=0
+    )
+    return fig
+
+
+def draw_class_sankey(tags, klassen):
+    """Butterfly Sankey uit LessonCube.tag_counts() (kolommen Tag, Kolom, Klas, Aantal); None zonder flows."""
+    counts_neg = tags[tags["Kolom"] == "Negatief"].rename(columns={"Tag": "Negatief"})[["Negatief", "Klas", "Aantal"]]
+    counts_pos = tags[tags["Kolom"] == "Positief"].rename(columns={"Tag": "Positief"})[["Klas", "Positief", "Aantal"]]
+    fig = draw_sankey_from_counts(counts_neg, counts_pos, klassen)
+    if fig:
+        fig.update_layout(
+            height=600,
+            margin=dict(t=20, b=20),
+            dragmode=False
+        )
+    return fig
@@ -0,0 +1,387 @@
+"""
+Nagebootste Google Sheets-verbinding om offline te meten en te testen.
+
+FakeSheetsConnection heeft dezelfde read()/update() als st-gsheets-connection en een
+client._select_worksheet() met row_values()/append_rows() zoals gspread, dus
+SheetsStore (en alles erboven) merkt geen verschil. Instelbaar:
+
+- latency: vaste of willekeurige vertraging per oproep ("0.3" of "0.2-0.8" seconden);
+- quota_per_minute: zoals Google, apart voor lees- en schrijfoproepen; daarboven
+  volgt een QuotaError (429);
+- error_rate: kans op een willekeurige fout (503) per oproep;
+- dataset: synthetische school ("leeg", "klein", "school", "groot" of eigen aantallen).
+
+Lezen geeft een momentopname, schrijven via update() vervangt het hele tabblad na de
+vertraging. Zo zijn trage dashboards en verloren updates (lezen-aanpassen-schrijven
+door twee sessies tegelijk) op een laptop na te spelen.
+
+RecordingConnection zit rond de echte verbinding en bewaart per tabblad de laatste
+response (pickle, met de echte dtypes) en per oproep de duur in calls.jsonl.
+FakeSheetsConnection.from_recording() speelt dat terug, met vertragingen getrokken
+uit de opgenomen duur. Let op: een opname bevat echte registraties.
+
+Kiezen gebeurt via de config (zie reflectietool.get_store en open_connection).
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from storage import WS_DAG, WS_LESSEN, WS_USERS, SheetsStore, StoreError
+from tags import NEG_MOODS, POS_MOODS
+
+SHEETS_MODI = ("live", "fake", "record", "replay")
+
+DATASETS = {
+    "leeg": None,
+    "klein": dict(leerkrachten=20, dagen=30),
+    "school": dict(leerkrachten=80, dagen=180),
+    "groot": dict(leerkrachten=300, dagen=365),
+}
+KLASSEN = [f"{graad}{letter}" for graad in range(1, 7) for letter in "ABCD"]
+WACHTWOORD = "test"
+
+
+# Alle nep-verbindingen in dit proces (de load-test leest er stats en inhoud uit)
+_ACTIEF = weakref.WeakSet()
+
+
+def active_connections():
+    return list(_ACTIEF)
+
+
+class QuotaError(Exception):
+    """Zoals gspread's APIError bij [429]: te veel oproepen per minuut."""
+
+
+class FakeApiError(Exception):
+    """Willekeurige serverfout (zoals [503] The service is currently unavailable)."""
+
+
+def _tab(worksheet):
+    return str(worksheet)
+
+
+def parse_latency(waarde):
+    """'0.3' -> (0.3, 0.3); '0.2-0.8' -> (0.2, 0.8); getallen mogen ook."""
+    if isinstance(waarde, (tuple, list)):
+        laag, hoog = waarde
+    elif isinstance(waarde, str) and "-" in waarde.strip()[1:]:
+        laag, hoog = waarde.split("-", 1)
+    else:
+        laag = hoog = waarde or 0
+    return float(laag), float(hoog)
+
+
+def _as_sheet(df):
+    """Zoals de echte connector het terug zou geven: tekst in de sheet, types opnieuw afgeleid."""
+    if df.empty:
+        return df.reset_index(drop=True)
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+# -------------------------------------------------
+# SYNTHETISCHE DATA
+# -------------------------------------------------
+def synthetic_school(leerkrachten=20, dagen=30, lessen_per_dag=3, vuil=0.0, seed=42, einde=None):
+    """
+    {tabblad: frame} in de vorm van het echte Sheet (Users, Daggevoel op tab 0, Lessons).
+    Wachtwoord van alle accounts is 'test'; directeur@school.test is de directie.
+    vuil: fractie rijen met een onbruikbare datum of score (voor de validatie).
+    """
+    rng = np.random.default_rng(seed)
+    emails = [f"leerkracht{i:03d}@school.test" for i in range(1, leerkrachten + 1)]
+    pw = hashlib.sha256(WACHTWOORD.encode()).hexdigest()
+    users = pd.DataFrame({"email": emails + ["directeur@school.test"], "password": pw,
+                          "role": ["teacher"] * len(emails) + ["director"]})
+
+    einde = pd.Timestamp(einde) if einde is not None else pd.Timestamp.now().normalize()
+    werkdagen = pd.bdate_range(end=einde, periods=dagen)
+
+    # Daggevoel: ~80% van de werkdagen per leerkracht
+    e_idx, d_idx = np.nonzero(rng.random((len(emails), len(werkdagen))) < 0.8)
+    rust = rng.integers(1, 6, len(e_idx))
+    dag = pd.DataFrame({
+        "Email": np.asarray(emails)[e_idx],
+        "Datum": werkdagen[d_idx].strftime("%Y-%m-%d"),
+        "Energie": rng.integers(1, 6, len(e_idx)),
+        "Rust": rust,
+        "Stress": 6 - rust,
+    })
+
+    # Lessen: Poisson(lessen_per_dag) per leerkracht per dag, elk in een eigen set klassen
+    per_dag = rng.poisson(lessen_per_dag, (len(emails), len(werkdagen)))
+    e_idx, d_idx = np.nonzero(per_dag)
+    herhaal = per_dag[e_idx, d_idx]
+    e_idx, d_idx = np.repeat(e_idx, herhaal), np.repeat(d_idx, herhaal)
+    eigen_klassen = rng.integers(0, len(KLASSEN), (len(emails), 4))
+    klas = np.asarray(KLASSEN)[eigen_klassen[e_idx, rng.integers(0, 4, len(e_idx))]]
+    tijd = werkdagen[d_idx] + pd.to_timedelta(rng.integers(8 * 3600, 16 * 3600, len(e_idx)), unit="s")
+
+    def tags(woorden, maximum):
+        # Willekeurige volgorde per rij, de eerste 0..maximum tags; elke combinatie één keer joinen
+        keuze = np.argsort(rng.random((len(e_idx), len(woorden))), axis=1)[:, :maximum]
+        keuze[np.arange(maximum) >= rng.integers(0, maximum + 1, len(e_idx))[:, None]] = -1
+        combinaties, inverse = np.unique(keuze, axis=0, return_inverse=True)
+        teksten = np.array([", ".join(woorden[i] for i in rij if i >= 0) for rij in combinaties], dtype=object)
+        return teksten[inverse.ravel()]
+
+    lessen = pd.DataFrame({
+        "Email": np.asarray(emails)[e_idx],
+        "Datum": tijd.strftime("%Y-%m-%d %H:%M:%S"),
+        "Klas": klas,
+        "Lesaanpak": rng.integers(1, 6, len(e_idx)),
+        "Klasmanagement": rng.integers(1, 6, len(e_idx)),
+        "Positief": tags(POS_MOODS, 3),
+        "Negatief": tags(NEG_MOODS, 2),
+    })
+
+    if vuil:
+        for df, score in ((dag, "Energie"), (lessen, "Lesaanpak")):
+            slecht = rng.random(len(df)) < vuil
+            helft = slecht & (rng.random(len(df)) < 0.5)
+            df[score] = df[score].astype(object)
+            df.loc[helft, "Datum"] = "onbekend"
+            df.loc[slecht & ~helft, score] = "7"
+
+    tabs = SheetsStore.TABBLADEN
+    return {_tab(tabs[WS_USERS]): users, _tab(tabs[WS_DAG]): dag, _tab(tabs[WS_LESSEN]): lessen}
+
+
+# -------------------------------------------------
+# NEP-VERBINDING
+# -------------------------------------------------
+class FakeWorksheet:
+    """Het stukje gspread.Worksheet dat SheetsStore.append gebruikt."""
+
+    def __init__(self, conn, tab):
+        self.conn = conn
+        self.tab = tab
+
+    def row_values(self, rij):
+        self.conn._call("read")
+        with self.conn._lock:
+            df = self.conn._tabs.get(self.tab)
+        if rij != 1 or df is None:
+            return []
+        return list(df.columns)
+
+    def append_rows(self, values, value_input_option=None):
+        self.conn._call("write")
+        with self.conn._lock:
+            df = self.conn._tabs.get(self.tab)
+            # Enkel de nieuwe rijen door de "sheet" halen; de rest staat er al
+            nieuw = _as_sheet(pd.DataFrame(values, columns=list(df.columns) if df is not None else None))
+            self.conn._tabs[self.tab] = nieuw if df is None or df.empty else pd.concat([df, nieuw], ignore_index=True)
+            self.conn.stats["append"] += 1
+
+
+class _FakeClient:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _select_worksheet(self, spreadsheet=None, worksheet=0):
+        return FakeWorksheet(self.conn, _tab(worksheet))
+
+
+class FakeSheetsConnection:
+    """
+    tabs: {tabblad: frame} (sleutels als in SheetsStore.TABBLADEN, als tekst).
+    latencies: optioneel {"read": [...], "write": [...]} opgenomen duur; wordt gebruikt
+    als er geen vaste latency gegeven is.
+    fast_append=False laat client weg (enkel de publieke read()/update()), zoals een
+    connector-versie zonder _select_worksheet: SheetsStore valt dan terug op update().
+    """
+
+    def __init__(self, tabs=None, latency=0.0, quota_per_minute=0, error_rate=0.0, seed=None, latencies=None,
+                 fast_append=True):
+        self.latency = parse_latency(latency)
+        self.quota_per_minute = int(quota_per_minute or 0)
+        self.error_rate = float(error_rate or 0)
+        self.latencies = latencies or {}
+        self.stats = {"read": 0, "update": 0, "append": 0, "quota": 0, "error": 0}
+        self.client = _FakeClient(self) if fast_append else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tabs = {_tab(k): _as_sheet(v) for k, v in (tabs or {}).items()}
+        self._calls = {"read": deque(), "write": deque()}
+        _ACTIEF.add(self)
+
+    @classmethod
+    def from_dataset(cls, dataset="klein", **opties):
+        """dataset: naam uit DATASETS of een dict met argumenten voor synthetic_school."""
+        if isinstance(dataset, str):
+            if dataset not in DATASETS:
+                raise StoreError(f"Onbekende dataset: {dataset} (kies uit {', '.join(DATASETS)})")
+            dataset = DATASETS[dataset]
+        return cls(synthetic_school(**dataset) if dataset is not None else {}, **opties)
+
+    @classmethod
+    def from_recording(cls, pad, **opties):
+        """Tabbladen en vertragingen uit een opname van RecordingConnection."""
+        tabs = {naam[:-len(".pkl")]: pd.read_pickle(os.path.join(pad, naam))
+                for naam in os.listdir(pad) if naam.endswith(".pkl")}
+        latencies = {"read": [], "write": []}
+        log = os.path.join(pad, "calls.jsonl")
+        if os.path.exists(log):
+            with open(log, encoding="utf-8") as f:
+                for regel in f:
+                    oproep = json.loads(regel)
+                    latencies["read" if oproep["op"] in ("read", "row_values") else "write"].append(oproep["seconds"])
+        opties.setdefault("latencies", latencies)
+        conn = cls(**opties)
+        # Opgenomen frames rechtstreeks bewaren: dat zijn al echte response-vormen
+        conn._tabs = {_tab(k): v for k, v in tabs.items()}
+        return conn
+
+    # --- Netwerkgedrag ---
+    def _call(self, soort):
+        """Vertraging, quota en willekeurige fouten voor één API-oproep."""
+        laag, hoog = self.latency
+        opgenomen = self.latencies.get(soort)
+        if hoog == 0 and opgenomen:
+            wacht = self._random.choice(opgenomen)
+        else:
+            wacht = self._random.uniform(laag, hoog)
+        if wacht > 0:
+            time.sleep(wacht)
+
+        if self.quota_per_minute:
+            nu = time.monotonic()
+            with self._lock:
+                oproepen = self._calls[soort]
+                while oproepen and nu - oproepen[0] > 60:
+                    oproepen.popleft()
+                if len(oproepen) >= self.quota_per_minute:
+                    self.stats["quota"] += 1
+                    metric = "Read requests" if soort == "read" else "Write requests"
+                    raise QuotaError(f"[429]: Quota exceeded for quota metric '{metric}' per minute per user")
+                oproepen.append(nu)
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            with self._lock:
+                self.stats["error"] += 1
+            raise FakeApiError("[503]: The service is currently unavailable.")
+
+    # --- API van st-gsheets-connection ---
+    def read(self, spreadsheet=None, worksheet=0, ttl=None, **_):
+        self._call("read")
+        with self._lock:
+            self.stats["read"] += 1
+            df = self._tabs.get(_tab(worksheet))
+        return pd.DataFrame() if df is None else df.copy()
+
+    def update(self, spreadsheet=None, worksheet=0, data=None, **_):
+        self._call("write")
+        with self._lock:
+            self.stats["update"] += 1
+            self._tabs[_tab(worksheet)] = _as_sheet(data if data is not None else pd.DataFrame())
+        return data
+
+    def worksheet_frame(self, worksheet):
+        """Huidige inhoud van een tabblad, zonder vertraging (voor controles in tests)."""
+        with self._lock:
+            df = self._tabs.get(_tab(worksheet))
+        return pd.DataFrame() if df is None else df.copy()
+
+
+# -------------------------------------------------
+# OPNEMEN
+# -------------------------------------------------
+class _RecordingWorksheet:
+    def __init__(self, recorder, inner, tab):
+        self._recorder = recorder
+        self._inner = inner
+        self._tab = tab
+
+    def row_values(self, rij):
+        return self._recorder._timed("row_values", self._tab, lambda: self._inner.row_values(rij))
+
+    def append_rows(self, values, **opties):
+        return self._recorder._timed("append_rows", self._tab, lambda: self._inner.append_rows(values, **opties),
+                                     rows=len(values))
+
+
+class _RecordingClient:
+    def __init__(self, recorder, inner):
+        self._recorder = recorder
+        self._inner = inner
+
+    def _select_worksheet(self, spreadsheet=None, worksheet=0):
+        return _RecordingWorksheet(self._recorder, self._inner._select_worksheet(spreadsheet=spreadsheet, worksheet=worksheet),
+                                   _tab(worksheet))
+
+
+class RecordingConnection:
+    """Echte verbinding doorgeven en intussen responses en duur per oproep bewaren in pad."""
+
+    def __init__(self, inner, pad):
+        self.inner = inner
+        self.pad = pad
+        self._lock = threading.Lock()
+        os.makedirs(pad, exist_ok=True)
+        client = getattr(inner, "client", None)
+        self.client = _RecordingClient(self, client) if hasattr(client, "_select_worksheet") else None
+
+    def _log(self, op, tab, seconds, rows=None, error=None):
+        regel = json.dumps({"op": op, "worksheet": tab, "seconds": round(seconds, 4), "rows": rows, "error": error})
+        with self._lock, open(os.path.join(self.pad, "calls.jsonl"), "a", encoding="utf-8") as f:
+            f.write(regel + "\n")
+
+    def _timed(self, op, tab, fn, rows=None):
+        start = time.perf_counter()
+        try:
+            resultaat = fn()
+        except Exception as e:
+            self._log(op, tab, time.perf_counter() - start, rows, f"{type(e).__name__}: {e}")
+            raise
+        if rows is None and isinstance(resultaat, pd.DataFrame):
+            rows = len(resultaat)
+        self._log(op, tab, time.perf_counter() - start, rows)
+        return resultaat
+
+    def read(self, spreadsheet=None, worksheet=0, **opties):
+        tab = _tab(worksheet)
+        df = self._timed("read", tab, lambda: self.inner.read(spreadsheet=spreadsheet, worksheet=worksheet, **opties))
+        doel = os.path.join(self.pad, f"{tab}.pkl")
+        with self._lock:
+            df.to_pickle(f"{doel}.{threading.get_ident()}.tmp")
+            os.replace(f"{doel}.{threading.get_ident()}.tmp", doel)
+        return df
+
+    def update(self, spreadsheet=None, worksheet=0, data=None, **opties):
+        return self._timed("update", _tab(worksheet),
+                           lambda: self.inner.update(spreadsheet=spreadsheet, worksheet=worksheet, data=data, **opties),
+                           rows=0 if data is None else len(data))
+
+
+# -------------------------------------------------
+# FABRIEK
+# -------------------------------------------------
+def open_connection(mode, live=None, latency=0.0, quota_per_minute=0, error_rate=0.0,
+                    dataset="klein", record_dir=None, seed=None):
+    """
+    mode: "live" (live() = de echte st.connection), "fake" (synthetische dataset),
+    "record" (live + opname in record_dir) of "replay" (opname uit record_dir).
+    """
+    netwerk = dict(latency=latency, quota_per_minute=quota_per_minute, error_rate=error_rate, seed=seed)
+    if mode == "live":
+        return live()
+    if mode == "fake":
+        return FakeSheetsConnection.from_dataset(dataset, **netwerk)
+    if mode == "record":
+        return RecordingConnection(live(), record_dir)
+    if mode == "replay":
+        if not record_dir or not os.path.isdir(record_dir):
+            raise StoreError(f"Geen opname gevonden in {record_dir}")
+        return FakeSheetsConnection.from_recording(record_dir, **netwerk)
+    raise StoreError(f"Onbekende sheets_mode: {mode} (kies uit {', '.join(SHEETS_MODI)})")
+
@@ -0,0 +1,97 @@
+"""
+Gebouwde Plotly-figuren, gedeeld over alle sessies van het proces.
+
+Een figuur hangt enkel af van de data en de filters. FigureCache bewaart ze daarom
+onder (naam, dataversie, filters) in een begrensde LRU: een rerun zonder nieuwe
+registratie of ander filter bouwt niets opnieuw. De dataversie levert de oproeper
+(cube.version, SchoolData.version, of frame_digest voor een kleine eigen selectie);
+een nieuwe versie geeft gewoon een nieuwe sleutel, oude figuren vallen er achteraan uit.
+
+    fig = cache.get("heatmap", cube.version, (start, tuple(klassen)), lambda: draw_...(...))
+
+De cache bewaart de geserialiseerde figuur (JSON), niet het go.Figure-object: get()
+geeft een GedeeldeFiguur terug die st.plotly_chart rechtstreeks uit die JSON toont,
+zonder de plotly-objectboom opnieuw te doorlopen. Ze is alleen-lezen; wie de figuur
+wil aanpassen, vraagt een kopie().
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from plotly.basedatatypes import BaseFigure
+
+
+class GedeeldeFiguur(BaseFigure):
+    """
+    Een gecachete figuur als JSON-spec. st.plotly_chart herkent ze als Plotly-figuur en
+    vraagt enkel to_dict(): een json.loads van de spec (elke keer een nieuwe dict),
+    geen opbouw of validatie van plotly-objecten. Alle andere attributen en methodes
+    van een figuur geven een AttributeError, zodat niemand de gedeelde figuur wijzigt.
+    """
+
+    def __init__(self, spec):
+        # Bewust geen BaseFigure.__init__: er is geen objectboom, enkel de spec
+        object.__setattr__(self, "spec", spec)
+
+    def to_dict(self):
+        return json.loads(self.spec)
+
+    def to_plotly_json(self):
+        return self.to_dict()
+
+    def kopie(self):
+        """Een gewone, aanpasbare go.Figure met dezelfde inhoud."""
+        import plotly.graph_objects as go
+        return go.Figure(self.to_dict())
+
+    def __getattr__(self, naam):
+        # Enkel opgeroepen voor wat ontbreekt, dus ook voor de interne toestand van
+        # BaseFigure waar update_layout(), .layout, add_trace() enz. op steunen
+        raise AttributeError("Gedeelde figuur is alleen-lezen; gebruik kopie() om ze aan te passen.")
+
+    def __setattr__(self, naam, waarde):
+        raise AttributeError("Gedeelde figuur is alleen-lezen; gebruik kopie() om ze aan te passen.")
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, ander):
+        return isinstance(ander, GedeeldeFiguur) and ander.spec == self.spec
+
+    def __hash__(self):
+        return hash(self.spec)
+
+    def __repr__(self):
+        return f"GedeeldeFiguur({len(self.spec)} bytes)"
+
+
+class FigureCache:
+    """LRU van geserialiseerde figuren (of None als er niets te tekenen viel) met hoogstens max_entries."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, naam, versie, filters, bouw):
+        """Figuur voor deze data en filters; roept bouw() enkel op als ze nog niet gekend is."""
+        key = (naam, versie, filters)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        # Buiten de lock bouwen en serialiseren: andere sessies wachten niet op deze figuur
+        fig = bouw()
+        fig = GedeeldeFiguur(fig.to_json()) if fig is not None else None
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = fig
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fig
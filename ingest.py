@@ -0,0 +1,177 @@
+"""
+Eén keer parsen per werkblad.
+
+ingest(ws, df) zet een ruwe frame (Sheets, SQLite, CSV, wachtrij) om naar een vast,
+compact schema: Datum als datetime64, scores als int8 (1-5), Email en Klas als
+categorie, Rust afgeleid uit Stress en het tag-bitmasker bij lessen. Rijen die niet
+te parsen zijn, worden weggelaten en geteld in een IngestReport (df.attrs["ingest"]).
+
+De resultaten zijn bevroren: de onderliggende arrays zijn read-only, zodat alle views
+dezelfde frame kunnen delen. Een view die kolommen wil toevoegen, werkt op een
+(goedkope) kopie; in-place schrijven in gedeelde data geeft een ValueError.
+"""
+import threading
+import weakref
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from storage import WS_DAG, WS_LESSEN, normalize_email, parse_datum
+from tags import MASK_KOLOM, encode_tags
+from timing import span
+
+SCORE_KOLOMMEN = {
+    WS_DAG: ("Energie", "Stress"),
+    WS_LESSEN: ("Lesaanpak", "Klasmanagement"),
+}
+TEKST_KOLOMMEN = {
+    WS_DAG: (),
+    WS_LESSEN: ("Positief", "Negatief"),
+}
+SCHEMA = {
+    WS_DAG: {"Email": "category", "Datum": "datetime64[ns]", "Energie": "int8", "Stress": "int8", "Rust": "int8"},
+    WS_LESSEN: {"Email": "category", "Datum": "datetime64[ns]", "Klas": "category", "Lesaanpak": "int8",
+                "Klasmanagement": "int8", "Positief": "category", "Negatief": "category", MASK_KOLOM: "uint16"},
+}
+
+
+@dataclass
+class IngestReport:
+    worksheet: str
+    rows_in: int
+    rows_out: int = 0
+    dropped: dict = field(default_factory=dict)  # reden -> aantal rijen
+
+    def drop(self, reden, aantal):
+        if aantal:
+            self.dropped[reden] = self.dropped.get(reden, 0) + int(aantal)
+
+
+def _score(kolom):
+    """Numeriek, geheel en tussen 1 en 5; anders NaN."""
+    waarden = pd.to_numeric(kolom, errors="coerce")
+    return waarden.where(waarden.between(1, 5) & (waarden == waarden.round()))
+
+
+def freeze(df):
+    """
+    Dezelfde frame, opgebouwd uit read-only arrays (één per kolom, niet geconsolideerd),
+    zodat in-place schrijven in gedeelde data een ValueError geeft.
+    """
+    kolommen = {}
+    for naam in df.columns:
+        reeks = df[naam]
+        if isinstance(reeks.dtype, pd.CategoricalDtype):
+            codes = reeks.cat.codes.to_numpy().copy()
+            codes.flags.writeable = False
+            kolommen[naam] = pd.Categorical.from_codes(codes, dtype=reeks.dtype)
+        else:
+            arr = reeks.to_numpy(copy=True)
+            arr.flags.writeable = False
+            kolommen[naam] = arr
+    bevroren = pd.DataFrame(kolommen, index=df.index, copy=False)
+    bevroren.attrs = dict(df.attrs)
+    return bevroren
+
+
+def ingest(worksheet, df):
+    """Ruwe frame van een werkblad -> getypeerde, gevalideerde en bevroren frame."""
+    if worksheet not in SCHEMA:
+        raise ValueError(f"Geen ingest-schema voor werkblad {worksheet!r}")
+    report = IngestReport(worksheet, rows_in=len(df))
+    kolommen = {}
+
+    email = df["Email"] if "Email" in df.columns else pd.Series(None, index=df.index, dtype="object")
+    kolommen["Email"] = email.map(normalize_email, na_action="ignore")
+
+    with span("to_datetime"):
+        kolommen["Datum"] = parse_datum(df["Datum"]) if "Datum" in df.columns else pd.Series(pd.NaT, index=df.index)
+    geldig = kolommen["Datum"].notna()
+    report.drop("datum", (~geldig).sum())
+
+    if worksheet == WS_LESSEN:
+        klas = df["Klas"].astype("string").str.strip() if "Klas" in df.columns else pd.Series(pd.NA, index=df.index)
+        kolommen["Klas"] = klas
+        ok = klas.notna() & (klas != "")
+        report.drop("klas", (geldig & ~ok).sum())
+        geldig &= ok
+
+    for s in SCORE_KOLOMMEN[worksheet]:
+        kolommen[s] = _score(df[s]) if s in df.columns else pd.Series(np.nan, index=df.index)
+        if s == "Stress" and "Rust" in df.columns:
+            # Oude rijen met enkel Rust: Stress = 6 - Rust
+            kolommen[s] = kolommen[s].fillna(6 - _score(df["Rust"]))
+        ok = kolommen[s].notna()
+        report.drop(s.lower(), (geldig & ~ok).sum())
+        geldig &= ok
+
+    for t in TEKST_KOLOMMEN[worksheet]:
+        kolommen[t] = df[t].fillna("").astype(str) if t in df.columns else pd.Series("", index=df.index)
+
+    typed = pd.DataFrame(kolommen, index=df.index)[geldig.to_numpy()].reset_index(drop=True)
+    if worksheet == WS_DAG:
+        typed["Rust"] = 6 - typed["Stress"]
+    else:
+        typed[MASK_KOLOM] = encode_tags(typed)
+    typed = typed[list(SCHEMA[worksheet])].astype(SCHEMA[worksheet])
+
+    report.rows_out = len(typed)
+    typed.attrs["ingest"] = report
+    return freeze(typed)
+
+
+def concat_typed(worksheet, *frames):
+    """
+    Getypeerde frames achter elkaar (bv. gedeelde frame + nieuwe rijen). Categorieën
+    worden samengevoegd in plaats van terug te vallen op object-kolommen.
+    """
+    gevuld = [f for f in frames if len(f)]
+    if len(gevuld) <= 1:
+        # Niets samen te voegen: dezelfde (read-only) arrays, enkel een nieuw rapport
+        typed = (gevuld[0] if gevuld else frames[0]).copy(deep=False)
+    else:
+        kolommen = {}
+        for naam, dtype in SCHEMA[worksheet].items():
+            if dtype == "category":
+                kolommen[naam] = union_categoricals([f[naam].array for f in gevuld])
+            else:
+                kolommen[naam] = np.concatenate([f[naam].to_numpy() for f in gevuld])
+        typed = freeze(pd.DataFrame(kolommen))
+    report = IngestReport(worksheet, rows_in=0, rows_out=len(typed))
+    for f in frames:
+        deel = f.attrs.get("ingest")
+        if isinstance(deel, IngestReport):
+            report.rows_in += deel.rows_in
+            for reden, aantal in deel.dropped.items():
+                report.drop(reden, aantal)
+    typed.attrs = {"ingest": report}
+    return typed
+
+
+def is_ingested(df, worksheet):
+    report = df.attrs.get("ingest")
+    return isinstance(report, IngestReport) and report.worksheet == worksheet
+
+
+class IngestCache:
+    """
+    Onthoudt per werkblad de getypeerde frame bij de laatst geziene ruwe frame.
+    CachedStore geeft tot de volgende refresh hetzelfde object terug, dus dan wordt
+    er niet opnieuw geparst; elke nieuwe ruwe frame wordt één keer geparst.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._laatste = {}  # ws -> (weakref naar ruwe frame, getypeerde frame)
+
+    def get(self, worksheet, raw):
+        with self._lock:
+            ref, typed = self._laatste.get(worksheet, (None, None))
+            if ref is not None and ref() is raw:
+                return typed
+        typed = ingest(worksheet, raw)
+        with self._lock:
+            self._laatste[worksheet] = (weakref.ref(raw), typed)
+        return typed
@@ -0,0 +1,372 @@
+"""
+PDF-rapporten van de Leerkrachtenmonitor.
+
+build_teacher_report() is een pure functie (geen Streamlit) die de PDF als bytes
+teruggeeft. ReportJobs (rapport_jobs.py) bouwt rapporten op de achtergrond en bewaart
+het resultaat onder een hash van de inhoud, zodat een herhaalde download met
+ongewijzigde data niets meer kost.
+
+Deze module laadt reportlab, seaborn en matplotlib; importeer ze pas als er een PDF
+gemaakt wordt. Voor periodes, sleutels en jobs volstaat rapport_jobs.
+"""
+import io
+from xml.sax.saxutils import escape
+
+import numpy as np  # Nodig voor grouped bar chart
+import pandas as pd
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as ReportLabImage, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape  # A4 Landscape import
+import seaborn as sns
+import matplotlib.pyplot as plt
+
+from charts import draw_sankey_butterfly
+from render_pool import RenderError, get_render_pool
+# Oude importpaden (from rapport import report_key, ...) blijven werken
+from rapport_jobs import (RAPPORT_PERIODES, ReportJob, ReportJobs, frame_digest, period_start,  # noqa: F401
+                          prepare_report_frames, report_key, report_names)
+
+
+# -------------------------------------------------
+# HELPERS
+# -------------------------------------------------
+def get_delta_text(current, benchmark, reverse=False):
+    if benchmark == 0: return "-"
+    diff = current - benchmark
+    return f"{diff:+.1f} vs alle leerkrachten"
+
+
+def plot_to_img(fig):
+    """Matplotlib naar Afbeelding."""
+    img_buf = io.BytesIO()
+    fig.savefig(img_buf, format='png', dpi=120, bbox_inches='tight')
+    img_buf.seek(0)
+    # Iets breder maken omdat we landscape werken
+    return ReportLabImage(img_buf, width=600, height=300)
+
+
+def plotly_to_pdf_img(fig):
+    """Plotly naar Afbeelding (Voor Sankey). Gooit RenderError als de export mislukt."""
+    # Landscape formaat: breder
+    img_bytes = get_render_pool().render(fig, fmt="png", width=1100, height=600, scale=2)
+    img_buf = io.BytesIO(img_bytes)
+    return ReportLabImage(img_buf, width=700, height=380)
+
+
+# -------------------------------------------------
+# LEERKRACHTRAPPORT
+# -------------------------------------------------
+def build_teacher_report(naam, rapport_periode, r_day_df, r_les_df, benchmark, progress=None, problems=None,
+                         class_sections=None):
+    """
+    Bouwt het liggende A4-rapport van één leerkracht.
+    r_day_df / r_les_df zijn al op periode gefilterd (r_day_df met kolom Rust),
+    benchmark is een dict met de gemiddelden van alle leerkrachten.
+    progress(fractie, tekst) wordt opgeroepen na elke sectie; mislukte onderdelen
+    komen (met reden) in de lijst problems.
+    class_sections: optioneel {klas: render_class_sections(...)}; die klassen krijgen
+    een bijlage met het (anonieme) schoolbeeld van de klas.
+    """
+    def stap(fractie, tekst):
+        if progress:
+            progress(fractie, tekst)
+
+    # Metrics berekenen
+    gem_en = r_day_df["Energie"].mean() if not r_day_df.empty else 0
+    gem_str = r_day_df["Stress"].mean() if not r_day_df.empty else 0
+    gem_les = r_les_df["Lesaanpak"].mean() if not r_les_df.empty else 0
+    gem_mng = r_les_df["Klasmanagement"].mean() if not r_les_df.empty else 0
+
+    glob_avg_en = benchmark.get("Energie", 0)
+    glob_avg_str = benchmark.get("Stress", 0)
+    glob_avg_les = benchmark.get("Lesaanpak", 0)
+    glob_avg_mng = benchmark.get("Klasmanagement", 0)
+
+    # Data Mergen voor correlaties
+    merged_df = pd.DataFrame()
+    has_correlation_data = False
+
+    if not r_les_df.empty and not r_day_df.empty:
+        merged_df = pd.merge(r_les_df, r_day_df, on="Datum", how="inner")
+        if len(merged_df) > 2:
+            has_correlation_data = True
+
+    buffer = io.BytesIO()
+
+    # --- LANDSCAPE INSTELLING ---
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30
+    )
+
+    styles = getSampleStyleSheet()
+    story = []
+
+    title_style = styles["Title"]
+    title_style.textColor = colors.HexColor("#2c3e50")
+    h2_style = styles["Heading2"]
+    h2_style.textColor = colors.HexColor("#2980b9")
+    h2_style.spaceBefore = 15
+
+    # HEADER
+    story.append(Paragraph("Leerkrachten Monitor: Analyse Rapport", title_style))
+    story.append(Paragraph(f"<b>Leerkracht:</b> {naam} | <b>Periode:</b> {rapport_periode}", styles["Normal"]))
+    story.append(Spacer(1, 20))
+
+    # SECTIE 1: Kerncijfers
+    stap(0.1, "Kerncijfers")
+    story.append(Paragraph("1. Jouw Score vs. Gemiddelde Leerkracht", h2_style))
+    story.append(Paragraph("Jouw gemiddelden vergeleken met de benchmark.", styles["Normal"]))
+    story.append(Spacer(1, 10))
+
+    tbl_data = [
+        ["Indicator", "Jouw Score", "Gem. Alle Leerkrachten", "Verschil"],
+        ["Energie", f"{gem_en:.1f}", f"{glob_avg_en:.1f}", get_delta_text(gem_en, glob_avg_en)],
+        ["Stress", f"{gem_str:.1f}", f"{glob_avg_str:.1f}", get_delta_text(gem_str, glob_avg_str, reverse=True)],
+        ["Lesaanpak", f"{gem_les:.1f}", f"{glob_avg_les:.1f}", get_delta_text(gem_les, glob_avg_les)],
+        ["Klasmanagement", f"{gem_mng:.1f}", f"{glob_avg_mng:.1f}", get_delta_text(gem_mng, glob_avg_mng)],
+    ]
+
+    # Tabel breder maken voor landscape
+    t = Table(tbl_data, colWidths=[150, 120, 160, 150])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#34495e")),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0,1), (-1,-1), colors.HexColor("#ecf0f1")),
+        ('GRID', (0,0), (-1,-1), 1, colors.white),
+    ]))
+    story.append(t)
+    story.append(Spacer(1, 10))
+
+    # Per klas: jouw lessen tegenover alle leerkrachten in diezelfde klas
+    klas_benchmark = benchmark.get("klassen", {})
+    if not r_les_df.empty and klas_benchmark:
+        eigen = r_les_df.groupby(r_les_df["Klas"].astype(str), observed=True)[["Lesaanpak", "Klasmanagement"]].mean()
+        kl_data = [["Klas", "Jouw Lesaanpak", "Gem. Klas", "Jouw Klasmanagement", "Gem. Klas"]]
+        for klas, rij in eigen.iterrows():
+            ref = klas_benchmark.get(klas, {})
+            kl_data.append([klas,
+                            f"{rij['Lesaanpak']:.1f}", f"{ref.get('Lesaanpak', 0):.1f}",
+                            f"{rij['Klasmanagement']:.1f}", f"{ref.get('Klasmanagement', 0):.1f}"])
+        t_kl = Table(kl_data, colWidths=[110, 110, 90, 140, 90])
+        t_kl.setStyle(TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#34495e")),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor("#ecf0f1")),
+            ('GRID', (0,0), (-1,-1), 1, colors.white),
+        ]))
+        story.append(Paragraph("Per klas, vergeleken met alle leerkrachten in die klas.", styles["Normal"]))
+        story.append(Spacer(1, 6))
+        story.append(t_kl)
+    story.append(Spacer(1, 20))
+
+    # SECTIE 2: Correlaties
+    stap(0.25, "Samenhang & patronen")
+    story.append(Paragraph("2. Samenhang & Patronen", h2_style))
+    if has_correlation_data:
+        # Iets bredere heatmap
+        fig_pdf_corr, ax_pdf_corr = plt.subplots(figsize=(8, 4))
+        sns.heatmap(merged_df[["Klasmanagement", "Lesaanpak", "Energie", "Rust"]].corr(),
+                    annot=True, cmap="coolwarm", vmin=-1, vmax=1, center=0,
+                    fmt=".2f", cbar=False, ax=ax_pdf_corr)
+        story.append(plot_to_img(fig_pdf_corr))
+        plt.close(fig_pdf_corr)
+    else:
+        story.append(Paragraph("Onvoldoende data voor correlaties.", styles["Italic"]))
+
+    story.append(PageBreak())  # Nieuwe pagina voor weekpatroon & Sankey
+
+    # SECTIE 3: Weekpatroon (Energie & Rust)
+    stap(0.45, "Weekpatroon")
+    story.append(Paragraph("3. Weekpatroon: Energie & Rust", h2_style))
+
+    if not r_day_df.empty:
+        # Weekdag toevoegen
+        weekdag = r_day_df["Datum"].dt.day_name()
+        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+        # Groeperen (gemiddelde Energie en Rust per dag)
+        week_scores = r_day_df.groupby(weekdag)[["Energie", "Rust"]].mean().reindex(days)
+
+        # Checken of er data is na reindex (ign weekend)
+        if not week_scores.dropna(how='all').empty:
+            # Bar chart maken
+            fig_bar, ax_bar = plt.subplots(figsize=(10, 4))
+
+            x = np.arange(len(days))
+            width = 0.35
+
+            # Bars tekenen
+            ax_bar.bar(x - width/2, week_scores["Energie"], width, label='Energie', color='#2ecc71')
+            ax_bar.bar(x + width/2, week_scores["Rust"], width, label='Rust', color='#3498db')
+
+            ax_bar.set_ylabel('Score (1-5)')
+            ax_bar.set_xticks(x)
+            ax_bar.set_xticklabels(['Ma', 'Di', 'Wo', 'Do', 'Vr'])
+            ax_bar.set_ylim(0, 5.5)
+            ax_bar.legend(loc='lower center', bbox_to_anchor=(0.5, 1.05), ncol=2, frameon=False)
+            ax_bar.grid(axis='y', linestyle='--', alpha=0.5)
+
+            story.append(plot_to_img(fig_bar))
+            plt.close(fig_bar)
+        else:
+            story.append(Paragraph("Geen weekdata beschikbaar voor werkdagen.", styles["Italic"]))
+    else:
+        story.append(Paragraph("Geen welzijnsdata beschikbaar.", styles["Italic"]))
+
+    story.append(Spacer(1, 15))
+
+    # SECTIE 4: SANKEY INTEGRATIE
+    stap(0.65, "Oorzaak & gevolg")
+    story.append(Paragraph("4. Oorzaak & Gevolg (Flow)", h2_style))
+    story.append(Paragraph("De flow van Klasmanagement naar Lesaanpak.", styles["Normal"]))
+    story.append(Spacer(1, 10))
+
+    if not r_les_df.empty:
+        fig_sankey = draw_sankey_butterfly(r_les_df)
+
+        if fig_sankey:
+            fig_sankey.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+            try:
+                story.append(plotly_to_pdf_img(fig_sankey))
+            except RenderError as e:
+                if problems is not None:
+                    problems.append(f"Sankey niet gegenereerd: {e}")
+                story.append(Paragraph(f"<i>Kon de Sankey niet genereren ({escape(str(e))}).</i>", styles["Normal"]))
+        else:
+            story.append(Paragraph("Te weinig flows om te visualiseren.", styles["Italic"]))
+    else:
+        story.append(Paragraph("Geen lesdata beschikbaar.", styles["Italic"]))
+
+    # BIJLAGE: JOUW KLASSEN (gedeelde klassecties uit de batch)
+    if class_sections:
+        stap(0.8, "Jouw klassen")
+        story.append(PageBreak())
+        story.append(Paragraph("5. Jouw Klassen: Beeld van de School", h2_style))
+        story.append(Paragraph("Alle registraties van collega's in deze klassen, anoniem samengevoegd.", styles["Normal"]))
+        for klas in sorted(class_sections):
+            story.extend(class_section_flowables(class_sections[klas], benchmark, styles))
+
+    stap(0.9, "PDF samenstellen")
+    doc.build(story)
+    stap(1.0, "Klaar")
+    return buffer.getvalue()
+
+
+# -------------------------------------------------
+# KLASRAPPORT (ANONIEM)
+# -------------------------------------------------
+def _fig_png(fig):
+    """Matplotlib naar PNG-bytes (picklebaar, in tegenstelling tot een Image-flowable)."""
+    img_buf = io.BytesIO()
+    fig.savefig(img_buf, format='png', dpi=120, bbox_inches='tight')
+    plt.close(fig)
+    return img_buf.getvalue()
+
+
+def render_class_sections(klas, les_df):
+    """
+    Rendert de klasonderdelen één keer: kerncijfers, verdeling 1-5 en de Sankey.
+    les_df bevat alle lessen van de klas in de periode; e-mails worden niet gebruikt.
+    Het resultaat is een dict met PNG-bytes, zodat één render zowel in het klasrapport
+    als in de bijlage van elk leerkrachtrapport met deze klas terechtkomt.
+    """
+    sections = {"klas": klas, "n": len(les_df), "gemiddelden": {}, "verdeling": None,
+                "sankey": None, "sankey_fout": None}
+    if les_df.empty:
+        return sections
+
+    scores = {s: les_df[s] for s in ("Lesaanpak", "Klasmanagement")}
+    sections["gemiddelden"] = {s: (0 if pd.isna(w.mean()) else w.mean()) for s, w in scores.items()}
+
+    # Verdeling van de scores (gegroepeerde staven, 1-5)
+    niveaus = [1, 2, 3, 4, 5]
+    x = np.arange(len(niveaus))
+    width = 0.35
+    fig_bar, ax_bar = plt.subplots(figsize=(10, 3.5))
+    ax_bar.bar(x - width/2, [int((scores["Lesaanpak"].round() == k).sum()) for k in niveaus], width,
+               label='Lesaanpak', color='#2980b9')
+    ax_bar.bar(x + width/2, [int((scores["Klasmanagement"].round() == k).sum()) for k in niveaus], width,
+               label='Klasmanagement', color='#e67e22')
+    ax_bar.set_ylabel('Aantal lessen')
+    ax_bar.set_xticks(x)
+    ax_bar.set_xticklabels([str(k) for k in niveaus])
+    ax_bar.legend(loc='lower center', bbox_to_anchor=(0.5, 1.05), ncol=2, frameon=False)
+    ax_bar.grid(axis='y', linestyle='--', alpha=0.5)
+    sections["verdeling"] = _fig_png(fig_bar)
+
+    fig_sankey = draw_sankey_butterfly(les_df)
+    if fig_sankey:
+        fig_sankey.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+        try:
+            sections["sankey"] = get_render_pool().render(fig_sankey, fmt="png", width=1100, height=600, scale=2)
+        except RenderError as e:
+            sections["sankey_fout"] = str(e)
+    return sections
+
+
+def class_section_flowables(sections, benchmark, styles):
+    """De gerenderde klasonderdelen als reportlab-flowables."""
+    story = [Paragraph(f"Klas {escape(str(sections['klas']))}", styles["Heading3"])]
+    if not sections["n"]:
+        story.append(Paragraph("Geen lessen in deze periode.", styles["Italic"]))
+        return story
+
+    # Live benchmark van deze klas (alle registraties, niet enkel de periode)
+    klas_ref = benchmark.get("klassen", {}).get(str(sections["klas"]), {})
+    tbl_data = [["Indicator", "Klas", "Klas (alle live data)", "Gem. School", "Verschil"]]
+    for s in ("Lesaanpak", "Klasmanagement"):
+        klas_gem, school_gem = sections["gemiddelden"][s], benchmark.get(s, 0)
+        tbl_data.append([s, f"{klas_gem:.1f}", f"{klas_ref[s]:.1f}" if klas_ref else "-",
+                         f"{school_gem:.1f}", get_delta_text(klas_gem, school_gem)])
+    tbl_data.append(["Registraties", str(sections["n"]), str(int(klas_ref["n"])) if klas_ref else "-", "", ""])
+    t = Table(tbl_data, colWidths=[150, 100, 140, 120, 120])
+    t.setStyle(TableStyle([
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#34495e")),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0,1), (-1,-1), colors.HexColor("#ecf0f1")),
+        ('GRID', (0,0), (-1,-1), 1, colors.white),
+    ]))
+    story += [t, Spacer(1, 10)]
+
+    if sections["verdeling"]:
+        story.append(ReportLabImage(io.BytesIO(sections["verdeling"]), width=600, height=210))
+    if sections["sankey"]:
+        story.append(ReportLabImage(io.BytesIO(sections["sankey"]), width=700, height=380))
+    elif sections["sankey_fout"]:
+        story.append(Paragraph(f"<i>Kon de Sankey niet genereren ({escape(sections['sankey_fout'])}).</i>", styles["Normal"]))
+    story.append(Spacer(1, 15))
+    return story
+
+
+def build_class_report(rapport_periode, sections, benchmark, problems=None):
+    """Anoniem klasrapport voor de directie, opgebouwd uit render_class_sections()."""
+    if sections["sankey_fout"] and problems is not None:
+        problems.append(f"Sankey klas {sections['klas']} niet gegenereerd: {sections['sankey_fout']}")
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30
+    )
+    styles = getSampleStyleSheet()
+    title_style = styles["Title"]
+    title_style.textColor = colors.HexColor("#2c3e50")
+
+    story = [
+        Paragraph("Leerkrachten Monitor: Klasrapport", title_style),
+        Paragraph(f"<b>Klas:</b> {escape(str(sections['klas']))} | <b>Periode:</b> {rapport_periode}", styles["Normal"]),
+        Spacer(1, 20),
+    ]
+    story.extend(class_section_flowables(sections, benchmark, styles))
+    doc.build(story)
+    return buffer.getvalue()
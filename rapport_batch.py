@@ -0,0 +1,195 @@
+"""
+Eindrapporten in bulk: één PDF per leerkracht en een anoniem rapport per klas.
+
+Het werk wordt over een process pool verdeeld (reportlab, matplotlib en kaleido zijn
+CPU-gebonden en niet thread-safe genoeg om op threads te schalen) en elke PDF gaat
+rechtstreeks in één ZIP-bestand op schijf zodra hij klaar is. De klasonderdelen
+worden per klas één keer gerenderd (fase 1) en daarna meegegeven aan elk
+leerkrachtrapport met die klas (fase 2).
+
+Streamlit zet het dashboard-script als __main__, en spawn-workers zouden dat script
+opnieuw uitvoeren. Daarom draait de pool in een apart Python-proces
+(python -m rapport_batch) dat voortgang als JSON-regels op stdout meldt.
+"""
+import json
+import os
+import pickle
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from rapport import build_class_report, build_teacher_report, render_class_sections, report_names
+from render_pool import configure_render_pool
+
+
+def _init_worker(render_opties):
+    import matplotlib
+    matplotlib.use("Agg")
+    configure_render_pool(**render_opties)
+
+
+def _class_job(klas, rapport_periode, les_df, benchmark):
+    problems = []
+    sections = render_class_sections(klas, les_df)
+    pdf = build_class_report(rapport_periode, sections, benchmark, problems=problems)
+    return klas, sections, pdf, problems
+
+
+def _teacher_job(email, rapport_periode, day_df, les_df, benchmark, class_sections):
+    problems = []
+    naam, bestandsnaam = report_names(email)
+    pdf = build_teacher_report(naam, rapport_periode, day_df, les_df, benchmark,
+                               problems=problems, class_sections=class_sections)
+    return bestandsnaam, pdf, problems
+
+
+def _safe_name(tekst):
+    return re.sub(r"[^\w.-]+", "_", str(tekst)).strip("_") or "onbekend"
+
+
+def run_batch_reports(zip_path, rapport_periode, r_day_df, r_les_df, class_les_df, benchmark,
+                      max_workers=None, render_options=None, progress=None, problems=None):
+    """
+    Schrijft alle rapporten naar zip_path (in een apart proces) en geeft zip_path terug.
+
+    r_day_df / r_les_df: live registraties (met Email), al op periode gefilterd.
+    class_les_df: alle lessen voor de klasrapporten (live + legacy), al gefilterd.
+    progress(fractie, tekst) en problems volgen de conventie van ReportJobs.
+    """
+    with tempfile.TemporaryDirectory(prefix="lkm-batch-") as tmp:
+        opdracht = os.path.join(tmp, "opdracht.pkl")
+        with open(opdracht, "wb") as f:
+            pickle.dump(dict(zip_path=os.path.abspath(zip_path), rapport_periode=rapport_periode,
+                             r_day_df=r_day_df, r_les_df=r_les_df, class_les_df=class_les_df,
+                             benchmark=benchmark, max_workers=max_workers, render_options=render_options), f)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+            [os.path.dirname(os.path.abspath(__file__))] + [p for p in [os.environ.get("PYTHONPATH")] if p]))
+        proc = subprocess.Popen([sys.executable, "-m", "rapport_batch", opdracht], env=env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # stderr in een thread leegmaken, anders kan het kindproces blokkeren
+        fouten = []
+        lezer = threading.Thread(target=lambda: fouten.append(proc.stderr.read()), daemon=True)
+        lezer.start()
+        for regel in proc.stdout:
+            try:
+                bericht = json.loads(regel)
+            except ValueError:
+                continue
+            if "probleem" in bericht and problems is not None:
+                problems.append(bericht["probleem"])
+            elif "voortgang" in bericht and progress:
+                progress(bericht["voortgang"], bericht["tekst"])
+        proc.wait()
+        lezer.join()
+    if proc.returncode != 0:
+        laatste = (fouten[0].strip().splitlines() or ["onbekende fout"])[-1] if fouten else "onbekende fout"
+        raise RuntimeError(f"Batchproces gestopt (code {proc.returncode}): {laatste}")
+    return zip_path
+
+
+def _build_all(zip_path, rapport_periode, r_day_df, r_les_df, class_les_df, benchmark,
+               max_workers=None, render_options=None, progress=None, problems=None):
+    """Het eigenlijke werk (in het batchproces): process pool + ZIP."""
+    def stap(fractie, tekst):
+        if progress:
+            progress(fractie, tekst)
+
+    if problems is None:
+        problems = []
+    class_les_df = class_les_df.drop(columns=["Email"], errors="ignore")
+    klas_groepen = {str(k): g for k, g in class_les_df.groupby(class_les_df["Klas"].astype(str))}
+    emails = sorted(set(r_day_df.get("Email", pd.Series(dtype=str)).dropna())
+                    | set(r_les_df.get("Email", pd.Series(dtype=str)).dropna()))
+    totaal = max(len(klas_groepen) + len(emails), 1)
+    klaar = 0
+
+    os.makedirs(os.path.dirname(zip_path) or ".", exist_ok=True)
+    tmp_path = zip_path + ".tmp"
+    executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                   initargs=(render_options or {},))
+    start = time.perf_counter()
+    try:
+        with executor, zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            # Fase 1: klassen (sectie-renders worden hergebruikt in fase 2)
+            stap(0.0, f"Klasrapporten (0/{len(klas_groepen)})")
+            futures = [executor.submit(_class_job, klas, rapport_periode, groep, benchmark)
+                       for klas, groep in klas_groepen.items()]
+            class_sections = {}
+            for future in as_completed(futures):
+                try:
+                    klas, sections, pdf, fouten = future.result()
+                except Exception as e:
+                    problems.append(f"Klasrapport mislukt: {e}")
+                else:
+                    class_sections[klas] = sections
+                    zf.writestr(f"klassen/Klas_{_safe_name(klas)}.pdf", pdf)
+                    problems.extend(fouten)
+                klaar += 1
+                stap(klaar / totaal, f"Klasrapporten ({klaar}/{len(klas_groepen)})")
+
+            # Fase 2: leerkrachten
+            dag_per_email = dict(tuple(r_day_df.groupby("Email"))) if "Email" in r_day_df.columns else {}
+            les_per_email = dict(tuple(r_les_df.groupby("Email"))) if "Email" in r_les_df.columns else {}
+            leeg_dag, leeg_les = r_day_df.iloc[0:0], r_les_df.iloc[0:0]
+            futures = {}
+            namen = set()
+            for email in emails:
+                eigen_les = les_per_email.get(email, leeg_les)
+                eigen_klassen = set(eigen_les["Klas"].astype(str)) if "Klas" in eigen_les.columns else set()
+                secties = {k: class_sections[k] for k in eigen_klassen if k in class_sections}
+                future = executor.submit(_teacher_job, email, rapport_periode,
+                                         dag_per_email.get(email, leeg_dag), eigen_les, benchmark, secties)
+                futures[future] = email
+            for future in as_completed(futures):
+                try:
+                    bestandsnaam, pdf, fouten = future.result()
+                except Exception as e:
+                    problems.append(f"Rapport {futures[future]} mislukt: {e}")
+                else:
+                    # Zelfde naam voor de @ bij twee domeinen: volgnummer toevoegen
+                    basis, nr = bestandsnaam[:-len(".pdf")], 1
+                    while bestandsnaam in namen:
+                        nr += 1
+                        bestandsnaam = f"{basis}_{nr}.pdf"
+                    namen.add(bestandsnaam)
+                    zf.writestr(f"leerkrachten/{bestandsnaam}", pdf)
+                    problems.extend(fouten)
+                klaar += 1
+                stap(klaar / totaal, f"Leerkrachtrapporten ({klaar - len(klas_groepen)}/{len(emails)})")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, zip_path)
+    stap(1.0, f"{totaal} rapporten in {time.perf_counter() - start:.0f}s")
+    return zip_path
+
+
+class _ProblemList(list):
+    """Meldt elk probleem meteen aan het ouderproces."""
+
+    def append(self, probleem):
+        super().append(probleem)
+        _melden({"probleem": probleem})
+
+    def extend(self, problemen):
+        for probleem in problemen:
+            self.append(probleem)
+
+
+def _melden(bericht):
+    print(json.dumps(bericht), flush=True)
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1], "rb") as f:
+        opdracht = pickle.load(f)
+    _build_all(**opdracht, progress=lambda fractie, tekst: _melden({"voortgang": fractie, "tekst": tekst}),
+               problems=_ProblemList())
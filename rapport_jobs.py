@@ -0,0 +1,155 @@
+"""
+Het lichte deel van de rapporten: periodes, filteren, cachesleutels en de
+achtergrond-opbouw (ReportJobs).
+
+Dit importeert geen reportlab, seaborn of matplotlib, zodat de rapporttabbladen
+kunnen renderen zonder die te laden. De PDF-opbouw zelf zit in rapport.py en wordt
+pas geïmporteerd als er effectief een rapport gemaakt wordt.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+
+# -------------------------------------------------
+# SLEUTELS & PERIODES
+# -------------------------------------------------
+def frame_digest(df):
+    """Stabiele hash van de inhoud van een DataFrame (kolommen + waarden)."""
+    h = hashlib.sha256(",".join(map(str, df.columns)).encode())
+    if not df.empty:
+        h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def report_key(*delen):
+    """Sleutel voor de rapport-cache: DataFrames via hun inhoud, de rest via repr()."""
+    h = hashlib.sha256()
+    for deel in delen:
+        h.update((frame_digest(deel) if isinstance(deel, pd.DataFrame) else repr(deel)).encode())
+        h.update(b"|")
+    return h.hexdigest()
+
+
+RAPPORT_PERIODES = ["Laatste 2 weken", "Laatste 30 dagen", "Huidig Schooljaar"]
+
+
+def period_start(rapport_periode, now=None):
+    """Startdatum van een rapportperiode (zie RAPPORT_PERIODES)."""
+    now = now if now is not None else pd.Timestamp.now()
+    if rapport_periode == "Laatste 2 weken":
+        return now - pd.Timedelta(days=14)
+    if rapport_periode == "Laatste 30 dagen":
+        return now - pd.Timedelta(days=30)
+    if rapport_periode == "Huidig Schooljaar":
+        return pd.Timestamp(year=now.year - 1 if now.month < 9 else now.year, month=9, day=1)
+    return now
+
+
+def prepare_report_frames(day_df, les_df, start_date):
+    """Dag- en lesdata vanaf start_date. Verwacht getypeerde frames (ingest.py), dus enkel filteren."""
+    start_date = pd.Timestamp(start_date)
+    return day_df[day_df["Datum"] >= start_date], les_df[les_df["Datum"] >= start_date]
+
+
+def report_names(email):
+    """(Naam zoals in het rapport, bestandsnaam) voor een e-mailadres."""
+    raw_name = email.split('@')[0]
+    return raw_name.replace('.', ' ').title(), f"Rapport_{raw_name.replace('.', '_')}.pdf"
+
+
+# -------------------------------------------------
+# ACHTERGROND-OPBOUW + CACHE
+# -------------------------------------------------
+class ReportJob:
+    def __init__(self):
+        self.future = None
+        self.progress = 0.0
+        self.label = "In de wachtrij"
+        self.problems = []
+        self.timings = []  # (sectie, seconden), voor de tijdsmeting (zie timing.py)
+        self._sinds = None
+
+    def update(self, fractie, tekst):
+        # De tijd sinds de vorige update hoort bij de vorige sectie
+        self._lap()
+        self.progress, self.label = fractie, tekst
+
+    def _lap(self):
+        nu = time.perf_counter()
+        if self._sinds is not None:
+            self.timings.append((self.label, nu - self._sinds))
+        self._sinds = nu
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+
+class ReportJobs:
+    """
+    Bouwt rapporten op een kleine thread pool en bewaart de PDF's in een LRU-cache
+    op inhoudssleutel (zie report_key). Twee aanvragen voor dezelfde sleutel delen
+    dezelfde job. on_evict(key, waarde) loopt voor elk resultaat dat uit de cache valt
+    (bv. om een bestand op schijf op te ruimen).
+    """
+
+    def __init__(self, max_workers=2, max_entries=64, on_evict=None, name="lkm-rapport"):
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._jobs = {}
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._cache.get(key)
+            if pdf is not None:
+                self._cache.move_to_end(key)
+            return pdf
+
+    def values(self):
+        """De resultaten die nu in de cache zitten."""
+        with self._lock:
+            return list(self._cache.values())
+
+    def submit(self, key, fn, *args, **kwargs):
+        """
+        Start fn(*args, progress=..., problems=..., **kwargs) op de achtergrond, tenzij al
+        bezig. Een PDF met problemen wordt niet gecachet, zodat opnieuw proberen kan.
+        """
+        def _run(job):
+            job.update(job.progress, "Voorbereiden")
+            try:
+                pdf = fn(*args, progress=job.update, problems=job.problems, **kwargs)
+                job._lap()
+                if job.problems:
+                    return pdf
+                with self._lock:
+                    self._cache[key] = pdf
+                    self._cache.move_to_end(key)
+                    weg = []
+                    while len(self._cache) > self.max_entries:
+                        weg.append(self._cache.popitem(last=False))
+                for oud in weg:
+                    if self.on_evict:
+                        self.on_evict(*oud)
+                return pdf
+            finally:
+                with self._lock:
+                    self._jobs.pop(key, None)
+
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = ReportJob()
+                job.future = self._pool.submit(_run, job)
+                self._jobs[key] = job
+            return job
@@ -1,179 +1,30 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import date, timedelta
-import os, glob, hashlib
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from streamlit_gsheets import GSheetsConnection
-# --- VOEG DEZE TOE BIJ JE IMPORTS ---
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-import gc  # Garbage Collector
+import os, glob, hashlib, time
+import importlib.util
+import uuid
+# Zware bibliotheken (plotly.express, streamlit_gsheets, reportlab, seaborn, matplotlib,
+# wordcloud) worden pas geladen in de view of functie die ze nodig heeft: de loginpagina
+# en het daggevoel renderen zonder. benchmarks/import_budget.py bewaakt dat.
+from storage import open_store, WriteQueue, WS_DAG, WS_LESSEN, lege_frame
+from users import UserDirectory, UserExistsError
+from rollup import LessonCube, Benchmarks, DaySeries
+from wordclouds import WordcloudCache, tag_frequencies
+from figure_cache import FigureCache
+from tags import POS_MOODS, NEG_MOODS, VOCABULAIRE
+from ingest import concat_typed, ingest
+from schooldata import SchoolData
+import timing
+from timing import span
 
 # --- NIEUWE FUNCTIES VOOR DE DIRECTIE (ANONIEM) ---
 def load_all_school_data():
     """Laadt alle CSV's uit de map, voegt ze samen en verwijdert namen."""
-    all_lessons = []
-    all_days = []
-    
-    # 1. Alle lesbestanden samenvoegen
-    lesson_files = glob.glob(f"{DATA_DIR}/*_lessons.csv")
-    for f in lesson_files:
-        try:
-            df = pd.read_csv(f)
-            all_lessons.append(df)
-        except:
-            pass
-            
-    # 2. Alle dagbestanden samenvoegen
-    day_files = glob.glob(f"{DATA_DIR}/*_day.csv")
-    for f in day_files:
-        try:
-            df = pd.read_csv(f)
-            all_days.append(df)
-        except:
-            pass
-
-    # Samenvoegen (indien data aanwezig)
-    df_lessons_total = pd.concat(all_lessons, ignore_index=True) if all_lessons else pd.DataFrame()
-    df_days_total = pd.concat(all_days, ignore_index=True) if all_days else pd.DataFrame()
-    
-    return df_days_total, df_lessons_total
-
-import plotly.colors as pc
+    # Parallel ingelezen en per bestand gecachet: enkel gewijzigde bestanden worden herlezen
+    legacy = get_legacy_store()
+    return legacy.read(WS_DAG), legacy.read(WS_LESSEN)
 
-def draw_ridgeline_artistic(df, kolom, titel, basis_kleur_naam="Teal"):
-    """
-    Maakt een 'Joyplot' met overlappende 'bergen' en een gradiënt.
-    """
-    if df.empty: return None
-    
-    klassen = sorted(df["Klas"].unique(), reverse=True)
-    fig = go.Figure()
-
-    # Genereer een kleurenpalet op basis van het aantal klassen
-    # We pakken een spectrum (bijv. Teal of Sunset)
-    colors = px.colors.sample_colorscale(basis_kleur_naam, [n/(len(klassen)) for n in range(len(klassen))])
-
-    for i, klas in enumerate(klassen):
-        df_k = df[df["Klas"] == klas]
-        
-        fig.add_trace(go.Violin(
-            x=df_k[kolom],
-            y=[klas] * len(df_k),
-            name=klas,
-            side='positive', 
-            orientation='h', 
-            width=2.5,  # Breder = meer overlap = mooier effect
-            line_color='white', # Witte rand maakt het 'clean'
-            line_width=1,
-            fillcolor=colors[i], # Gradiënt kleur
-            opacity=0.8,
-            points=False,
-            meanline_visible=False # Geen harde lijnen
-        ))
-
-    fig.update_layout(
-        title=dict(text=titel, font=dict(size=20, family="Arial", color="#333")),
-        xaxis_title=None,
-        yaxis_title=None,
-        showlegend=False,
-        height=120 + (len(klassen) * 40),
-        margin=dict(l=0, r=0, t=50, b=20),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        xaxis=dict(range=[0.5, 5.5], showgrid=False, zeroline=False, visible=True),
-        yaxis=dict(showgrid=False, showline=False, showticklabels=True)
-    )
-    return fig
-
-def draw_sankey_butterfly(df):
-    """
-    Creëert een Butterfly Sankey: Negatief (links) -> Klassen (midden) -> Positief (rechts).
-    """
-    if df.empty: return None
-    
-    # 1. Data Voorbereiding
-    def clean_labels(df, kolom):
-        temp = df.copy()
-        temp[kolom] = temp[kolom].astype(str).str.split(',')
-        temp = temp.explode(kolom)
-        temp[kolom] = temp[kolom].str.strip()
-        return temp[(temp[kolom] != 'nan') & (temp[kolom] != '')]
-
-    df_pos = clean_labels(df, 'Positief')
-    df_neg = clean_labels(df, 'Negatief')
-
-    counts_pos = df_pos.groupby(['Klas', 'Positief']).size().reset_index(name='Aantal')
-    counts_neg = df_neg.groupby(['Negatief', 'Klas']).size().reset_index(name='Aantal')
-
-    # 2. Nodes bepalen (Negatief -> Klassen -> Positief)
-    neg_uniek = sorted(list(counts_neg['Negatief'].unique()))
-    klassen_uniek = sorted(list(df['Klas'].unique()))
-    pos_uniek = sorted(list(counts_pos['Positief'].unique()))
-    
-    all_nodes = neg_uniek + klassen_uniek + pos_uniek
-    node_map = {name: i for i, name in enumerate(all_nodes)}
-
-    # 3. Kleuren voor de Nodes
-    # Roodachtig voor negatief, Grijs voor klassen, Groenachtig voor positief
-    node_colors = (["#ff7675"] * len(neg_uniek) + 
-                   ["#636e72"] * len(klassen_uniek) + 
-                   ["#55efc4"] * len(pos_uniek))
-
-    # 4. Links opbouwen
-    sources = []
-    targets = []
-    values = []
-    link_colors = []
-
-    # Negatief -> Klas (Links naar Midden)
-    for _, row in counts_neg.iterrows():
-        sources.append(node_map[row['Negatief']])
-        targets.append(node_map[row['Klas']])
-        values.append(row['Aantal'])
-        link_colors.append("rgba(214, 48, 49, 0.3)") # Transparant rood
-
-    # Klas -> Positief (Midden naar Rechts)
-    for _, row in counts_pos.iterrows():
-        sources.append(node_map[row['Klas']])
-        targets.append(node_map[row['Positief']])
-        values.append(row['Aantal'])
-        link_colors.append("rgba(0, 184, 148, 0.3)") # Transparant groen
-
-    # 5. Dynamische Hoogte
-    dynamic_height = max(600, len(all_nodes) * 35)
-
-    fig = go.Figure(data=[go.Sankey(
-        textfont=dict(size=13, color="black", family="Arial Black"),
-        node = dict(
-          pad = 35, thickness = 20,
-          line = dict(color = "white", width = 1),
-          label = [f" {n} " for n in all_nodes],
-          color = node_colors
-        ),
-        link = dict(
-          source = sources,
-          target = targets,
-          value = values,
-          color = link_colors
-        )
-    )])
-
-    fig.update_layout(
-        title=dict(text="⚖️ Balans per Klas: Negatief vs Positief", font=dict(size=22)),
-        height=dynamic_height,
-        font=dict(size=12),
-        margin=dict(l=40, r=40, t=80, b=40),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)'
-    )
-    return fig
 # -------------------------------------------------
 # CONFIG
 # -------------------------------------------------
@@ -190,6 +41,182 @@ os.makedirs(DATA_DIR, exist_ok=True)
 # Google Sheets URL voor Daggevoel
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1pz_9hhCSaTEkRs71nrTJiayfXksHJJMvSc08rYmxeu0/edit?usp=sharing"
 
+def get_config(sleutel, standaard=None):
+    """Instelling uit de omgeving (LKM_<SLEUTEL>) of uit st.secrets['monitor']."""
+    waarde = os.environ.get(f"LKM_{sleutel.upper()}")
+    if waarde is not None:
+        return waarde
+    try:
+        return st.secrets.get("monitor", {}).get(sleutel, standaard)
+    except Exception:
+        # Geen secrets.toml aanwezig
+        return standaard
+
+# -------------------------------------------------
+# TIJDSMETING
+# -------------------------------------------------
+@st.cache_resource
+def get_timing_stats():
+    """Rollende spantijden van alle sessies (één per proces); zet ook de JSON-logs op."""
+    # timing_log: 'stderr' (standaard), een bestandspad of 'off'
+    timing.configure_logging(get_config("timing_log", "stderr"))
+    return timing.TimingStats(window=int(get_config("timing_window", 200)))
+
+# Elke rerun is één meting met geneste spans (zie timing.py), gelabeld met sessie en rol
+if "timing_sessie" not in st.session_state:
+    st.session_state.timing_sessie = uuid.uuid4().hex[:12]
+perf_run = timing.start_rerun(st.session_state.timing_sessie,
+                              rol=st.session_state.get("user", {}).get("role"),
+                              stats=get_timing_stats())
+
+def plotly_chart(fig, naam):
+    """Statische Plotly-grafiek; de span meet de serialisatie naar de browser."""
+    with span(f"plotly.{naam}"):
+        st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+
+# -------------------------------------------------
+# OPSLAG
+# -------------------------------------------------
+def open_gsheets():
+    """De echte Google Sheets-verbinding (streamlit_gsheets pas hier geladen)."""
+    with span("import.gsheets"):
+        from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+@st.cache_resource
+def get_store():
+    """Eén opslag-backend per proces: 'sheets' (standaard), 'sqlite' of 'legacy_csv'."""
+    backend = get_config("storage", "sheets")
+    if backend == "sqlite":
+        return open_store("sqlite", path=get_config("sqlite_path", f"{DATA_DIR}/monitor.db"))
+    if backend == "legacy_csv":
+        return open_store("legacy_csv", data_dir=DATA_DIR)
+    # sheets_mode: 'live' (standaard), 'fake', 'record' of 'replay' (zie fakesheets.py)
+    sheets_mode = get_config("sheets_mode", "live")
+    if sheets_mode == "live":
+        conn = open_gsheets()
+    else:
+        from fakesheets import open_connection
+        conn = open_connection(sheets_mode, live=open_gsheets,
+                               latency=get_config("fake_latency", 0),
+                               quota_per_minute=get_config("fake_quota", 0),
+                               error_rate=get_config("fake_error_rate", 0),
+                               dataset=get_config("fake_dataset", "klein"),
+                               record_dir=get_config("sheets_record_dir", f"{DATA_DIR}/.cache/sheets_opname"),
+                               seed=get_config("fake_seed"))
+    return open_store("sheets", conn=conn, spreadsheet=SHEET_URL,
+                      cache_max_age=get_config("cache_max_age", 30))
+
+@st.cache_resource
+def get_legacy_store():
+    """De oude data/*_lessons.csv en *_day.csv bestanden (alleen lezen, één cache per proces)."""
+    return open_store("legacy_csv", data_dir=DATA_DIR)
+
+@st.cache_resource
+def get_report_jobs():
+    """Achtergrond-opbouw van PDF-rapporten met een cache op inhoud (één per proces)."""
+    from rapport_jobs import ReportJobs
+    from render_pool import configure_render_pool
+    # Langlevende kaleido-renderers + PNG-cache voor de Plotly-figuren in de PDF
+    configure_render_pool(size=int(get_config("render_workers", 2)),
+                          timeout=float(get_config("render_timeout", 30)),
+                          cache_dir=os.path.join(DATA_DIR, ".cache", "plotly"))
+    return ReportJobs()
+
+BATCH_DIR = os.path.join(DATA_DIR, ".cache", "batch")
+
+def prune_batch_zips(behouden=()):
+    """Verwijdert eindrapporten_*.zip in BATCH_DIR die geen gecachete batch meer zijn."""
+    behouden = {os.path.abspath(p) for p in behouden}
+    for pad in glob.glob(os.path.join(BATCH_DIR, "eindrapporten_*.zip")):
+        if os.path.abspath(pad) not in behouden:
+            try:
+                os.remove(pad)
+            except OSError:
+                pass
+
+@st.cache_resource
+def get_batch_jobs():
+    """
+    Eindrapporten-batches op een eigen worker, los van get_report_jobs(): een lopende
+    batch houdt de PDF van een leerkracht niet op. De ZIP's staan op schijf; wat uit
+    de LRU valt, wordt verwijderd.
+    """
+    from rapport_jobs import ReportJobs
+    # Bij de start verwijst nog geen enkele sleutel naar een ZIP van een vorig proces
+    prune_batch_zips()
+
+    def verwijder(_, zip_pad):
+        # Ook ZIP's van batches met problemen (nooit gecachet); met één worker loopt er
+        # op dit moment geen andere batch die nog naar zijn ZIP schrijft
+        prune_batch_zips(batch_jobs.values())
+
+    batch_jobs = ReportJobs(max_workers=1, max_entries=int(get_config("batch_cache_size", 4)),
+                            on_evict=verwijder, name="lkm-batch")
+    return batch_jobs
+
+@st.cache_resource
+def get_write_queue():
+    """Achtergrond-schrijver voor daggevoel en lessen (één per proces)."""
+    # Schrijft via CachedStore.append(), dat zelf de cache van dat werkblad bijwerkt:
+    # geen extra listener voor de store (anders staat elke rij twee keer in de cache)
+    # write_max_attempts: pogingen per bundel; daarna als CSV opzij in data/niet_opgeslagen
+    return WriteQueue(get_store(), max_attempts=int(get_config("write_max_attempts", 6)),
+                      dead_letter_dir=os.path.join(DATA_DIR, "niet_opgeslagen"))
+
+@st.cache_resource
+def get_school_data():
+    """
+    Eén getypeerde kopie van daggevoel en lessen voor alle sessies (één download per
+    versie, niet per sessie). Ververst op schema en meteen na elke eigen schrijfactie.
+    """
+    school_data = SchoolData(get_store(), get_legacy_store(),
+                             refresh_interval=float(get_config("refresh_interval", 60))).start()
+    # Listeners lopen na store.append(), dus de store kent de nieuwe rijen dan al
+    get_write_queue().add_listener(school_data.on_append)
+    return school_data
+
+def with_pending(df, worksheet, email):
+    """Voegt eigen registraties toe die nog in de schrijfwachtrij staan (getypeerd)."""
+    pending = get_write_queue().pending(worksheet, email)
+    if pending.empty:
+        return df
+    return concat_typed(worksheet, df, ingest(worksheet, pending))
+
+def day_series_with_pending(email):
+    """Eigen daggevoel per dag (prefixsommen, gedeeld per versie) plus rijen die nog in de wachtrij staan."""
+    reeks = get_school_data().day_series(email)
+    pending = get_write_queue().pending(WS_DAG, email)
+    return reeks if pending.empty else reeks.extend(ingest(WS_DAG, pending))
+
+@st.cache_resource
+def get_wordcloud_cache():
+    """Gerenderde trefwoordenwolken, op frequentie-signatuur (één LRU per proces)."""
+    return WordcloudCache(cache_dir=os.path.join(DATA_DIR, ".cache", "wordcloud"))
+
+def generate_wordcloud_png(dataframe):
+    """PNG van de tagwolk voor deze lessen, of None als er geen tags zijn."""
+    frequenties = tag_frequencies(dataframe)
+    if not frequenties:
+        return None
+    try:
+        with span("wordcloud"):
+            return get_wordcloud_cache().get_png(frequenties)
+    except ImportError:
+        st.error("Module 'wordcloud' ontbreekt. Voeg toe aan requirements.txt.")
+        return None
+
+@st.cache_resource
+def get_figure_cache():
+    """Gebouwde Plotly-figuren op (naam, dataversie, filters), gedeeld over alle sessies."""
+    # figure_cache_size: hoeveel figuren het proces bijhoudt (LRU)
+    return FigureCache(max_entries=int(get_config("figure_cache_size", 256)))
+
+def cached_figure(naam, versie, filters, bouw):
+    """Figuur uit de gedeelde cache; bouw() loopt enkel bij nieuwe data of andere filters."""
+    with span(f"chart.{naam}"):
+        return get_figure_cache().get(naam, versie, filters, bouw)
+
 # -------------------------------------------------
 # HELPERS
 # -------------------------------------------------
@@ -209,35 +236,27 @@ def lesson_file(email):
 # USERS
 # -------------------------------------------------
 # --- AANGEPASTE USERS FUNCTIES (GOOGLE SHEETS) ---
-def load_users():
-    # We maken verbinding
-    conn = st.connection("gsheets", type=GSheetsConnection)
+@st.cache_resource
+def get_user_directory():
+    """Eén gebruikersregister per proces (dict op genormaliseerd e-mailadres)."""
+    return UserDirectory(get_store())
+
+def find_user(email):
     try:
-        # We lezen het tabblad 'Users'. TTL=0 betekent geen caching (altijd verse data)
-        df = conn.read(spreadsheet=SHEET_URL, worksheet="Users", ttl=0)
-        # Zorg dat de kolommen bestaan als de sheet leeg is
-        if df.empty or "email" not in df.columns:
-            return pd.DataFrame(columns=["email", "password", "role"])
-        return df
+        return get_user_directory().get(email)
     except Exception:
-        # Fallback als er iets mis is, return lege dataframe
-        return pd.DataFrame(columns=["email", "password", "role"])
-
-def save_users(df):
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    # Overschrijf het tabblad 'Users' met de nieuwe dataframe
-    conn.update(spreadsheet=SHEET_URL, worksheet="Users", data=df)
+        # Fallback als het werkblad niet bereikbaar is: niemand gevonden
+        return None
 
 # -------------------------------------------------
 # AUTO LOGIN
 # -------------------------------------------------
 params = st.query_params
 if "user" in params and "user" not in st.session_state:
-    users = load_users()
-    email = normalize_email(params["user"])
-    u = users[users.email == email]
-    if not u.empty:
-        st.session_state.user = u.iloc[0].to_dict()
+    with span("auth"):
+        u = find_user(params["user"])
+    if u is not None:
+        st.session_state.user = u
 
 # -------------------------------------------------
 # AUTH
@@ -249,8 +268,6 @@ st.markdown("""
     </h1>
     """, unsafe_allow_html=True)
 
-users = load_users()
-
 if "user" not in st.session_state:
     tab_login, tab_reg = st.tabs(["🔐 Inloggen", "🆕 Registreren"])
 
@@ -260,9 +277,10 @@ if "user" not in st.session_state:
         remember = st.checkbox("Onthoud mij")
 
         if st.button("Inloggen"):
-            u = users[users.email == email]
-            if not u.empty and hash_pw(pw) == u.iloc[0].password:
-                st.session_state.user = u.iloc[0].to_dict()
+            with span("auth"):
+                u = find_user(email)
+            if u is not None and hash_pw(pw) == u["password"]:
+                st.session_state.user = u
                 if remember:
                     st.query_params["user"] = email
                 st.rerun()
@@ -273,20 +291,22 @@ if "user" not in st.session_state:
         r_email = normalize_email(st.text_input("School-e-mail"))
         r_pw = st.text_input("Wachtwoord", type="password", key="reg_password")
         if st.button("Account aanmaken"):
-            if r_email in users.email.values:
-                st.error("Account bestaat al")
-            else:
-                role = "director" if r_email.startswith("directie") else "teacher"
-                users.loc[len(users)] = [r_email, hash_pw(r_pw), role]
-                save_users(users)
+            role = "director" if r_email.startswith("directie") else "teacher"
+            try:
+                with span("auth.register"):
+                    get_user_directory().register(r_email, hash_pw(r_pw), role)
                 st.success("Account aangemaakt")
+            except UserExistsError:
+                st.error("Account bestaat al")
 
+    timing.finish()
     st.stop()
 
 # -------------------------------------------------
 # LOGOUT
 # -------------------------------------------------
 user = st.session_state.user
+perf_run.rol = user["role"]
 st.sidebar.success(f"Ingelogd als {user['email']}")
 
 if st.sidebar.button("Uitloggen"):
@@ -297,107 +317,170 @@ if st.sidebar.button("Uitloggen"):
 # -------------------------------------------------
 # CONSTANTEN
 # -------------------------------------------------
-POS_MOODS = ["Inspirerend","Motiverend","Actief","Verbonden","Respectvol","Gefocust","Veilig","Energiek"]
-NEG_MOODS = ["Demotiverend","Passief","Onrespectvol","Chaotisch","Afgeleid","Rumoerig","Onveilig"]
+# POS_MOODS / NEG_MOODS komen uit tags.py (gesloten vocabulaire, zie het bitmasker)
 KLASSEN = [
     "5ECWI/WEWI/WEWIC","5HW","5ECMT/5MT/5WEMTC","5MT",
     "3HW/3MT","6ECWI-HW","6MT","6WEWI","6ECMT/6WEMT"
 ]
 
+def load_school_lessons():
+    """Alle lessen van de school: live registraties + de legacy CSV-bestanden (gedeeld, getypeerd)."""
+    return get_school_data().school_lessons()
+
+def lessons_version():
+    """Inhoudsversie van alle lessen: de gedeelde live frame en de legacy CSV's."""
+    school_data = get_school_data()
+    school_data.frame(WS_LESSEN)  # naar de laatste versie van de store
+    return school_data.version(WS_LESSEN), get_legacy_store().version(WS_LESSEN)
+
+def live_version(worksheet):
+    """Inhoudsversie van de live registraties van een werkblad (de gedeelde frame van SchoolData)."""
+    school_data = get_school_data()
+    school_data.frame(worksheet)
+    return school_data.version(worksheet)
+
+@st.cache_resource
+def get_lesson_cube():
+    """Klas x dag rollup van alle lessen, incrementeel bijgewerkt na elke opgeslagen les."""
+    cube = LessonCube(VOCABULAIRE)
+    # Eerst SchoolData registreren: zijn on_append loopt dan vóór de onze, zodat
+    # lessons_version() hieronder al de versie mét de nieuwe rijen geeft
+    school_data, legacy = get_school_data(), get_legacy_store()
+
+    def on_append(worksheet, rows):
+        if worksheet == WS_LESSEN:
+            cube.add_frame(rows, (school_data.version(WS_LESSEN), legacy.version(WS_LESSEN)))
+
+    get_write_queue().add_listener(on_append)
+    return cube
+
+def get_synced_lesson_cube():
+    """De cube, herbouwd als de inhoud van de lessen veranderde buiten onze eigen schrijver om."""
+    cube = get_lesson_cube()
+    cube.sync(lessons_version, load_school_lessons)
+    return cube
+
+@st.cache_resource
+def get_benchmarks():
+    """
+    Gemiddelden van alle leerkrachten, school en per klas, enkel uit de live registraties:
+    een eigen cube zonder de legacy CSV's (die blijven in de directie-cube).
+    """
+    benchmarks = Benchmarks(LessonCube(VOCABULAIRE))
+    school_data = get_school_data()
+
+    def on_append(worksheet, rows):
+        if worksheet == WS_LESSEN:
+            benchmarks.cube.add_frame(rows, school_data.version(WS_LESSEN))
+        elif worksheet == WS_DAG:
+            benchmarks.add_days(rows, school_data.version(WS_DAG))
+
+    get_write_queue().add_listener(on_append)
+    return benchmarks
+
+def get_synced_benchmarks():
+    benchmarks = get_benchmarks()
+    school_data = get_school_data()
+    benchmarks.cube.sync(lambda: live_version(WS_LESSEN), lambda: school_data.frame(WS_LESSEN))
+    benchmarks.sync_days(lambda: live_version(WS_DAG), lambda: school_data.frame(WS_DAG))
+    return benchmarks
+
 # =================================================
 # =============== LEERKRACHT VIEW =================
 # =================================================
 if user["role"] == "teacher":
-    
-    # 1. Verbinding maken
-    conn = st.connection("gsheets", type=GSheetsConnection)
-
-    # --- A. DAGGEVOEL LADEN (Bestaande code, iets robuuster) ---
-    try:
-        all_day_data = conn.read(spreadsheet=SHEET_URL, worksheet=0, ttl=0) # worksheet 0 is het eerste tabblad
-        if not all_day_data.empty and "Email" in all_day_data.columns:
-            day_df = all_day_data[all_day_data["Email"].str.strip().str.lower() == user["email"].lower()].copy()
-            # Types goedzetten
-            day_df["Datum"] = pd.to_datetime(day_df["Datum"], errors="coerce")
-            day_df["Energie"] = pd.to_numeric(day_df["Energie"], errors="coerce")
-            day_df["Stress"] = pd.to_numeric(day_df["Stress"], errors="coerce")
-            day_df = day_df.dropna(subset=["Datum"])
-        else:
-            day_df = pd.DataFrame(columns=["Email", "Datum", "Energie", "Stress"])
-            all_day_data = pd.DataFrame(columns=["Email", "Datum", "Energie", "Stress"])
-    except Exception as e:
-        st.error(f"Fout bij laden daggevoel: {e}")
-        day_df = pd.DataFrame()
-
-    # --- B. LESSEN LADEN (NIEUW: Via Google Sheets 'Lessons' tabblad) ---
-    try:
-        all_lessons_data = conn.read(spreadsheet=SHEET_URL, worksheet="Lessons", ttl=0)
-        
-        # Check of sheet bestaat/leeg is, anders lege DF maken
-        if all_lessons_data.empty or "Email" not in all_lessons_data.columns:
-             all_lessons_data = pd.DataFrame(columns=["Email", "Datum", "Klas", "Lesaanpak", "Klasmanagement", "Positief", "Negatief"])
-        
-        # Filteren op de ingelogde gebruiker
-        les_df = all_lessons_data[all_lessons_data["Email"].str.strip().str.lower() == user["email"].lower()].copy()
-        
-        # Datum conversie
-        if not les_df.empty:
-            les_df["Datum"] = pd.to_datetime(les_df["Datum"], errors="coerce")
-            
-    except Exception as e:
-        st.error(f"Fout bij laden lessen: {e}")
-        all_lessons_data = pd.DataFrame(columns=["Email", "Datum", "Klas", "Lesaanpak", "Klasmanagement", "Positief", "Negatief"])
-        les_df = pd.DataFrame(columns=["Email", "Datum", "Klas", "Lesaanpak", "Klasmanagement", "Positief", "Negatief"])
-
+    # 1. Gedeelde schooldata + schrijfwachtrij (één per proces)
+    school_data = get_school_data()
+    write_queue = get_write_queue()
+    if write_queue.last_error:
+        st.warning(f"Opslaan loopt vertraging op, we blijven proberen ({write_queue.last_error}).")
+    # Eigen registraties die de schrijver na alle pogingen opgaf (lokaal bewaard voor de beheerder)
+    for ticket in st.session_state.get("write_tickets", []):
+        fout = write_queue.failed(ticket)
+        if fout:
+            st.error(f"Een registratie kon niet opgeslagen worden ({fout}). "
+                     "Ze is lokaal bewaard; meld dit aan de beheerder of vul ze later opnieuw in.")
+
+    # Filters van verborgen tabbladen onthouden: een widget die een run niet rendert,
+    # verliest anders zijn waarde
+    st.session_state.setdefault("rep_periode_select", "Laatste 30 dagen")
+    for sleutel in ("tab3_periode", "tab3_filter_periode", "rep_periode_select"):
+        if sleutel in st.session_state:
+            st.session_state[sleutel] = st.session_state[sleutel]
+
+    # Enkel het open tabblad rendert (on_change="rerun" + .open): wie enkel het daggevoel
+    # invult, betaalt enkel het formulier, niet de grafieken of het rapport
     tab1, tab2, tab3, tab4 = st.tabs([
         "🧠 Daggevoel",
         "📝 Lesregistratie",
         "📊 Visualisaties",
         "📄 rapport genereren"
-    ])
+    ], key="teacher_tab", on_change="rerun")
+
+    # Eigen daggevoel en lessen zijn enkel nodig voor Visualisaties en het rapport
+    if tab3.open or tab4.open:
+        # --- A. DAGGEVOEL LADEN (alleen de rijen van deze leerkracht) ---
+        # Read-only selectie uit de gedeelde, getypeerde frame (Datum, int8-scores, Rust)
+        with span("data.daggevoel"):
+            try:
+                day_df = with_pending(school_data.read_user(WS_DAG, user["email"]), WS_DAG, user["email"])
+            except Exception as e:
+                st.error(f"Fout bij laden daggevoel: {e}")
+                day_df = ingest(WS_DAG, lege_frame(WS_DAG))
+
+        # --- B. LESSEN LADEN (alleen de rijen van deze leerkracht) ---
+        # Inclusief het tag-bitmasker; grafieken tellen daarna op het masker
+        with span("data.lessen"):
+            try:
+                les_df = with_pending(school_data.read_user(WS_LESSEN, user["email"]), WS_LESSEN, user["email"])
+            except Exception as e:
+                st.error(f"Fout bij laden lessen: {e}")
+                les_df = ingest(WS_LESSEN, lege_frame(WS_LESSEN))
 
     # -------------------------------------------------
     # TAB 1 – DAGGEVOEL
     # -------------------------------------------------
-    with tab1:
-        st.subheader("⚡ Hoe voel je je vandaag?")
+    if tab1.open:
+        with tab1, span("tab.daggevoel"):
+            st.subheader("⚡ Hoe voel je je vandaag?")
 
-        with st.form("daggevoel", clear_on_submit=True):
-            d = st.date_input("Datum", date.today())
-            st.markdown("---")
+            with st.form("daggevoel", clear_on_submit=True):
+                d = st.date_input("Datum", date.today())
+                st.markdown("---")
 
-            # ... (jouw slider code voor energie en rust blijft hetzelfde) ...
-            # KORTE VERSIE HIERONDER OM RUIMTE TE BESPAREN IN DIT VOORBEELD
-            energie_opties = {1: "1. Uitgeput", 2: "2. Moe", 3: "3. Neutraal", 4: "4. Energiek", 5: "5. Bruisend"}
-            val_energie = st.select_slider("🔋 Energie", options=list(energie_opties.keys()), format_func=lambda x: energie_opties[x], value=3)
+                # ... (jouw slider code voor energie en rust blijft hetzelfde) ...
+                # KORTE VERSIE HIERONDER OM RUIMTE TE BESPAREN IN DIT VOORBEELD
+                energie_opties = {1: "1. Uitgeput", 2: "2. Moe", 3: "3. Neutraal", 4: "4. Energiek", 5: "5. Bruisend"}
+                val_energie = st.select_slider("🔋 Energie", options=list(energie_opties.keys()), format_func=lambda x: energie_opties[x], value=3)
             
-            rust_opties = {1: "1. Onrustig", 2: "2. Gespannen", 3: "3. Neutraal", 4: "4. Ontspannen", 5: "5. Zen"}
-            val_rust = st.select_slider("🧘 Rust", options=list(rust_opties.keys()), format_func=lambda x: rust_opties[x], value=3)
+                rust_opties = {1: "1. Onrustig", 2: "2. Gespannen", 3: "3. Neutraal", 4: "4. Ontspannen", 5: "5. Zen"}
+                val_rust = st.select_slider("🧘 Rust", options=list(rust_opties.keys()), format_func=lambda x: rust_opties[x], value=3)
 
-            st.markdown("---")
+                st.markdown("---")
 
-            if st.form_submit_button("Opslaan"):
-                calc_stress = 6 - val_rust 
-                new_entry = pd.DataFrame({
-                    "Email": [user["email"]],
-                    "Datum": [str(d)],
-                    "Energie": [val_energie],
-                    "Rust": [val_rust],
-                    "Stress": [calc_stress]
-                })
+                if st.form_submit_button("Opslaan"):
+                    calc_stress = 6 - val_rust 
+                    new_entry = pd.DataFrame({
+                        "Email": [user["email"]],
+                        "Datum": [str(d)],
+                        "Energie": [val_energie],
+                        "Rust": [val_rust],
+                        "Stress": [calc_stress]
+                    })
                 
-                updated_all_data = pd.concat([all_day_data, new_entry], ignore_index=True)
-                conn.update(spreadsheet=SHEET_URL, data=updated_all_data)
+                    # In de wachtrij; de achtergrond-schrijver voegt de rij toe aan de sheet
+                    st.session_state.setdefault("write_tickets", []).append(write_queue.submit(WS_DAG, new_entry))
                 
-                st.success(f"Geregistreerd! Energie: {val_energie}/5 | Rust: {val_rust}/5")
-                # VERWIJDERDE REGEL: st.rerun() 
-                # Door st.rerun() weg te laten, blijf je op deze tab staan.
+                    st.success(f"Geregistreerd! Energie: {val_energie}/5 | Rust: {val_rust}/5")
+                    # VERWIJDERDE REGEL: st.rerun() 
+                    # Door st.rerun() weg te laten, blijf je op deze tab staan.
 
     # -------------------------------------------------
     # TAB 2 – LESREGISTRATIE
     # -------------------------------------------------
     with tab2:
         @st.fragment
+        @timing.fragment("tab.lesregistratie", perf_run.sessie, user["role"], get_timing_stats())
         def render_lesregistratie():
             st.subheader("📚 Lesregistratie")
 
@@ -482,118 +565,50 @@ if user["role"] == "teacher":
                         "Negatief": ", ".join(negatief)
                     }])
 
-                    # --- DE FIX START HIER ---
                     try:
-                        # 2. Haal NU pas de allerlaatste data op (Forceer refresh met ttl=0)
-                        # We vertrouwen niet op de 'all_lessons_data' die bovenaan het script geladen is.
-                        current_data = conn.read(spreadsheet=SHEET_URL, worksheet="Lessons", ttl=0)
-                        
-                        # Als de sheet nog leeg is of headers mist, start met lege DF
-                        if current_data.empty or "Email" not in current_data.columns:
-                             updated_lessons = new_lesson
-                        else:
-                             # Zorg dat datums strings zijn of consistent, om merge errors te voorkomen
-                             updated_lessons = pd.concat([current_data, new_lesson], ignore_index=True)
-                        
-                        # 3. Update Google Sheets met de COMPLETE set
-                        conn.update(spreadsheet=SHEET_URL, worksheet="Lessons", data=updated_lessons)
+                        # 2. In de wachtrij: de achtergrond-schrijver bundelt en appendt
+                        st.session_state.setdefault("write_tickets", []).append(write_queue.submit(WS_LESSEN, new_lesson))
                         
                         st.success(f"✅ Les in {klas} succesvol opgeslagen!")
-                        
-                        # Cache clearen is cruciaal zodat je eigen scherm ook update
-                        st.cache_data.clear()
+                        # Geen st.cache_data.clear() meer: de schrijver werkt na de append
+                        # enkel de cache van het 'Lessons' werkblad bij.
                         
                     except Exception as e:
                         st.error(f"Er ging iets mis met opslaan: {e}")
         
         # Roep de functie aan
-        render_lesregistratie()
+        if tab2.open:
+            render_lesregistratie()
 # -------------------------------------------------
 # TAB 3 – VISUALISATIES & ANALYSE
 # -------------------------------------------------
     with tab3:
         # FRAGMENT: Zorgt dat filters alleen dit deel herladen (sneller)
         @st.fragment
+        @timing.fragment("tab.visualisaties", perf_run.sessie, user["role"], get_timing_stats())
         def toon_tab3_inhoud():
             st.header("📊 Visualisaties & Analyse")
 
-            # --- HULPFUNCTIE VOOR WORDCLOUD ---
-            def generate_wordcloud_plot(dataframe):
-                # Check of de kolommen bestaan
-                if "Positief" not in dataframe.columns or "Negatief" not in dataframe.columns:
-                    return None
-                
-                # Data voorbereiden: splitsen op komma's en opschonen
-                pos_s = dataframe["Positief"].dropna().astype(str).str.split(",").explode().str.strip()
-                neg_s = dataframe["Negatief"].dropna().astype(str).str.split(",").explode().str.strip()
-                
-                # Filter lege strings of te korte woorden
-                pos_s = pos_s[pos_s.str.len() > 1]
-                neg_s = neg_s[neg_s.str.len() > 1]
-
-                # Samenvoegen in één dataframe met type
-                all_lbls = pd.concat([
-                    pd.DataFrame({"Label": pos_s, "Type": "Positief"}),
-                    pd.DataFrame({"Label": neg_s, "Type": "Negatief"}),
-                ], ignore_index=True)
-
-                if not all_lbls.empty:
-                    # Tellen
-                    counts = all_lbls.groupby(["Label", "Type"]).size().reset_index(name="Aantal")
-                    words_freq = dict(zip(counts["Label"], counts["Aantal"]))
-                    
-                    # Kleuren bepalen (Groen voor positief, Rood voor negatief)
-                    color_map = {row["Label"]: ("#2ecc71" if row["Type"] == "Positief" else "#e74c3c") for _, row in counts.iterrows()}
-
-                    # Wordcloud genereren
-                    try:
-                        from wordcloud import WordCloud
-                        wc = WordCloud(width=800, height=350, background_color="white", random_state=42).generate_from_frequencies(words_freq)
-                        
-                        fig_wc, ax = plt.subplots(figsize=(10, 4))
-                        ax.imshow(wc.recolor(color_func=lambda word, **kwargs: color_map.get(word, "black")), interpolation="bilinear")
-                        ax.axis("off")
-                        return fig_wc
-                    except ImportError:
-                        st.error("Module 'wordcloud' ontbreekt. Voeg toe aan requirements.txt.")
-                        return None
-                return None
-
-            
             # ==========================================
             # 1. WELLBEING TREND (MOBILE OPTIMIZED)
             # ==========================================
             st.subheader("🧘 Jouw Welzijnstrend")
             
-            # Data voorbereiden
-            if 'day_df' in globals() or 'day_df' in locals():
-                plot_df = day_df.copy()
-            else:
-                plot_df = pd.DataFrame()
+            # Data voorbereiden (day_df is al getypeerd, met Rust)
+            plot_df = day_df.sort_values("Datum")
 
             # CONTROLE: IS ER DATA?
             if not plot_df.empty:
-                plot_df["Datum"] = pd.to_datetime(plot_df["Datum"], errors="coerce")
-                plot_df = plot_df.dropna(subset=["Datum"]).sort_values("Datum")
-                
-                # Bereken Rust
-                if "Rust" not in plot_df.columns and "Stress" in plot_df.columns:
-                    plot_df["Rust"] = 6 - pd.to_numeric(plot_df["Stress"], errors='coerce')
-
-                # Zorg dat alles numeriek is
-                for col in ["Energie", "Rust"]:
-                    if col in plot_df.columns:
-                        plot_df[col] = pd.to_numeric(plot_df[col], errors='coerce')
-
                 # --- STAP 1: FILTER OPTIES ---
                 view_option = st.radio(
                     "Toon periode:", 
                     ["Laatste 14 dagen", "Deze maand", "Alles"], 
                     horizontal=True,
-                    label_visibility="collapsed"
+                    label_visibility="collapsed",
+                    key="tab3_periode"
                 )
 
-                filtered_df = plot_df.copy()
+                filtered_df = plot_df
                 if view_option == "Laatste 14 dagen":
                     filtered_df = plot_df.tail(14)
                 elif view_option == "Deze maand":
@@ -601,31 +616,12 @@ if user["role"] == "teacher":
                     filtered_df = plot_df[plot_df["Datum"].dt.month == now.month]
 
                 # --- STAP 2: GRAFIEK TEKENEN ---
-                fig = px.line(
-                    filtered_df,
-                    x="Datum",
-                    y=["Energie", "Rust"], 
-                    markers=True,
-                    color_discrete_map={"Energie": "#2ecc71", "Rust": "#3498db"},
-                    title=None
-                )
-                
-                fig.update_layout(
-                    yaxis_range=[0.5, 5.5],
-                    height=300,
-                    margin=dict(l=10, r=10, t=30, b=10),
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1, title=None),
-                    dragmode=False # Sleepmodus uit
-                )
+                # Enkel opnieuw bouwen bij nieuwe registraties, een andere periode of een nieuwe dag
+                fig = cached_figure("trend", frame_digest(day_df), (view_option, date.today()),
+                                    lambda: draw_day_trend(filtered_df))
 
-                fig.update_yaxes(showgrid=True, gridcolor='lightgray', fixedrange=True)
-                fig.update_xaxes(showgrid=False, tickformat="%d %b", dtick="D1" if len(filtered_df) < 15 else None, fixedrange=True)
-                fig.add_hrect(y0=0, y1=2.5, fillcolor="#e74c3c", opacity=0.08, line_width=0)
-                
                 # 'staticPlot': True zorgt dat de grafiek volledig "bevroren" is (geen interactie)
-                st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+                plotly_chart(fig, "trend")
             
                 # --- STAP 3: TREND ANALYSE ---
                 st.markdown("##### 📉 Trend Analyse (Laatste 2 weken vs. 2 weken ervoor)")
@@ -634,19 +630,21 @@ if user["role"] == "teacher":
                 date_start_cur = now - pd.Timedelta(days=14)
                 date_start_prev = now - pd.Timedelta(days=28)
 
-                # We gebruiken hier 'plot_df' (de volledige data) en niet 'filtered_df'
-                df_cur = plot_df[plot_df["Datum"] >= date_start_cur]
-                df_prev = plot_df[(plot_df["Datum"] >= date_start_prev) & (plot_df["Datum"] < date_start_cur)]
+                # Over de volledige data (niet 'filtered_df'): twee vensters uit de prefixsommen per dag
+                with span("data.vensters"):
+                    reeks = day_series_with_pending(user["email"])
+                    cur = reeks.summary(date_start_cur)
+                    prev = reeks.summary(date_start_prev, date_start_cur)
 
-                if not df_cur.empty:
-                    avg_en_cur = df_cur["Energie"].mean()
-                    avg_ru_cur = df_cur["Rust"].mean()
+                if cur["n"]:
+                    avg_en_cur = cur["Energie"]
+                    avg_ru_cur = cur["Rust"]
                     
-                    avg_en_prev = df_prev["Energie"].mean() if not df_prev.empty else 0
-                    avg_ru_prev = df_prev["Rust"].mean() if not df_prev.empty else 0
+                    avg_en_prev = prev["Energie"] if prev["n"] else 0
+                    avg_ru_prev = prev["Rust"] if prev["n"] else 0
 
-                    delta_en = avg_en_cur - avg_en_prev if not df_prev.empty else 0
-                    delta_ru = avg_ru_cur - avg_ru_prev if not df_prev.empty else 0
+                    delta_en = avg_en_cur - avg_en_prev if prev["n"] else 0
+                    delta_ru = avg_ru_cur - avg_ru_prev if prev["n"] else 0
 
                     c_trend1, c_trend2 = st.columns(2)
                     
@@ -686,15 +684,10 @@ if user["role"] == "teacher":
                     key="tab3_filter_periode"
                 )
 
-            # Data voorbereiden (Check globals voor les_df)
-            if 'les_df' in globals() or 'les_df' in locals():
-                df_filtered = les_df.copy()
-            else:
-                df_filtered = pd.DataFrame()
+            # Data voorbereiden (les_df is al getypeerd)
+            df_filtered = les_df
 
             if not df_filtered.empty:
-                df_filtered["Datum"] = pd.to_datetime(df_filtered["Datum"], errors='coerce')
-                
                 now = pd.Timestamp.now()
                 if filter_periode == "Afgelopen Maand":
                     start_date = now - pd.Timedelta(days=30)
@@ -713,10 +706,9 @@ if user["role"] == "teacher":
                     m3.metric("Gem. Klasmanagement", f"{avg_mgmt:.2f} / 5")
 
                     st.write("###### ☁️ Trefwoordenwolk (Alle klassen in selectie)")
-                    wc_fig = generate_wordcloud_plot(df_filtered)
-                    if wc_fig:
-                        st.pyplot(wc_fig) # Pyplot is standaard al statisch in Streamlit
-                        plt.close(wc_fig) # Geheugen vrijmaken
+                    wc_png = generate_wordcloud_png(df_filtered)
+                    if wc_png:
+                        st.image(wc_png, width="stretch")
                     else:
                         st.caption("Nog niet genoeg tags voor een wordcloud.")
                 else:
@@ -732,11 +724,7 @@ if user["role"] == "teacher":
             st.subheader("⚔️ Vergelijk 2 Klassen")
 
             def render_klas_vergelijker():
-                # Ook hier globals checken of direct gebruiken
-                if 'les_df' in globals() or 'les_df' in locals():
-                    local_df = les_df.copy()
-                else:
-                    local_df = pd.DataFrame()
+                local_df = les_df
                 
                 if not local_df.empty:
                     avail_classes = sorted(local_df["Klas"].unique())
@@ -744,6 +732,7 @@ if user["role"] == "teacher":
 
                     if len(sel_classes) == 2:
                         c1, c2 = st.columns(2)
+                        les_versie = frame_digest(local_df)
                         
                         for i, (col, k_name) in enumerate(zip([c1, c2], sel_classes)):
                             with col:
@@ -756,55 +745,18 @@ if user["role"] == "teacher":
                                     s_mgmt = subset["Klasmanagement"].mean()
                                     st.info(f"**Aanpak:** {s_aanpak:.1f} | **Mgmt:** {s_mgmt:.1f}")
 
-                                    # --- MIRROR PLOT (Violin) ---
-                                    fig_mirror = go.Figure()
-                                    
-                                    # AANPAK (GROEN)
-                                    fig_mirror.add_trace(go.Violin(
-                                        x=subset['Lesaanpak'], 
-                                        y=[k_name] * len(subset),
-                                        side='positive', 
-                                        orientation='h',
-                                        line_color='#00CC96', 
-                                        fillcolor='#00CC96', 
-                                        opacity=0.6,
-                                        name="Lesaanpak", 
-                                        hoverinfo='skip' 
-                                    ))
-                                    
-                                    # MGMT (PAARS)
-                                    fig_mirror.add_trace(go.Violin(
-                                        x=subset['Klasmanagement'], 
-                                        y=[k_name] * len(subset),
-                                        side='negative', 
-                                        orientation='h',
-                                        line_color='#AB63FA', 
-                                        fillcolor='#AB63FA', 
-                                        opacity=0.6,
-                                        name="Klasmanagement", 
-                                        hoverinfo='skip' 
-                                    ))
-                                    
-                                    fig_mirror.update_layout(
-                                        violinmode='overlay', 
-                                        height=300, 
-                                        showlegend=True, 
-                                        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                                        margin=dict(l=0, r=0, t=30, b=10),
-                                        xaxis=dict(range=[0.5, 5.5], showgrid=True, tickvals=[1,3,5], fixedrange=True),
-                                        yaxis=dict(showticklabels=False, fixedrange=True),
-                                        dragmode=False # Sleepmodus uit
-                                    )
-                                    
+                                    # --- MIRROR PLOT (dichtheid uit histogram) ---
+                                    fig_mirror = cached_figure("mirror", les_versie, k_name,
+                                                               lambda: draw_class_mirror(subset, k_name))
+
                                     # 'staticPlot': True maakt de grafiek niet-interactief
-                                    st.plotly_chart(fig_mirror, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+                                    plotly_chart(fig_mirror, "mirror")
                                     
                                     # --- WORDCLOUD PER KLAS ---
                                     st.markdown(f"**Tags voor {k_name}:**")
-                                    wc_k = generate_wordcloud_plot(subset)
+                                    wc_k = generate_wordcloud_png(subset)
                                     if wc_k:
-                                        st.pyplot(wc_k)
-                                        plt.close(wc_k)
+                                        st.image(wc_k, width="stretch")
                                     else:
                                         st.caption("Geen tags beschikbaar.")
                                 else:
@@ -817,7 +769,11 @@ if user["role"] == "teacher":
             render_klas_vergelijker()
 
         # EINDE FRAGMENT DEFINITIE - Nu uitvoeren
-        toon_tab3_inhoud()
+        if tab3.open:
+            with span("import.grafieken"):
+                from charts import draw_class_mirror, draw_day_trend
+                from rapport_jobs import frame_digest
+            toon_tab3_inhoud()
         
 # -------------------------------------------------
 # TAB 4 – RAPPORT GENERATOR (MET SANKEY)
@@ -825,334 +781,149 @@ if user["role"] == "teacher":
     # -------------------------------------------------
     # TAB 4 – RAPPORT GENERATOR (LIGGEND + ENERGIE/RUST)
     # -------------------------------------------------
-    with tab4:
-        st.header("📑 Rapport Generator")
-        st.write("Genereer een uitgebreid PDF-rapport met al je statistieken, vergelijkingen, correlaties én de oorzaak-gevolg analyse.")
-
-        # 1. SELECTIE PERIODE
-        r_col1, r_col2 = st.columns([2, 1])
-        with r_col1:
-            rapport_periode = st.selectbox(
-                "📅 Selecteer periode voor het rapport:",
-                ["Laatste 2 weken", "Laatste 30 dagen", "Huidig Schooljaar"],
-                index=1,
-                key="rep_periode_select"
-            )
-
-        # =======================================================
-        # STAP 2: DATA VOORBEREIDEN & METRICS BEREKENEN
-        # =======================================================
-        
-        # A. Startdatum bepalen
-        now = pd.Timestamp.now()
-        start_date = now 
-        
-        if rapport_periode == "Laatste 2 weken":
-            start_date = now - pd.Timedelta(days=14)
-        elif rapport_periode == "Laatste 30 dagen":
-            start_date = now - pd.Timedelta(days=30)
-        elif rapport_periode == "Huidig Schooljaar":
-            start_date = pd.Timestamp(year=now.year - 1 if now.month < 9 else now.year, month=9, day=1)
-
-        # B. Data kopiëren uit de variabelen van Tab 1 & 2
-        if 'day_df' in locals() or 'day_df' in globals():
-            r_day_df = day_df.copy()
-        else:
-            r_day_df = pd.DataFrame(columns=["Datum", "Energie", "Stress"])
-
-        if 'les_df' in locals() or 'les_df' in globals():
-            r_les_df = les_df.copy()
-        else:
-            r_les_df = pd.DataFrame(columns=["Datum", "Klas", "Lesaanpak", "Klasmanagement"])
-
-        # C. Filteren op datum
-        if not r_day_df.empty: 
-            r_day_df["Datum"] = pd.to_datetime(r_day_df["Datum"])
-            r_day_df = r_day_df[r_day_df["Datum"] >= start_date]
-            # Zorg dat Rust bestaat voor het weekpatroon
-            if "Stress" in r_day_df.columns:
-                 r_day_df["Rust"] = 6 - pd.to_numeric(r_day_df["Stress"], errors='coerce')
-            if "Energie" in r_day_df.columns:
-                 r_day_df["Energie"] = pd.to_numeric(r_day_df["Energie"], errors='coerce')
-
-        if not r_les_df.empty:
-            r_les_df["Datum"] = pd.to_datetime(r_les_df["Datum"])
-            r_les_df = r_les_df[r_les_df["Datum"] >= start_date]
-
-        # D. Metrics en Aantallen berekenen
-        gem_en = r_day_df["Energie"].mean() if not r_day_df.empty else 0
-        gem_str = r_day_df["Stress"].mean() if not r_day_df.empty else 0
-        gem_les = r_les_df["Lesaanpak"].mean() if not r_les_df.empty else 0
-        gem_mng = r_les_df["Klasmanagement"].mean() if not r_les_df.empty else 0
-        
-        aantal_l = len(r_les_df)
-
-        # Helper functie voor tekst
-        def get_delta_text(current, benchmark, reverse=False):
-            if benchmark == 0: return "-"
-            diff = current - benchmark
-            return f"{diff:+.1f} vs alle leerkrachten"
-
-        # E. Benchmark data laden
-        try:
-            benchmark_day_df = pd.read_csv("dag_check_db.csv") 
-            benchmark_les_df = pd.read_csv("les_db.csv")
-            
-            for col in ["Energie", "Stress"]:
-                if col in benchmark_day_df.columns:
-                    benchmark_day_df[col] = pd.to_numeric(benchmark_day_df[col], errors='coerce')
-            
-            for col in ["Lesaanpak", "Klasmanagement"]:
-                if col in benchmark_les_df.columns:
-                    benchmark_les_df[col] = pd.to_numeric(benchmark_les_df[col], errors='coerce')      
-        except FileNotFoundError:
-            benchmark_day_df = pd.DataFrame()
-            benchmark_les_df = pd.DataFrame()
-
-        glob_avg_en = benchmark_day_df["Energie"].mean() if not benchmark_day_df.empty else 0
-        glob_avg_str = benchmark_day_df["Stress"].mean() if not benchmark_day_df.empty else 0
-        glob_avg_les = benchmark_les_df["Lesaanpak"].mean() if not benchmark_les_df.empty else 0
-        glob_avg_mng = benchmark_les_df["Klasmanagement"].mean() if not benchmark_les_df.empty else 0
-
-        # F. Data Mergen voor correlaties
-        merged_df = pd.DataFrame()
-        has_correlation_data = False
-        
-        if not r_les_df.empty and not r_day_df.empty:
-            merged_df = pd.merge(r_les_df, r_day_df, on="Datum", how="inner")
-            if len(merged_df) > 2: 
-                # Rust is al berekend in stap C, maar voor zekerheid:
-                if "Rust" not in merged_df.columns and "Stress" in merged_df.columns:
-                    merged_df["Rust"] = 6 - merged_df["Stress"]
-                has_correlation_data = True
-
-        # =======================================================
-        # STAP 3: PDF FUNCTIE DEFINIËREN
-        # =======================================================
-        st.divider()
-        
-        try:
-            import io
-            import numpy as np # Nodig voor grouped bar chart
-            from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as ReportLabImage, PageBreak
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import A4, landscape # A4 Landscape import
-            import seaborn as sns 
-            import matplotlib.pyplot as plt
-            pdf_available = True
-        except ImportError:
-            pdf_available = False
-            st.error("⚠️ PDF Module (ReportLab, Seaborn of Numpy) ontbreekt.")
-
-        if pdf_available:
-            
-            def generate_pdf():
-                buffer = io.BytesIO()
-                
-                # Helper: Matplotlib naar Afbeelding
-                def plot_to_img(fig):
-                    img_buf = io.BytesIO()
-                    fig.savefig(img_buf, format='png', dpi=120, bbox_inches='tight')
-                    img_buf.seek(0)
-                    # Iets breder maken omdat we landscape werken
-                    return ReportLabImage(img_buf, width=600, height=300)
-
-                # Helper: Plotly naar Afbeelding (Voor Sankey)
-                def plotly_to_pdf_img(fig):
-                    try:
-                        # Landscape formaat: breder
-                        img_bytes = fig.to_image(format="png", width=1100, height=600, scale=2)
-                        img_buf = io.BytesIO(img_bytes)
-                        return ReportLabImage(img_buf, width=700, height=380)
-                    except Exception as e:
-                        return None
-
-                raw_name = user['email'].split('@')[0]
-                clean_name = raw_name.replace('.', ' ').title() 
-                
-                # --- LANDSCAPE INSTELLING ---
-                doc = SimpleDocTemplate(
-                    buffer, 
-                    pagesize=landscape(A4),
-                    rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30
+    if tab4.open:
+        with tab4, span("tab.rapport"):
+            st.header("📑 Rapport Generator")
+            st.write("Genereer een uitgebreid PDF-rapport met al je statistieken, vergelijkingen, correlaties én de oorzaak-gevolg analyse.")
+
+            # 1. SELECTIE PERIODE
+            r_col1, r_col2 = st.columns([2, 1])
+            with r_col1:
+                rapport_periode = st.selectbox(
+                    "📅 Selecteer periode voor het rapport:",
+                    ["Laatste 2 weken", "Laatste 30 dagen", "Huidig Schooljaar"],
+                    key="rep_periode_select"
                 )
-                
-                styles = getSampleStyleSheet()
-                story = []
-                
-                title_style = styles["Title"]
-                title_style.textColor = colors.HexColor("#2c3e50")
-                h2_style = styles["Heading2"]
-                h2_style.textColor = colors.HexColor("#2980b9")
-                h2_style.spaceBefore = 15
-
-                # HEADER
-                story.append(Paragraph("Leerkrachten Monitor: Analyse Rapport", title_style))
-                story.append(Paragraph(f"<b>Leerkracht:</b> {clean_name} | <b>Periode:</b> {rapport_periode}", styles["Normal"]))
-                story.append(Spacer(1, 20))
-
-                # SECTIE 1: Kerncijfers
-                story.append(Paragraph("1. Jouw Score vs. Gemiddelde Leerkracht", h2_style))
-                story.append(Paragraph("Jouw gemiddelden vergeleken met de benchmark.", styles["Normal"]))
-                story.append(Spacer(1, 10))
-                
-                tbl_data = [
-                    ["Indicator", "Jouw Score", "Gem. Alle Leerkrachten", "Verschil"],
-                    ["Energie", f"{gem_en:.1f}", f"{glob_avg_en:.1f}", get_delta_text(gem_en, glob_avg_en)],
-                    ["Stress", f"{gem_str:.1f}", f"{glob_avg_str:.1f}", get_delta_text(gem_str, glob_avg_str, reverse=True)],
-                    ["Lesaanpak", f"{gem_les:.1f}", f"{glob_avg_les:.1f}", get_delta_text(gem_les, glob_avg_les)],
-                    ["Klasmanagement", f"{gem_mng:.1f}", f"{glob_avg_mng:.1f}", get_delta_text(gem_mng, glob_avg_mng)],
-                ]
-                
-                # Tabel breder maken voor landscape
-                t = Table(tbl_data, colWidths=[150, 120, 160, 150])
-                t.setStyle(TableStyle([
-                    ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#34495e")),
-                    ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-                    ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-                    ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-                    ('BACKGROUND', (0,1), (-1,-1), colors.HexColor("#ecf0f1")),
-                    ('GRID', (0,0), (-1,-1), 1, colors.white),
-                ]))
-                story.append(t)
-                story.append(Spacer(1, 20))
-
-                # SECTIE 2: Correlaties
-                story.append(Paragraph("2. Samenhang & Patronen", h2_style))
-                if has_correlation_data:
-                    # Iets bredere heatmap
-                    fig_pdf_corr, ax_pdf_corr = plt.subplots(figsize=(8, 4))
-                    sns.heatmap(merged_df[["Klasmanagement", "Lesaanpak", "Energie", "Rust"]].corr(), 
-                                annot=True, cmap="coolwarm", vmin=-1, vmax=1, center=0, 
-                                fmt=".2f", cbar=False, ax=ax_pdf_corr)
-                    story.append(plot_to_img(fig_pdf_corr))
-                    plt.close(fig_pdf_corr)
-                else:
-                    story.append(Paragraph("Onvoldoende data voor correlaties.", styles["Italic"]))
-
-                story.append(PageBreak()) # Nieuwe pagina voor weekpatroon & Sankey
 
-                # SECTIE 3: Weekpatroon (Energie & Rust)
-                story.append(Paragraph("3. Weekpatroon: Energie & Rust", h2_style))
-                
-                if not r_day_df.empty:
-                    # Weekdag toevoegen
-                    r_day_df["Weekdag"] = r_day_df["Datum"].dt.day_name()
-                    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-                    
-                    # Groeperen (gemiddelde Energie en Rust per dag)
-                    week_scores = r_day_df.groupby("Weekdag")[["Energie", "Rust"]].mean().reindex(days)
-                    
-                    # Checken of er data is na reindex (ign weekend)
-                    if not week_scores.dropna(how='all').empty:
-                        # Bar chart maken
-                        fig_bar, ax_bar = plt.subplots(figsize=(10, 4))
-                        
-                        x = np.arange(len(days))
-                        width = 0.35 
-                        
-                        # Bars tekenen
-                        rects1 = ax_bar.bar(x - width/2, week_scores["Energie"], width, label='Energie', color='#2ecc71')
-                        rects2 = ax_bar.bar(x + width/2, week_scores["Rust"], width, label='Rust', color='#3498db')
-                        
-                        ax_bar.set_ylabel('Score (1-5)')
-                        ax_bar.set_xticks(x)
-                        ax_bar.set_xticklabels(['Ma', 'Di', 'Wo', 'Do', 'Vr'])
-                        ax_bar.set_ylim(0, 5.5)
-                        ax_bar.legend(loc='lower center', bbox_to_anchor=(0.5, 1.05), ncol=2, frameon=False)
-                        ax_bar.grid(axis='y', linestyle='--', alpha=0.5)
-                        
-                        story.append(plot_to_img(fig_bar))
-                        plt.close(fig_bar)
-                    else:
-                        story.append(Paragraph("Geen weekdata beschikbaar voor werkdagen.", styles["Italic"]))
-                else:
-                    story.append(Paragraph("Geen welzijnsdata beschikbaar.", styles["Italic"]))
-                
-                story.append(Spacer(1, 15))
+            # Enkel kijken of de PDF-bibliotheken er zijn; rapport.py laadt ze pas bij "genereren"
+            from rapport_jobs import report_key, report_names, prepare_report_frames, period_start
+            pdf_available = all(importlib.util.find_spec(m) for m in ("reportlab", "seaborn", "matplotlib"))
+            if not pdf_available:
+                st.error("⚠️ PDF Module (ReportLab, Seaborn of Matplotlib) ontbreekt.")
 
-                # SECTIE 4: SANKEY INTEGRATIE
-                story.append(Paragraph("4. Oorzaak & Gevolg (Flow)", h2_style))
-                story.append(Paragraph("De flow van Klasmanagement naar Lesaanpak.", styles["Normal"]))
-                story.append(Spacer(1, 10))
+            # =======================================================
+            # STAP 2: DATA VOORBEREIDEN & METRICS BEREKENEN
+            # =======================================================
+        
+            # A. Data uit Tab 1 & 2 (getypeerd), gefilterd vanaf de startdatum van de periode
+            if pdf_available:
+                r_day_df, r_les_df = prepare_report_frames(day_df, les_df, period_start(rapport_periode))
+            else:
+                r_day_df, r_les_df = day_df, les_df
 
-                if not r_les_df.empty and 'draw_sankey_butterfly' in globals():
-                    fig_sankey = draw_sankey_butterfly(r_les_df)
-                    
-                    if fig_sankey:
-                        fig_sankey.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
-                        sankey_img = plotly_to_pdf_img(fig_sankey)
-                        
-                        if sankey_img:
-                            story.append(sankey_img)
-                        else:
-                            story.append(Paragraph("<i>Kon de Sankey niet genereren.</i>", styles["Normal"]))
-                    else:
-                        story.append(Paragraph("Te weinig flows om te visualiseren.", styles["Italic"]))
-                else:
-                    story.append(Paragraph("Geen lesdata beschikbaar.", styles["Italic"]))
+            aantal_l = len(r_les_df)
 
-                doc.build(story)
-                buffer.seek(0)
-                return buffer
+            # B. Benchmark: lopende gemiddelden van alle leerkrachten, ook per klas (live, incrementeel bijgewerkt)
+            try:
+                with span("benchmark"):
+                    benchmarks = get_synced_benchmarks()
+                benchmark, benchmark_version = benchmarks.report(), benchmarks.version
+            except Exception as e:
+                st.warning(f"Benchmark niet beschikbaar: {e}")
+                benchmark, benchmark_version = {}, None
 
             # =======================================================
-            # STAP 4: DOWNLOAD KNOP TONEN
+            # STAP 3: PDF OP AANVRAAG
             # =======================================================
-            if aantal_l > 0 or not r_day_df.empty:
-                pdf_data = generate_pdf()
-                clean_filename = f"Rapport_{user['email'].split('@')[0].replace('.', '_')}.pdf"
-                
-                st.download_button(
-                    label="📥 Download Rapport (PDF)",
-                    data=pdf_data,
-                    file_name=clean_filename,
-                    mime="application/pdf",
-                    type="primary"
-                )
-            else:
-                st.warning("Er is geen data beschikbaar in de gekozen periode om een rapport van te maken.")
-                        
+            st.divider()
+        
+            if pdf_available:
+                # =======================================================
+                # STAP 4: GENEREREN (ACHTERGROND) & DOWNLOAD KNOP TONEN
+                # =======================================================
+                if aantal_l > 0 or not r_day_df.empty:
+                    clean_name, clean_filename = report_names(user['email'])
+
+                    # Zelfde data + periode + benchmark = zelfde PDF: dan uit de cache
+                    jobs = get_report_jobs()
+                    rapport_sleutel = report_key(clean_name, rapport_periode, r_day_df, r_les_df, benchmark_version)
+                    pdf_data = jobs.get(rapport_sleutel)
+
+                    if pdf_data is None and st.button("📄 Rapport genereren"):
+                        with span("import.rapport"):
+                            from rapport import build_teacher_report
+                        job = jobs.submit(rapport_sleutel, build_teacher_report,
+                                          clean_name, rapport_periode, r_day_df, r_les_df, benchmark)
+                        with span("rapport.pdf"):
+                            voortgang = st.progress(0.0, text="Rapport wordt opgebouwd...")
+                            while not job.done():
+                                voortgang.progress(job.progress, text=f"Rapport wordt opgebouwd: {job.label}")
+                                time.sleep(0.2)
+                            voortgang.empty()
+                            # Secties zoals de achtergrondjob ze mat (Kerncijfers, grafieken, ...)
+                            for sectie, duur in job.timings:
+                                timing.record(f"pdf.{sectie}", duur)
+                        try:
+                            pdf_data = job.result()
+                        except Exception as e:
+                            st.error(f"Het rapport kon niet gemaakt worden: {e}")
+                        for probleem in job.problems:
+                            st.warning(f"Onvolledig rapport: {probleem}")
+
+                    if pdf_data is not None:
+                        st.download_button(
+                            label="📥 Download Rapport (PDF)",
+                            data=pdf_data,
+                            file_name=clean_filename,
+                            mime="application/pdf",
+                            type="primary"
+                        )
+                else:
+                    st.warning("Er is geen data beschikbaar in de gekozen periode om een rapport van te maken.")
+
 
 # =================================================
 # =============== DIRECTIE VIEW ===================
 # =================================================
 # Let op: Deze elif staat HELEMAAL links tegen de kantlijn
 elif user["role"] == "director":
+    with span("import.grafieken"):
+        from charts import draw_class_sankey, draw_mirror_overview, draw_monthly_heatmaps, draw_team_trend
+
     st.title("Directie Dashboard")
     # ... jouw code ...
 
     # ---------------------------------------------------------
     # STAP 1: DATA LADEN
     # ---------------------------------------------------------
-    _, df_lessons_raw = load_all_school_data()
-    
-    if not df_lessons_raw.empty:
-        df_lessons_raw["Datum"] = pd.to_datetime(df_lessons_raw["Datum"], errors='coerce')
-        df_lessons_raw = df_lessons_raw.dropna(subset=["Datum"])
-        all_classes = sorted(df_lessons_raw["Klas"].unique())
-    else:
-        all_classes = []
-
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    try:
-        df_sheet = conn.read(spreadsheet=SHEET_URL, ttl=0)
-        if not df_sheet.empty and "Datum" in df_sheet.columns:
-            df_sheet["Datum"] = pd.to_datetime(df_sheet["Datum"], errors='coerce')
-            df_sheet["Energie"] = pd.to_numeric(df_sheet["Energie"], errors='coerce')
-            df_sheet["Stress"] = pd.to_numeric(df_sheet["Stress"], errors='coerce')
-            df_wellbeing_raw = df_sheet.dropna(subset=["Datum", "Energie", "Stress"])
-        else:
-            df_wellbeing_raw = pd.DataFrame(columns=["Datum", "Energie", "Stress"])
-    except:
-        df_wellbeing_raw = pd.DataFrame(columns=["Datum", "Energie", "Stress"])
+    # Heatmaps, KPI's en Sankey komen uit de voorgeaggregeerde cube (klas x dag).
+    # De tabbladen hieronder zijn fragmenten: ze halen cube en daggevoel zelf op uit de
+    # gedeelde (per proces gecachete) data, zodat een filter enkel zijn eigen tabblad herlaadt.
+    def load_director_cube():
+        with span("data.cube"):
+            return get_synced_lesson_cube()
+
+    def load_director_wellbeing():
+        with span("data.daggevoel"):
+            try:
+                return get_school_data().frame(WS_DAG)
+            except Exception as e:
+                st.warning(f"Daggevoel niet beschikbaar: {e}")
+                return ingest(WS_DAG, lege_frame(WS_DAG))
+
+    def load_director_day_series():
+        # Schoolbreed daggevoel per dag met prefixsommen, één keer per versie gebouwd
+        with span("data.daggevoel"):
+            try:
+                return get_school_data().day_series()
+            except Exception as e:
+                st.warning(f"Daggevoel niet beschikbaar: {e}")
+                return DaySeries.from_frame(ingest(WS_DAG, lege_frame(WS_DAG)))
+
+    cube = load_director_cube()
+    all_classes = cube.classes()
+    mislukt = get_legacy_store().failed.get(WS_LESSEN, {})
+    if mislukt:
+        st.warning(f"⚠️ {len(mislukt)} lesbestand(en) konden niet gelezen worden: "
+                   + ", ".join(os.path.basename(p) for p in mislukt))
+
+    df_wellbeing_raw = load_director_wellbeing()
 
     # ---------------------------------------------------------
     # STAP 2: KPI's
     # ---------------------------------------------------------
     k1, k2, k3, k4 = st.columns(4)
-    k1.metric("📝 Registraties", len(df_lessons_raw))
+    k1.metric("📝 Registraties", cube.summary()["n"])
     k2.metric("🏫 Klassen", len(all_classes))
     
     avg_en = df_wellbeing_raw['Energie'].mean() if not df_wellbeing_raw.empty else 0
@@ -1166,16 +937,23 @@ elif user["role"] == "director":
     # ---------------------------------------------------------
     # STAP 3: TABS
     # ---------------------------------------------------------
-    tab_stats, tab_wellbeing, tab_culture = st.tabs([
+    tab_stats, tab_wellbeing, tab_culture, tab_reports = st.tabs([
         "📊 Klas Statistieken", 
         "🧘 Welzijn Trend", 
-        "🦋 Oorzaak & Gevolg"
+        "🦋 Oorzaak & Gevolg",
+        "📦 Eindrapporten"
     ])
 
     # ==========================================
     # TAB 1: HEATMAPS & MIRROR DENSITY
     # ==========================================
-    with tab_stats:
+    @st.fragment
+    @timing.fragment("tab.klasstatistieken", perf_run.sessie, user["role"], get_timing_stats())
+    def render_klas_statistieken():
+        # Eigen fragment: klassen of periode wijzigen herlaadt enkel dit tabblad
+        cube = load_director_cube()
+        all_classes = cube.classes()
+
         st.subheader("🗓️ Evolutie & Verdeling")
         
         col_content, col_filter = st.columns([3, 1])
@@ -1205,59 +983,22 @@ elif user["role"] == "director":
         else:
             start_d = pd.Timestamp(year=today.year if today.month >= 9 else today.year - 1, month=9, day=1)
 
-        df_t1 = df_lessons_raw[
-            (df_lessons_raw["Datum"] >= start_d) & 
-            (df_lessons_raw["Klas"].isin(sel_classes_t1))
-        ].copy()
+        # Figuren per (cube-versie, periode, klassen): een rerun zonder nieuwe les bouwt niets
+        filters_t1 = (p_choice, today.date(), tuple(sel_classes_t1))
 
         # --- VISUALISATIES (LINKS) ---
         with col_content:
-            if not df_t1.empty:
-                
+            if cube.summary(start_d, sel_classes_t1)["n"] > 0:
                 # -----------------------------------------------------
                 # 1. HEATMAPS
                 # -----------------------------------------------------
                 st.caption("🔥 **Evolutie per Maand** (Links: Management | Rechts: Aanpak)")
-                
-                df_t1['Maand'] = df_t1['Datum'].dt.strftime('%Y-%m')
-                hm_mgmt = df_t1.pivot_table(index="Klas", columns="Maand", values="Klasmanagement", aggfunc="mean")
-                hm_didac = df_t1.pivot_table(index="Klas", columns="Maand", values="Lesaanpak", aggfunc="mean")
-                hm_count = df_t1.pivot_table(index="Klas", columns="Maand", values="Klasmanagement", aggfunc="count")
 
-                if not hm_mgmt.empty:
-                    from plotly.subplots import make_subplots
-                    
-                    fig_heat = make_subplots(
-                        rows=1, cols=2, 
-                        shared_yaxes=True, 
-                        subplot_titles=("Klasmanagement", "Didactische Aanpak"),
-                        horizontal_spacing=0.02
-                    )
-
-                    fig_heat.add_trace(go.Heatmap(
-                        z=hm_mgmt.values, x=hm_mgmt.columns, y=hm_mgmt.index,
-                        colorscale="RdBu", zmin=1, zmax=5, showscale=False,
-                        customdata=hm_count.values,
-                        hovertemplate="<b>Management: %{z:.1f}</b><br>Regs: %{customdata}<extra></extra>"
-                    ), row=1, col=1)
-
-                    fig_heat.add_trace(go.Heatmap(
-                        z=hm_didac.values, x=hm_didac.columns, y=hm_didac.index,
-                        colorscale="RdBu", zmin=1, zmax=5, showscale=False,
-                        customdata=hm_count.values,
-                        hovertemplate="<b>Aanpak: %{z:.1f}</b><br>Regs: %{customdata}<extra></extra>"
-                    ), row=1, col=2)
-
-                    fig_heat.update_layout(
-                        height=150 + (len(hm_mgmt)*30),
-                        margin=dict(l=0, r=0, t=30, b=0),
-                        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-                        dragmode=False
-                    )
-                    fig_heat.update_xaxes(showticklabels=False, fixedrange=True) 
-                    fig_heat.update_yaxes(fixedrange=True)
-                    
-                    st.plotly_chart(fig_heat, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+                # Pivots (gemiddelde per klas x maand + aantal) rechtstreeks uit de cube
+                fig_heat = cached_figure("heatmap", cube.version, filters_t1,
+                                         lambda: draw_monthly_heatmaps(cube.monthly(start_d, sel_classes_t1)))
+                if fig_heat is not None:
+                    plotly_chart(fig_heat, "heatmap")
 
                 # -----------------------------------------------------
                 # 2. MIRROR DENSITY CHART
@@ -1272,84 +1013,28 @@ elif user["role"] == "director":
                 </div>
                 """, unsafe_allow_html=True)
                 
-                fig_mirror = go.Figure()
-
-                sorted_classes = sorted(sel_classes_t1, reverse=True) 
+                # Histogram (klas x 1-5) rechtstreeks uit de cube: O(klassen), niet O(lessen)
+                fig_mirror = cached_figure("mirror", cube.version, filters_t1,
+                                           lambda: draw_mirror_overview(cube.histograms(start_d, sel_classes_t1),
+                                                                        sel_classes_t1))
 
-                for k in sorted_classes:
-                    subset = df_t1[df_t1['Klas'] == k]
-                    if subset.empty: continue
-                    
-                    count_val = len(subset)
-
-                    # Deel 1: Aanpak (Positief, Groen)
-                    fig_mirror.add_trace(go.Violin(
-                        x=subset['Lesaanpak'],
-                        y=[k] * len(subset),
-                        legendgroup='Aanpak', scalegroup='Aanpak', name='Aanpak',
-                        side='positive',
-                        orientation='h',
-                        line_color='#00CC96',
-                        fillcolor='#00CC96',
-                        opacity=0.6,
-                        meanline_visible=True,
-                        points=False,
-                        width=0.75, 
-                        customdata=[count_val] * len(subset),
-                        hovertemplate="Aantal registraties: %{customdata}<extra></extra>"
-                    ))
-
-                    # Deel 2: Management (Negatief, Paars)
-                    fig_mirror.add_trace(go.Violin(
-                        x=subset['Klasmanagement'],
-                        y=[k] * len(subset),
-                        legendgroup='Management', scalegroup='Management', name='Management',
-                        side='negative',
-                        orientation='h',
-                        line_color='#AB63FA',
-                        fillcolor='#AB63FA',
-                        opacity=0.6,
-                        meanline_visible=True,
-                        points=False,
-                        width=0.75,
-                        customdata=[count_val] * len(subset),
-                        hovertemplate="Aantal registraties: %{customdata}<extra></extra>"
-                    ))
-
-                fig_mirror.update_layout(
-                    violinmode='overlay',
-                    height=200 + (len(sorted_classes) * 50),
-                    showlegend=False,
-                    dragmode=False,
-                    xaxis=dict(
-                        range=[0.5, 5.5],
-                        tickvals=[1, 2, 3, 4, 5],
-                        ticktext=["1 (Laag)", "2", "3", "4", "5 (Hoog)"],
-                        showgrid=True,
-                        gridcolor='rgba(200, 200, 200, 0.15)',
-                        title=None,
-                        side='bottom',
-                        fixedrange=True
-                    ),
-                    yaxis=dict(
-                        showgrid=False,
-                        title=None,
-                        fixedrange=True
-                    ),
-                    margin=dict(l=0, r=0, t=10, b=0),
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)'
-                )
-                
-                st.plotly_chart(fig_mirror, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+                plotly_chart(fig_mirror, "mirror")
 
             else:
                 st.info("Geen data gevonden voor deze selectie.")
 
+    with tab_stats:
+        render_klas_statistieken()
+
     # ==========================================
     # TAB 2: WELZIJN (DIRECTIE)
     # ==========================================
-    with tab_wellbeing:
+    @st.fragment
+    @timing.fragment("tab.welzijn", perf_run.sessie, user["role"], get_timing_stats())
+    def render_welzijn():
+        reeks = load_director_day_series()
+        today = pd.Timestamp.today()
+
         st.subheader("📊 Welzijnstrend Personeel")
         
         # 1. Selectie en Data Filteren
@@ -1371,100 +1056,32 @@ elif user["role"] == "director":
             days_back = 300 
 
         start_w = today - pd.Timedelta(days=days_back)
-        
-        # Data kopiëren en filteren
-        df_w = df_wellbeing_raw[df_wellbeing_raw["Datum"] >= start_w].copy()
+        start_prev = start_w - pd.Timedelta(days=days_back)
 
-        # Check: Is er data?
-        if not df_w.empty:
-            # Data schoonmaken en Rust berekenen
-            if "Rust" not in df_w.columns and "Stress" in df_w.columns:
-                df_w["Rust"] = 6 - pd.to_numeric(df_w["Stress"], errors='coerce')
-            
-            for col in ["Energie", "Rust"]:
-                if col in df_w.columns:
-                    df_w[col] = pd.to_numeric(df_w[col], errors='coerce')
+        # Huidige en vorige periode: twee opzoekingen in de prefixsommen, geen filter over alle rijen
+        cur = reeks.summary(start_w)
+        prev = reeks.summary(start_prev, start_w)
 
-            # Groeperen per datum (gemiddelde van het team)
-            daily_avg = df_w.groupby("Datum")[["Energie", "Rust"]].mean().reset_index().sort_values("Datum")
-            
-            # --- GRAFIEK BOUWEN ---
-            fig_trend = go.Figure()
-            
-            # LIJN 1: Energie
-            fig_trend.add_trace(go.Scatter(
-                x=daily_avg['Datum'], y=daily_avg['Energie'], 
-                mode='lines+markers', 
-                name='Energie',
-                line=dict(color='#2ecc71', width=3),
-                marker=dict(size=6)
-            ))
-            
-            # LIJN 2: Rust
-            fig_trend.add_trace(go.Scatter(
-                x=daily_avg['Datum'], y=daily_avg['Rust'], 
-                mode='lines+markers',
-                name='Rust',
-                line=dict(color='#3498db', width=3),
-                marker=dict(size=6)
-            ))
-
-            # Layout optimalisatie
-            fig_trend.update_layout(
-                height=350,
-                dragmode=False,
-                margin=dict(l=10, r=10, t=30, b=10),
-                paper_bgcolor='rgba(0,0,0,0)', 
-                plot_bgcolor='rgba(0,0,0,0)',
-                legend=dict(
-                    orientation="h", 
-                    yanchor="bottom", y=1.02, 
-                    xanchor="right", x=1
-                ),
-                xaxis=dict(
-                    showgrid=False, 
-                    tickformat="%d %b", 
-                    dtick="D1" if len(daily_avg) < 15 else None,
-                    fixedrange=True
-                ),
-                yaxis=dict(
-                    showgrid=True, 
-                    gridcolor='rgba(200,200,200,0.2)',
-                    range=[0.5, 5.5],
-                    fixedrange=True
-                )
-            )
+        # Check: Is er data?
+        if cur["n"]:
+            # Gemiddelde van het team per dag; enkel opnieuw bij een nieuwe versie van het daggevoel
+            fig_trend = cached_figure("welzijnstrend", get_school_data().version(WS_DAG), (w_choice, today.date()),
+                                      lambda: draw_team_trend(reeks.trend(start_w)))
 
-            # Gevarenzone
-            fig_trend.add_hrect(
-                y0=0, y1=2.5, 
-                fillcolor="#e74c3c", opacity=0.08, line_width=0
-            )
-            
-            st.plotly_chart(fig_trend, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+            plotly_chart(fig_trend, "welzijnstrend")
 
             # --- TREND ANALYSE (METRICS) ---
             st.divider()
             st.markdown("##### 📉 Vergelijking met voorgaande periode")
             
             # Huidige periode gemiddelden
-            avg_en_cur = df_w["Energie"].mean()
-            avg_ru_cur = df_w["Rust"].mean()
-
-            # Vorige periode ophalen
-            start_prev = start_w - pd.Timedelta(days=days_back)
-            df_prev = df_wellbeing_raw[
-                (df_wellbeing_raw["Datum"] >= start_prev) & 
-                (df_wellbeing_raw["Datum"] < start_w)
-            ]
+            avg_en_cur = cur["Energie"]
+            avg_ru_cur = cur["Rust"]
 
             # Vorige gemiddelden berekenen
-            if not df_prev.empty:
-                if "Rust" not in df_prev.columns and "Stress" in df_prev.columns:
-                    df_prev["Rust"] = 6 - pd.to_numeric(df_prev["Stress"], errors='coerce')
-                
-                avg_en_prev = df_prev["Energie"].mean()
-                avg_ru_prev = df_prev["Rust"].mean()
+            if prev["n"]:
+                avg_en_prev = prev["Energie"]
+                avg_ru_prev = prev["Rust"]
                 
                 delta_en = avg_en_cur - avg_en_prev
                 delta_ru = avg_ru_cur - avg_ru_prev
@@ -1491,18 +1108,28 @@ elif user["role"] == "director":
             with m_col3:
                  st.metric(
                     label="Aantal metingen",
-                    value=len(df_w),
-                    delta=f"{len(df_w) - len(df_prev)}" if not df_prev.empty else None,
+                    value=cur["n"],
+                    delta=f"{cur['n'] - prev['n']}" if prev["n"] else None,
                     delta_color="off" 
                 )
 
         else:
             st.info("Geen data beschikbaar voor deze periode.")
 
+    with tab_wellbeing:
+        render_welzijn()
+
     # ==========================================
     # TAB 3: SANKEY
     # ==========================================
-    with tab_culture:
+    @st.fragment
+    @timing.fragment("tab.cultuur", perf_run.sessie, user["role"], get_timing_stats())
+    def render_oorzaak_gevolg():
+        # Een klas aan/uit zetten herberekent enkel de Sankey
+        cube = load_director_cube()
+        all_classes = cube.classes()
+        today = pd.Timestamp.today()
+
         st.subheader("🦋 Oorzaak & Gevolg")
         col_sankey, col_filter_s = st.columns([3, 1])
 
@@ -1525,20 +1152,104 @@ elif user["role"] == "director":
         else:
             start_s = pd.Timestamp(year=today.year if today.month >= 9 else today.year - 1, month=9, day=1)
 
-        mask_s = (df_lessons_raw["Datum"] >= start_s) & (df_lessons_raw["Klas"].isin(sel_classes_sankey))
-        df_sankey_filtered = df_lessons_raw.loc[mask_s].copy()
+        klassen_s = cube.classes(start_s, sel_classes_sankey)
 
         with col_sankey:
-            if not df_sankey_filtered.empty and len(sel_classes_sankey) > 0:
-                fig_s = draw_sankey_butterfly(df_sankey_filtered)
+            if klassen_s:
+                # Tag-tellingen per klas uit de cube (geen explode van ruwe rijen), enkel bij een nieuwe versie
+                fig_s = cached_figure("sankey", cube.version, (s_period, today.date(), tuple(klassen_s)),
+                                      lambda: draw_class_sankey(cube.tag_counts(start_s, klassen_s), klassen_s))
                 if fig_s:
-                    fig_s.update_layout(
-                        height=600, 
-                        margin=dict(t=20, b=20),
-                        dragmode=False
-                    )
-                    st.plotly_chart(fig_s, use_container_width=True, config={'displayModeBar': False, 'staticPlot': True})
+                    plotly_chart(fig_s, "sankey")
                 else:
                     st.warning("Te weinig flows.")
             else:
                 st.warning("Selecteer minstens één klas.")
+
+    with tab_culture:
+        render_oorzaak_gevolg()
+
+    # ==========================================
+    # TAB 4: EINDRAPPORTEN (BATCH)
+    # ==========================================
+    @st.fragment
+    @timing.fragment("tab.eindrapporten", perf_run.sessie, user["role"], get_timing_stats())
+    def render_eindrapporten():
+        st.subheader("📦 Eindrapporten")
+        st.write("Eén PDF per leerkracht en een anoniem rapport per klas, samen in één ZIP-bestand.")
+
+        from rapport_jobs import RAPPORT_PERIODES, period_start, prepare_report_frames, report_key
+        b_periode = st.selectbox("📅 Periode:", RAPPORT_PERIODES, index=2, key="batch_periode")
+        b_start = period_start(b_periode)
+
+        with span("data.schooljaar"):
+            b_day_df, b_les_df = prepare_report_frames(get_school_data().frame(WS_DAG), get_school_data().frame(WS_LESSEN), b_start)
+            # Alle lesrijen (live + legacy) zijn enkel nodig voor de klasrapporten
+            df_lessons_raw = load_school_lessons()
+        b_klas_df = df_lessons_raw[df_lessons_raw["Datum"] >= b_start]
+        try:
+            b_benchmarks = get_synced_benchmarks()
+            b_benchmark, b_benchmark_version = b_benchmarks.report(), b_benchmarks.version
+        except Exception as e:
+            st.warning(f"Benchmark niet beschikbaar: {e}")
+            b_benchmark, b_benchmark_version = {}, None
+
+        n_leerkrachten = len(set(b_day_df.get("Email", [])) | set(b_les_df.get("Email", [])))
+        n_klassen = b_klas_df["Klas"].nunique() if not b_klas_df.empty else 0
+        st.caption(f"{n_leerkrachten} leerkrachten · {n_klassen} klassen")
+
+        jobs = get_batch_jobs()
+        batch_sleutel = report_key("batch", b_periode, b_day_df, b_les_df, b_klas_df, b_benchmark_version)
+        zip_pad = jobs.get(batch_sleutel)
+
+        if zip_pad is None and (n_leerkrachten or n_klassen) and st.button("📦 Alle rapporten genereren"):
+            from rapport_batch import run_batch_reports
+            job = jobs.submit(batch_sleutel, run_batch_reports,
+                              os.path.join(BATCH_DIR, f"eindrapporten_{batch_sleutel[:12]}.zip"),
+                              b_periode, b_day_df, b_les_df, b_klas_df, b_benchmark,
+                              max_workers=int(get_config("batch_workers", os.cpu_count() or 2)),
+                              render_options={"size": 1, "cache_dir": os.path.join(DATA_DIR, ".cache", "plotly")})
+            with span("rapport.batch"):
+                voortgang = st.progress(0.0, text="Rapporten worden opgebouwd...")
+                while not job.done():
+                    voortgang.progress(job.progress, text=f"Rapporten worden opgebouwd: {job.label}")
+                    time.sleep(0.5)
+                voortgang.empty()
+            try:
+                zip_pad = job.result()
+            except Exception as e:
+                st.error(f"De rapporten konden niet gemaakt worden: {e}")
+            for probleem in job.problems:
+                st.warning(probleem)
+
+        if zip_pad is not None and os.path.exists(zip_pad):
+            with open(zip_pad, "rb") as f:
+                st.download_button(
+                    label="📥 Download Eindrapporten (ZIP)",
+                    data=f.read(),
+                    file_name=f"Eindrapporten_{b_periode.replace(' ', '_')}.zip",
+                    mime="application/zip",
+                    type="primary"
+                )
+
+    with tab_reports:
+        render_eindrapporten()
+
+# =================================================
+# ============ PRESTATIES (DEBUGPANEEL) ===========
+# =================================================
+# Einde van de rerun: loggen en in de rollende statistieken (zie timing.py)
+laatste_run = timing.finish()
+
+# Opt-in en enkel voor de directie: uitsplitsing van deze rerun + percentielen van alle sessies
+if user["role"] == "director" and st.sidebar.toggle("⏱️ Prestaties", key="perf_panel"):
+    with st.sidebar:
+        st.caption(f"Deze rerun: {laatste_run.duur * 1000:.0f} ms · sessie {laatste_run.sessie}")
+        st.dataframe(laatste_run.table(), hide_index=True, width="stretch")
+        figuren = get_figure_cache()
+        st.caption(f"Figuren: {figuren.hits} hergebruikt · {figuren.misses} gebouwd · {len(figuren)} in cache")
+        perf_rol = st.radio("Rol", ["teacher", "director", "anoniem", "alle"], horizontal=True, key="perf_rol")
+        stats = get_timing_stats()
+        st.caption(f"Laatste {stats.window} metingen per span (ms)")
+        st.dataframe(stats.percentiles(None if perf_rol == "alle" else perf_rol),
+                     hide_index=True, width="stretch")
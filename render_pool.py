@@ -0,0 +1,219 @@
+"""
+Statische export van Plotly-figuren (PNG voor de PDF-rapporten).
+
+Een kleine, begrensde pool van langlevende kaleido-renderers: elke renderer is een
+chromium-subproces dat één keer opstart en daarna hergebruikt wordt. Resultaten
+worden op schijf gecachet onder een hash van de figuur-JSON, zodat dezelfde Sankey
+niet twee keer gerasterd wordt. Fouten en timeouts geven een RenderError in plaats
+van stilletjes None.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import plotly
+import plotly.io as pio
+
+logger = logging.getLogger(__name__)
+
+
+class RenderError(Exception):
+    pass
+
+
+_NIEUW = object()  # plaatshouder: deze renderer moet nog opgestart worden
+
+
+def _new_scope():
+    """
+    Een kaleido 0.2.x renderer. We geven de plotly.js mee die bij de geïnstalleerde
+    plotly hoort; de meegeleverde (oudere) versie kan recente figuren niet lezen.
+    Geeft None als enkel kaleido >= 1 beschikbaar is (dan via pio.to_image).
+    """
+    try:
+        from kaleido.scopes.plotly import PlotlyScope
+    except ImportError:
+        return None
+    plotlyjs = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+    return PlotlyScope(plotlyjs=plotlyjs if os.path.exists(plotlyjs) else None)
+
+
+def _shutdown(scope):
+    stop = getattr(scope, "_shutdown_kaleido", None)
+    if stop:
+        try:
+            stop()
+        except Exception:
+            pass
+
+
+class PlotlyRenderPool:
+    """
+    size renderers (lui opgestart), render-timeout in seconden, PNG-cache in cache_dir
+    (hoogstens max_cache_files bestanden; de oudste verdwijnen eerst).
+    """
+
+    def __init__(self, size=2, cache_dir=None, timeout=30.0, max_cache_files=500):
+        self.size = size
+        # Absoluut vastleggen: de pool leeft zo lang als het proces, ook als de werkmap wijzigt
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        self.timeout = timeout
+        self.max_cache_files = max_cache_files
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._busy = 0        # renderers die nu een export doen
+        self._closed = False
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        # Threads die de (blokkerende) kaleido-aanroep doen, zodat we kunnen time-outen
+        self._calls = ThreadPoolExecutor(max_workers=size, thread_name_prefix="lkm-kaleido")
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # --- Cache ---
+    @staticmethod
+    def cache_key(fig_json, fmt, width, height, scale):
+        h = hashlib.sha256(fig_json.encode())
+        h.update(f"|{fmt}|{width}|{height}|{scale}".encode())
+        return h.hexdigest()
+
+    def _cache_path(self, key, fmt):
+        return os.path.join(self.cache_dir, f"{key}.{fmt}") if self.cache_dir else None
+
+    def _cache_get(self, key, fmt):
+        path = self._cache_path(key, fmt)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    def _cache_put(self, key, fmt, data):
+        path = self._cache_path(key, fmt)
+        if not path:
+            return
+        with open(f"{path}.{threading.get_ident()}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{path}.{threading.get_ident()}.tmp", path)
+        bestanden = [os.path.join(self.cache_dir, n) for n in os.listdir(self.cache_dir)]
+        if len(bestanden) > self.max_cache_files:
+            bestanden.sort(key=os.path.getmtime)
+            for oud in bestanden[:len(bestanden) - self.max_cache_files]:
+                try:
+                    os.remove(oud)
+                except OSError:
+                    pass
+
+    # --- Renderers ---
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise RenderError("De renderpool is afgesloten")
+        try:
+            scope = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                nieuw = self._started < self.size
+                if nieuw:
+                    self._started += 1
+            try:
+                scope = _NIEUW if nieuw else self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise RenderError(f"Geen renderer vrij binnen {self.timeout:.0f}s") from None
+        with self._lock:
+            self._busy += 1
+        return scope
+
+    def _release(self, scope):
+        """Renderer terug naar de pool, of afsluiten als de pool intussen gesloten werd."""
+        with self._lock:
+            self._busy -= 1
+            gesloten = self._closed
+            if not gesloten:
+                self._idle.put(scope)
+            self._drained.notify_all()
+        if gesloten:
+            _shutdown(scope)
+
+    def _discard(self, scope):
+        """Renderer afsluiten en zijn plaats vrijgeven (een volgende export start een nieuwe)."""
+        _shutdown(scope)
+        with self._lock:
+            self._busy -= 1
+            self._started -= 1
+            self._drained.notify_all()
+
+    def render(self, fig, fmt="png", width=None, height=None, scale=None):
+        """Figuur -> bytes. Gooit RenderError bij een fout of timeout."""
+        fig_dict = fig.to_plotly_json() if hasattr(fig, "to_plotly_json") else fig
+        fig_json = json.dumps(fig_dict, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+        key = self.cache_key(fig_json, fmt, width, height, scale)
+        cached = self._cache_get(key, fmt)
+        if cached is not None:
+            return cached
+
+        scope = self._acquire()
+        try:
+            if scope is _NIEUW:
+                scope = _new_scope()
+            if scope is None:
+                call = lambda: pio.to_image(fig, format=fmt, width=width, height=height, scale=scale)
+            else:
+                call = lambda: scope.transform(json.loads(fig_json), format=fmt, width=width, height=height, scale=scale)
+            data = self._calls.submit(call).result(timeout=self.timeout)
+        except FutureTimeout:
+            # Vastgelopen renderer: afsluiten en niet teruggeven aan de pool
+            self._discard(scope)
+            raise RenderError(f"Export duurde langer dan {self.timeout:.0f}s") from None
+        except Exception as e:
+            # Kaleido-fout: renderer is mogelijk in een slechte staat, vervangen
+            self._discard(scope)
+            logger.warning("Plotly-export mislukt: %s", e)
+            raise RenderError(f"{type(e).__name__}: {e}") from e
+        self._release(scope)
+        self._cache_put(key, fmt, data)
+        return data
+
+    def close(self, timeout=None):
+        """
+        Wacht tot lopende exports klaar zijn (hoogstens timeout, standaard de render-timeout)
+        en sluit dan alle renderers af. Daarna geeft render() een RenderError, behalve
+        voor figuren die al in de cache staan.
+        """
+        with self._lock:
+            self._closed = True
+            self._drained.wait_for(lambda: self._busy == 0, self.timeout if timeout is None else timeout)
+        while True:
+            try:
+                _shutdown(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self._calls.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_config = {}
+
+
+def configure_render_pool(**opties):
+    """Instellingen voor de proces-brede pool (size, cache_dir, timeout, max_cache_files)."""
+    global _pool
+    with _pool_lock:
+        _pool_config.update(opties)
+        oud, _pool = _pool, None
+    # Buiten de lock: nieuwe exports krijgen meteen de nieuwe pool, de oude werkt de
+    # lopende af voor hij zijn renderers afsluit
+    if oud is not None:
+        oud.close()
+
+
+def get_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PlotlyRenderPool(**_pool_config)
+        return _pool
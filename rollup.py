@@ -0,0 +1,353 @@
+"""
+Voorgeaggregeerde lesdata en daggevoel voor de dashboards.
+
+LessonCube houdt per (Klas, dag) de aantallen, sommen, score-histogrammen (1-5) en
+tag-tellingen bij. Heatmaps, KPI's en de Sankey worden uit deze cellen berekend,
+zodat hun kost afhangt van het aantal klassen x dagen en niet van het aantal
+registraties. Nieuwe lessen worden incrementeel toegevoegd met add_frame().
+
+DaySeries doet hetzelfde voor het daggevoel: som en aantal per dag met prefixsommen,
+zodat het gemiddelde over een venster (laatste 14 dagen, de periode ervoor) geen
+filter over alle rijen meer is en de trend per dag, week of maand geen groupby.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from tags import multi_hot, tag_mask
+
+SCORES = ("Lesaanpak", "Klasmanagement")
+NIVEAUS = (1, 2, 3, 4, 5)
+
+
+class LessonCube:
+    """
+    tags: {"Positief": [...], "Negatief": [...]} - de gesloten vocabulaire per kolom
+    (zie tags.VOCABULAIRE). Tags buiten de vocabulaire worden niet geteld.
+    """
+
+    def __init__(self, tags):
+        self.tags = {kolom: list(woorden) for kolom, woorden in tags.items()}
+        self.tag_columns = [f"{kolom}:{w}" for kolom, woorden in self.tags.items() for w in woorden]
+        self.value_columns = (
+            ["n"]
+            + [f"sum_{s}" for s in SCORES]
+            + [f"cnt_{s}" for s in SCORES]
+            + [f"{s}_{k}" for s in SCORES for k in NIVEAUS]
+            + self.tag_columns
+        )
+        self.version = 0
+        self.n_rows = 0
+        self.source_version = None  # bronversie waarop de cellen gebouwd zijn (zie sync)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.RLock()
+        self._cells = self._empty()
+
+    def _empty(self):
+        index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=["Klas", "Dag"])
+        return pd.DataFrame(0, index=index, columns=self.value_columns, dtype="int64")
+
+    # -------------------------------------------------
+    # OPBOUWEN
+    # -------------------------------------------------
+    def _aggregate(self, df):
+        """Ruwe lesrijen -> cellen per (Klas, Dag)."""
+        dag = pd.to_datetime(df["Datum"], errors="coerce").dt.normalize()
+        geldig = dag.notna() & df["Klas"].notna()
+        df, dag = df[geldig], dag[geldig]
+        if df.empty:
+            return self._empty()
+
+        rows = pd.DataFrame({"Klas": df["Klas"].astype(str), "Dag": dag, "n": 1}, index=df.index)
+        for s in SCORES:
+            waarden = pd.to_numeric(df[s], errors="coerce") if s in df.columns else pd.Series(float("nan"), index=df.index)
+            rows[f"sum_{s}"] = waarden.fillna(0)
+            rows[f"cnt_{s}"] = waarden.notna().astype("int64")
+            afgerond = waarden.round()
+            for k in NIVEAUS:
+                rows[f"{s}_{k}"] = (afgerond == k).astype("int64")
+        # Multi-hot uit het bitmasker; de bitvolgorde is die van self.tag_columns
+        hot = multi_hot(tag_mask(df, self.tags), len(self.tag_columns))
+        rows = pd.concat([rows, pd.DataFrame(hot.astype("int64"), columns=self.tag_columns, index=df.index)], axis=1)
+
+        cells = rows.groupby(["Klas", "Dag"]).sum()
+        return cells[self.value_columns].astype("int64")
+
+    def rebuild(self, df, n_source_rows=None, source_version=None):
+        """n_source_rows: aantal bronrijen als df al gefilterd is (ongeldige rijen weggelaten)."""
+        cells = self._aggregate(df) if not df.empty else self._empty()
+        with self._lock:
+            self._cells = cells
+            self.n_rows = len(df) if n_source_rows is None else n_source_rows
+            self.source_version = source_version
+            self.version += 1
+
+    def add_frame(self, df, source_version=None):
+        """
+        Incrementeel: nieuwe lesrijen optellen bij de bestaande cellen. source_version is
+        de bronversie mét deze rijen; kent de cube die al (sync was sneller), dan zitten
+        ze er al in en wordt er niets opgeteld.
+        """
+        if df.empty:
+            return
+        with self._sync_lock:
+            if source_version is not None and source_version == self.source_version:
+                return
+            nieuw = self._aggregate(df)
+            with self._lock:
+                self._cells = self._cells.add(nieuw, fill_value=0).astype("int64")
+                self.n_rows += len(df)
+                if source_version is not None:
+                    self.source_version = source_version
+                self.version += 1
+
+    def sync(self, source_version, loader):
+        """
+        Herbouwt enkel als de inhoud van de bron veranderd is. source_version() geeft de
+        (inhoudsgebaseerde) versie van de bron, loader() de rijen; beide lopen onder
+        dezelfde lock als add_frame, zodat een append ertussen niet dubbel telt.
+        """
+        with self._sync_lock:
+            versie = source_version()
+            if versie != self.source_version:
+                self.rebuild(loader(), source_version=versie)
+
+    # -------------------------------------------------
+    # QUERIES
+    # -------------------------------------------------
+    def select(self, start=None, classes=None):
+        """Cellen vanaf start (inclusief die dag) voor de gegeven klassen."""
+        with self._lock:
+            cells = self._cells
+        if cells.empty:
+            return cells
+        mask = pd.Series(True, index=cells.index)
+        if start is not None:
+            mask &= cells.index.get_level_values("Dag") >= pd.Timestamp(start).normalize()
+        if classes is not None:
+            mask &= cells.index.get_level_values("Klas").isin(list(classes))
+        return cells[mask.values]
+
+    def classes(self, start=None, classes=None):
+        """Klassen met minstens één registratie in de selectie."""
+        cells = self.select(start, classes)
+        return sorted(cells.index.get_level_values("Klas").unique())
+
+    def summary(self, start=None, classes=None):
+        """Aantal registraties en gemiddelde per score over de selectie."""
+        tot = self.select(start, classes).sum()
+        out = {"n": int(tot.get("n", 0))}
+        for s in SCORES:
+            cnt = tot.get(f"cnt_{s}", 0)
+            out[s] = tot[f"sum_{s}"] / cnt if cnt else float("nan")
+        return out
+
+    def monthly(self, start=None, classes=None):
+        """
+        Pivots Klas x Maand ('%Y-%m'): gemiddelde per score en het aantal
+        registraties met een Klasmanagement-score (zoals pivot_table 'count').
+        """
+        sel = self.select(start, classes)
+        if sel.empty:
+            leeg = pd.DataFrame()
+            return {s: leeg for s in SCORES} | {"count": leeg}
+        sel = sel.reset_index()
+        sel["Maand"] = sel["Dag"].dt.strftime("%Y-%m")
+        g = sel.groupby(["Klas", "Maand"]).sum(numeric_only=True)
+        out = {}
+        for s in SCORES:
+            cnt = g[f"cnt_{s}"]
+            out[s] = (g[f"sum_{s}"] / cnt.where(cnt > 0)).unstack("Maand")
+        out["count"] = g["cnt_Klasmanagement"].where(g["cnt_Klasmanagement"] > 0).unstack("Maand")
+        return out
+
+    def histograms(self, start=None, classes=None):
+        """Per klas de verdeling 1-5 van elke score (kolommen: MultiIndex (score, niveau))."""
+        sel = self.select(start, classes)
+        kolommen = [f"{s}_{k}" for s in SCORES for k in NIVEAUS]
+        per_klas = sel[kolommen].groupby(level="Klas").sum()
+        per_klas.columns = pd.MultiIndex.from_tuples([(s, k) for s in SCORES for k in NIVEAUS])
+        return per_klas
+
+    def tag_counts(self, start=None, classes=None):
+        """Lange tabel Klas, Kolom (Positief/Negatief), Tag, Aantal (enkel > 0)."""
+        sel = self.select(start, classes)
+        per_klas = sel[self.tag_columns].groupby(level="Klas").sum()
+        lang = per_klas.reset_index().melt(id_vars="Klas", var_name="Sleutel", value_name="Aantal")
+        lang["Kolom"] = lang["Sleutel"].str.split(":", n=1).str[0]
+        lang["Tag"] = lang["Sleutel"].str.split(":", n=1).str[1]
+        return lang.loc[lang["Aantal"] > 0, ["Klas", "Kolom", "Tag", "Aantal"]].reset_index(drop=True)
+
+
+class Benchmarks:
+    """
+    Schoolbrede gemiddelden van alle leerkrachten ('Gem. Alle Leerkrachten' in het rapport)
+    en per klas. Lesscores komen uit een LessonCube met enkel de live registraties (de
+    app geeft er een eigen cube voor, zonder legacy CSV's); voor het daggevoel houdt
+    deze klasse zelf een lopende som en aantal bij. Beide worden incrementeel
+    bijgewerkt bij elke registratie.
+    """
+    DAG_SCORES = ("Energie", "Stress")
+
+    def __init__(self, cube):
+        self.cube = cube
+        self.n_rows = 0
+        self.source_version = None  # bronversie van het daggevoel (zie sync_days)
+        self._lock = threading.Lock()
+        self._sync_lock = threading.RLock()
+        self._sums = {s: 0.0 for s in self.DAG_SCORES}
+        self._counts = {s: 0 for s in self.DAG_SCORES}
+        self._day_version = 0
+
+    @property
+    def version(self):
+        return (self._day_version, self.cube.version)
+
+    def _totals(self, df):
+        sums, counts = {}, {}
+        for s in self.DAG_SCORES:
+            waarden = pd.to_numeric(df[s], errors="coerce") if s in df.columns else pd.Series(dtype=float)
+            sums[s] = float(waarden.sum())
+            counts[s] = int(waarden.notna().sum())
+        return sums, counts
+
+    def rebuild_days(self, df, source_version=None):
+        sums, counts = self._totals(df)
+        with self._lock:
+            self._sums, self._counts = sums, counts
+            self.n_rows = len(df)
+            self.source_version = source_version
+            self._day_version += 1
+
+    def add_days(self, df, source_version=None):
+        """Zoals LessonCube.add_frame: niets doen als de bron met deze rijen al verwerkt is."""
+        if df.empty:
+            return
+        with self._sync_lock:
+            if source_version is not None and source_version == self.source_version:
+                return
+            sums, counts = self._totals(df)
+            with self._lock:
+                for s in self.DAG_SCORES:
+                    self._sums[s] += sums[s]
+                    self._counts[s] += counts[s]
+                self.n_rows += len(df)
+                if source_version is not None:
+                    self.source_version = source_version
+                self._day_version += 1
+
+    def sync_days(self, source_version, loader):
+        """Herbouwt het daggevoel enkel bij een nieuwe bronversie (zie LessonCube.sync)."""
+        with self._sync_lock:
+            versie = source_version()
+            if versie != self.source_version:
+                self.rebuild_days(loader(), source_version=versie)
+
+    def school(self):
+        """Gemiddelde per indicator over alle leerkrachten (0 als er nog geen data is)."""
+        with self._lock:
+            out = {s: self._sums[s] / self._counts[s] if self._counts[s] else 0 for s in self.DAG_SCORES}
+        lessen = self.cube.summary()
+        for s in SCORES:
+            out[s] = 0 if pd.isna(lessen[s]) else lessen[s]
+        return out
+
+    def per_class(self, start=None):
+        """Gemiddelde lesscores en aantal registraties per klas."""
+        sel = self.cube.select(start)
+        g = sel.groupby(level="Klas").sum()
+        out = pd.DataFrame({"n": g["n"]})
+        for s in SCORES:
+            out[s] = g[f"sum_{s}"] / g[f"cnt_{s}"].where(g[f"cnt_{s}"] > 0)
+        return out
+
+    def report(self):
+        """
+        De benchmark voor de rapporten: school() plus onder "klassen" per klas
+        {"n", "Lesaanpak", "Klasmanagement"} (picklebaar, voor de procespool).
+        """
+        out = self.school()
+        out["klassen"] = {
+            str(klas): {k: (0 if pd.isna(v) else float(v)) for k, v in rij.items()}
+            for klas, rij in self.per_class().iterrows()
+        }
+        return out
+
+
+class DaySeries:
+    """
+    Daggevoel per dag (aantal registraties en som per score) met prefixsommen erover.
+    Gemiddelde en aantal over een venster [start, end) zijn twee binaire zoekopdrachten
+    in de dagen plus een aftrekking, ongeacht hoeveel rijen er in zitten.
+
+    Onveranderlijk: extend() geeft een nieuwe reeks. Verwacht getypeerde frames
+    (ingest.py: Datum als datetime64, elke rij heeft alle scores).
+    """
+    SCORES = ("Energie", "Rust")
+
+    def __init__(self, cells):
+        # cells: per Dag (oplopende index) de kolommen n en sum_<score>
+        self.cells = cells
+        self._dagen = pd.DatetimeIndex(cells.index)
+        self._kolom = {k: i for i, k in enumerate(cells.columns)}
+        waarden = cells.to_numpy(dtype="float64")
+        # _cum[i] = totaal over de eerste i dagen
+        self._cum = np.vstack([np.zeros((1, len(cells.columns))), np.cumsum(waarden, axis=0)])
+
+    @classmethod
+    def _aggregate(cls, df):
+        kolommen = ["n"] + [f"sum_{s}" for s in cls.SCORES]
+        if df.empty:
+            return pd.DataFrame(0, index=pd.DatetimeIndex([], name="Dag"), columns=kolommen, dtype="int64")
+        rows = pd.DataFrame({"Dag": df["Datum"].dt.normalize(), "n": 1})
+        for s in cls.SCORES:
+            rows[f"sum_{s}"] = df[s].astype("int64")
+        return rows.groupby("Dag").sum()[kolommen]
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(cls._aggregate(df))
+
+    def extend(self, df):
+        """Nieuwe reeks met de rijen van df erbij (bv. registraties die nog in de wachtrij staan)."""
+        if df.empty:
+            return self
+        return DaySeries(self.cells.add(self._aggregate(df), fill_value=0).astype("int64"))
+
+    def _bounds(self, start=None, end=None):
+        """Posities van de eerste dag >= start en de eerste dag >= end."""
+        i = 0 if start is None else int(self._dagen.searchsorted(pd.Timestamp(start)))
+        j = len(self._dagen) if end is None else int(self._dagen.searchsorted(pd.Timestamp(end)))
+        return i, max(i, j)
+
+    def summary(self, start=None, end=None):
+        """Aantal registraties en gemiddelde per score met start <= Datum < end."""
+        i, j = self._bounds(start, end)
+        tot = self._cum[j] - self._cum[i]
+        n = int(tot[self._kolom["n"]])
+        out = {"n": n}
+        for s in self.SCORES:
+            out[s] = tot[self._kolom[f"sum_{s}"]] / n if n else float("nan")
+        return out
+
+    def trend(self, start=None, end=None, freq="D"):
+        """
+        Gemiddelde per dag ('D'), week ('W') of maand ('M') met start <= Datum < end:
+        kolommen Datum (begin van de periode), n en per score het gemiddelde.
+        Enkel periodes met registraties; één verschil van prefixsommen per periode.
+        """
+        i, j = self._bounds(start, end)
+        # De cellen zijn al per dag: enkel voor week/maand naar periodes omzetten
+        periodes = self._dagen[i:j] if freq == "D" else self._dagen[i:j].to_period(freq).start_time
+        if j == i:
+            return pd.DataFrame({"Datum": periodes, "n": []} | {s: [] for s in self.SCORES})
+        # Eerste dag van elke periode; het totaal van een periode loopt tot de volgende grens
+        nieuw = np.flatnonzero(np.r_[True, periodes[1:] != periodes[:-1]])
+        grenzen = nieuw + i
+        tot = self._cum[np.r_[grenzen[1:], j]] - self._cum[grenzen]
+        n = tot[:, self._kolom["n"]]
+        out = pd.DataFrame({"Datum": periodes[nieuw], "n": n.astype("int64")})
+        for s in self.SCORES:
+            out[s] = tot[:, self._kolom[f"sum_{s}"]] / n
+        return out
@@ -0,0 +1,180 @@
+"""
+Eén gedeelde kopie van de schooldata per proces.
+
+SchoolData houdt per werkblad de getypeerde, bevroren frame (zie ingest.py) bij
+voor alle sessies samen. Sessies krijgen die frame zelf of een read-only selectie
+ervan (read_user); ze downloaden of parsen niets.
+
+Verversen gebeurt op twee manieren:
+- op schema: een achtergronddraad kijkt elke refresh_interval of de store een
+  nieuwere versie heeft (bij Sheets: de CachedStore haalt ze op) en parst die één keer;
+- bij een eigen schrijfactie: on_append() (listener op de WriteQueue) parst enkel
+  de nieuwe rijen en plakt ze achteraan, zodat de registratie meteen zichtbaar is.
+
+Backends zonder versienummer gelden als verouderd na refresh_interval; CachedStore
+en SQLiteStore hebben er een, zodat een ongewijzigd werkblad niet opnieuw gelezen wordt.
+
+Afgeleide reeksen (day_series: daggevoel per dag met prefixsommen, per leerkracht of
+voor de hele school) worden één keer per versie gebouwd en daarna gedeeld.
+"""
+import threading
+import time
+
+from ingest import IngestCache, concat_typed, freeze, ingest
+from rollup import DaySeries
+from storage import EMAIL_KOLOM, WS_DAG, WS_LESSEN, EmailPartition
+from timing import span
+
+
+class SchoolData:
+    def __init__(self, store, legacy=None, refresh_interval=60.0, worksheets=(WS_DAG, WS_LESSEN)):
+        self.store = store
+        self.legacy = legacy
+        self.refresh_interval = refresh_interval
+        self.worksheets = worksheets
+        self.last_error = None
+        self.stats = {"ingest": 0, "append": 0}
+        self._lock = threading.Lock()
+        self._ws_locks = {ws: threading.Lock() for ws in worksheets}
+        self._frames = {}      # ws -> getypeerde frame
+        self._versions = {}    # ws -> bronversie waarbij die frame hoort
+        self._partitions = {}  # ws -> EmailPartition over de getypeerde frame (lui)
+        self._legacy = IngestCache()
+        self._school = (None, None, None)  # (live frame, legacy frame, samengevoegd)
+        self._series = {}      # email (None = school) -> (versie, DaySeries) van het daggevoel
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Versies ---
+    def _source_version(self, worksheet):
+        if hasattr(self.store, "version"):
+            return self.store.version(worksheet)
+        # Geen versienummer: per tijdsvenster opnieuw lezen
+        return int(time.monotonic() // max(self.refresh_interval, 1e-3))
+
+    def version(self, worksheet):
+        with self._lock:
+            return self._versions.get(worksheet)
+
+    # --- Lezen ---
+    def frame(self, worksheet):
+        """De gedeelde getypeerde frame van een werkblad (niet wijzigen, wel filteren)."""
+        with self._lock:
+            df = self._frames.get(worksheet)
+            actueel = df is not None and self._versions.get(worksheet) == self._source_version(worksheet)
+        if actueel:
+            return df
+        with self._ws_locks[worksheet]:
+            # Een andere sessie kan intussen al geparst hebben
+            with self._lock:
+                df = self._frames.get(worksheet)
+                if df is not None and self._versions.get(worksheet) == self._source_version(worksheet):
+                    return df
+            return self._load(worksheet)
+
+    def _load(self, worksheet):
+        versie = self._source_version(worksheet)
+        with span(f"sheets.read.{worksheet}"):
+            raw = self.store.read(worksheet)
+        # store.read() kan zelf de versie verhogen (eerste fetch); die van na het lezen geldt
+        if hasattr(self.store, "version"):
+            versie = self.store.version(worksheet)
+        with span(f"ingest.{worksheet}"):
+            typed = ingest(worksheet, raw)
+        with self._lock:
+            self._frames[worksheet] = typed
+            self._versions[worksheet] = versie
+            self._partitions.pop(worksheet, None)
+            self.stats["ingest"] += 1
+        return typed
+
+    def read_user(self, worksheet, email):
+        """Enkel de rijen van één leerkracht, als (kleine) read-only frame."""
+        df = self.frame(worksheet)
+        with self._lock:
+            df = self._frames.get(worksheet, df)
+            partition = self._partitions.get(worksheet)
+            if partition is None:
+                partition = EmailPartition(df, EMAIL_KOLOM[worksheet])
+                if self._frames.get(worksheet) is df:
+                    self._partitions[worksheet] = partition
+            # Binnen de lock: on_append() breidt dezelfde partitie uit
+            rows = partition.rows_for(df, email)
+        rows.attrs = {}
+        return freeze(rows)
+
+    def school_lessons(self):
+        """Alle lessen: live + legacy CSV's, samen getypeerd (enkel opnieuw bij een nieuwe versie)."""
+        live = self.frame(WS_LESSEN)
+        legacy = self._legacy.get(WS_LESSEN, self.legacy.read(WS_LESSEN)) if self.legacy is not None else None
+        with self._lock:
+            vorige_live, vorige_legacy, samen = self._school
+        if samen is not None and vorige_live is live and vorige_legacy is legacy:
+            return samen
+        samen = concat_typed(WS_LESSEN, live, legacy) if legacy is not None else live
+        with self._lock:
+            self._school = (live, legacy, samen)
+        return samen
+
+    def day_series(self, email=None):
+        """Daggevoel per dag van één leerkracht (of de hele school als email None is), één keer per versie."""
+        df = self.frame(WS_DAG)
+        with self._lock:
+            # Frame en versie samen lezen: on_append kan intussen een nieuwe frame gezet hebben
+            df = self._frames.get(WS_DAG, df)
+            versie = self._versions.get(WS_DAG)
+            vorige = self._series.get(email)
+        if vorige is not None and vorige[0] == versie:
+            return vorige[1]
+        reeks = DaySeries.from_frame(self.read_user(WS_DAG, email) if email is not None else df)
+        with self._lock:
+            self._series[email] = (versie, reeks)
+        return reeks
+
+    # --- Schrijven ---
+    def on_append(self, worksheet, rows):
+        """Listener voor WriteQueue (na de store): nieuwe rijen achteraan de gedeelde frame."""
+        if worksheet not in self._ws_locks:
+            return
+        nieuw = ingest(worksheet, rows)
+        with self._ws_locks[worksheet]:
+            with self._lock:
+                df = self._frames.get(worksheet)
+                if df is None:
+                    return
+                partition = self._partitions.get(worksheet)
+            samen = concat_typed(worksheet, df, nieuw)
+            with self._lock:
+                self._frames[worksheet] = samen
+                # De store heeft de rijen al (append liep eerst): zijn versie is de onze
+                self._versions[worksheet] = self._source_version(worksheet)
+                if partition is not None and len(nieuw):
+                    partition.extend(nieuw)
+                else:
+                    self._partitions.pop(worksheet, None)
+                self.stats["append"] += 1
+
+    # --- Schema ---
+    def refresh(self):
+        """Alle werkbladen bijwerken naar de laatste versie van de store."""
+        for ws in self.worksheets:
+            self.store.read(ws)  # CachedStore: start een achtergrond-fetch als de cache oud is
+            self.frame(ws)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lkm-school-data", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+                self.last_error = None
+            except Exception as e:
+                # Sessies blijven de vorige versie zien
+                self.last_error = f"{type(e).__name__}: {e}"
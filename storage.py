@@ -0,0 +1,917 @@
+"""
+Opslaglaag van de Leerkrachtenmonitor.
+
+Alle registraties (gebruikers, daggevoel, lessen) lopen via een RegistratieStore.
+Er zijn meerdere backends:
+
+- SheetsStore : het bestaande Google Sheet (via st-gsheets-connection)
+- SQLiteStore : lokaal SQLite-bestand, geïndexeerd op (Email, Datum)
+- LegacyCsvStore : de oude data/*_lessons.csv en data/*_day.csv bestanden (alleen lezen)
+
+Welke backend gebruikt wordt, kies je met open_store() (zie reflectietool.get_store).
+Nieuwe registraties gaan via een WriteQueue: één achtergrond-schrijver per proces
+die rijen bundelt en als append wegschrijft. Een CachedStore legt een
+stale-while-revalidate cache met versienummer per werkblad over een trage backend.
+"""
+import atexit
+import glob
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------
+# WERKBLADEN & SCHEMA
+# -------------------------------------------------
+WS_USERS = "Users"
+WS_DAG = "Daggevoel"
+WS_LESSEN = "Lessons"
+
+KOLOMMEN = {
+    WS_USERS: ["email", "password", "role"],
+    WS_DAG: ["Email", "Datum", "Energie", "Rust", "Stress"],
+    WS_LESSEN: ["Email", "Datum", "Klas", "Lesaanpak", "Klasmanagement", "Positief", "Negatief"],
+}
+
+# Sleutels waarop upsert() bestaande rijen vervangt
+SLEUTELS = {
+    WS_USERS: ["email"],
+    WS_DAG: ["Email", "Datum"],
+    WS_LESSEN: ["Email", "Datum", "Klas"],
+}
+
+# Kolom met het e-mailadres per werkblad (Users gebruikt kleine letters)
+EMAIL_KOLOM = {WS_USERS: "email", WS_DAG: "Email", WS_LESSEN: "Email"}
+
+
+def normalize_email(email):
+    return str(email).strip().lower()
+
+
+def lege_frame(worksheet):
+    return pd.DataFrame(columns=KOLOMMEN[worksheet])
+
+
+def parse_datum(kolom):
+    """
+    ISO 8601 (zoals we schrijven: '2024-10-01' of '2024-10-01 10:15:00.123456');
+    enkel wat daar niet in past, gaat nog door een dag-eerst fallback (oude CSV's).
+    Wat ook zo niet te lezen is, wordt NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(kolom):
+        return kolom.astype("datetime64[ns]")
+    tekst = kolom.astype("string").str.strip()
+    datums = pd.to_datetime(tekst, format="ISO8601", errors="coerce")
+    rest = datums.isna() & tekst.notna() & (tekst != "")
+    if rest.any():
+        datums[rest] = pd.to_datetime(tekst[rest], format="mixed", dayfirst=True, errors="coerce")
+    return datums.astype("datetime64[ns]")
+
+
+def inhoud_digest(df):
+    """
+    Hash van kolommen en waarden van een frame, ongevoelig voor hoe de backend typeert:
+    3, 3.0 en "3" zijn gelijk, net als NaN en "". Zo geeft een sheet die bij een refresh
+    dezelfde rijen (anders getypeerd) teruggeeft dezelfde digest.
+    """
+    kolommen = {}
+    for naam in df.columns:
+        kolom = df[naam]
+        if pd.api.types.is_numeric_dtype(kolom):
+            kolommen[naam] = kolom.astype("float64")
+            continue
+        tekst = kolom.fillna("").astype(str).str.strip()
+        gevuld = tekst[tekst != ""]
+        # Tekstkolom met enkel getallen ("3", 3.0): als getal vergelijken. Eerst een
+        # steekproef, zodat echte tekstkolommen niet volledig geparst worden
+        if len(gevuld) and pd.to_numeric(gevuld.head(64), errors="coerce").notna().all():
+            getallen = pd.to_numeric(gevuld, errors="coerce")
+            if getallen.notna().all():
+                kolommen[naam] = getallen.reindex(kolom.index).astype("float64")
+                continue
+        kolommen[naam] = tekst if len(gevuld) else pd.Series(np.nan, index=kolom.index)
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(kolommen, index=df.index), index=False)
+    return len(df), tuple(map(str, df.columns)), hashlib.sha1(hashes.values.tobytes()).hexdigest()
+
+
+class StoreError(Exception):
+    pass
+
+
+# -------------------------------------------------
+# INTERFACE
+# -------------------------------------------------
+class RegistratieStore:
+    """
+    Gemeenschappelijke interface voor alle backends.
+    read() is verplicht; de andere methodes hebben een (trage) standaardversie
+    die backends met een index overschrijven.
+    """
+    name = "base"
+
+    def read(self, worksheet):
+        raise NotImplementedError
+
+    def read_user(self, worksheet, email):
+        """Alle rijen van één gebruiker (e-mail genormaliseerd vergeleken)."""
+        df = self.read(worksheet)
+        if df.empty:
+            return df
+        kolom = EMAIL_KOLOM[worksheet]
+        mask = df[kolom].astype(str).str.strip().str.lower() == normalize_email(email)
+        return df[mask].reset_index(drop=True)
+
+    def count(self, worksheet):
+        """Aantal rijen in het werkblad (goedkope wijzigingsdetectie voor afgeleide caches)."""
+        return len(self.read(worksheet))
+
+    def append(self, worksheet, rows):
+        """Voegt rijen achteraan toe; geeft het aantal weggeschreven rijen terug."""
+        raise NotImplementedError
+
+    def upsert(self, worksheet, rows, keys=None):
+        """Vervangt rijen met dezelfde sleutels en voegt de rest toe; geeft het aantal weggeschreven rijen terug."""
+        raise NotImplementedError
+
+
+# -------------------------------------------------
+# GOOGLE SHEETS
+# -------------------------------------------------
+class SheetsStore(RegistratieStore):
+    """Het bestaande Google Sheet. Daggevoel staat op het eerste tabblad (index 0)."""
+    name = "sheets"
+
+    TABBLADEN = {WS_USERS: "Users", WS_DAG: 0, WS_LESSEN: "Lessons"}
+
+    def __init__(self, conn, spreadsheet):
+        self.conn = conn
+        self.spreadsheet = spreadsheet
+
+    def _tab(self, worksheet):
+        return self.TABBLADEN.get(worksheet, worksheet)
+
+    def read(self, worksheet):
+        df = self.conn.read(spreadsheet=self.spreadsheet, worksheet=self._tab(worksheet), ttl=0)
+        # Lege sheet of ontbrekende headers: lege frame met de juiste kolommen
+        if df.empty or EMAIL_KOLOM[worksheet] not in df.columns:
+            return lege_frame(worksheet)
+        return df
+
+    def _write(self, worksheet, df):
+        self.conn.update(spreadsheet=self.spreadsheet, worksheet=self._tab(worksheet), data=df)
+
+    def _gspread_worksheet(self, worksheet):
+        """
+        Het onderliggende gspread-werkblad, of None als de verbinding dat niet biedt.
+        _select_worksheet is intern aan st-gsheets-connection (versie vastgepind in
+        requirements.txt): ontbreekt het of past de aanroep niet meer, dan None.
+        """
+        select = getattr(getattr(self.conn, "client", None), "_select_worksheet", None)
+        if select is None:
+            return None
+        try:
+            ws = select(spreadsheet=self.spreadsheet, worksheet=self._tab(worksheet))
+        except (AttributeError, TypeError):
+            return None
+        if not (hasattr(ws, "row_values") and hasattr(ws, "append_rows")):
+            return None
+        return ws
+
+    def append(self, worksheet, rows):
+        # Snel pad: echte append van enkel de nieuwe rijen (geen volledige herschrijving)
+        ws = self._gspread_worksheet(worksheet)
+        if ws is not None:
+            # Header per batch opnieuw lezen: iemand kan kolommen verschoven of ingevoegd hebben
+            header = ws.row_values(1)
+            if header and set(rows.columns) <= set(header):
+                values = rows.reindex(columns=header).astype(object)
+                values = values.where(values.notna(), "").values.tolist()
+                ws.append_rows(values, value_input_option="USER_ENTERED")
+                return len(rows)
+        # Terugval (lege sheet, nieuwe kolommen, publieke verbinding): lezen + volledig wegschrijven
+        current = self.read(worksheet)
+        updated = rows if current.empty else pd.concat([current, rows], ignore_index=True)
+        self._write(worksheet, updated)
+        return len(rows)
+
+    def upsert(self, worksheet, rows, keys=None):
+        keys = keys or SLEUTELS[worksheet]
+        current = self.read(worksheet)
+        updated = pd.concat([current, rows], ignore_index=True)
+        updated = updated.drop_duplicates(subset=keys, keep="last")
+        self._write(worksheet, updated)
+        return len(rows.drop_duplicates(subset=keys, keep="last"))
+
+
+# -------------------------------------------------
+# SQLITE
+# -------------------------------------------------
+class SQLiteStore(RegistratieStore):
+    """
+    Lokale SQLite-database. E-mails worden genormaliseerd opgeslagen en Datum als
+    ISO-tekst; de (Email, Datum) index draagt read_user() en de sleutels van upsert().
+    Periodes en klassen filtert SchoolData op zijn gedeelde frame, niet hier.
+
+    version(ws) verandert enkel na een schrijfactie (van dit of een ander proces),
+    zodat SchoolData de tabellen niet opnieuw leest zolang er niets bijkwam.
+    """
+    name = "sqlite"
+
+    TABELLEN = {WS_USERS: "users", WS_DAG: "daggevoel", WS_LESSEN: "lessons"}
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            email TEXT PRIMARY KEY, password TEXT, role TEXT
+        );
+        CREATE TABLE IF NOT EXISTS daggevoel (
+            Email TEXT NOT NULL, Datum TEXT NOT NULL,
+            Energie INTEGER, Rust INTEGER, Stress INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS lessons (
+            Email TEXT NOT NULL, Datum TEXT NOT NULL, Klas TEXT,
+            Lesaanpak INTEGER, Klasmanagement INTEGER, Positief TEXT, Negatief TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ix_daggevoel_email_datum ON daggevoel (Email, Datum);
+        CREATE INDEX IF NOT EXISTS ix_lessons_email_datum ON lessons (Email, Datum);
+        DROP INDEX IF EXISTS ix_daggevoel_datum;
+        DROP INDEX IF EXISTS ix_lessons_klas_datum;
+        DROP INDEX IF EXISTS ix_lessons_datum;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Eén verbinding voor het hele proces; de lock serialiseert de toegang
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._writes = {ws: 0 for ws in self.TABELLEN}
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(self.SCHEMA)
+            self._db.commit()
+
+    def _query(self, worksheet, where="", params=()):
+        tabel = self.TABELLEN[worksheet]
+        kolommen = ", ".join(KOLOMMEN[worksheet])
+        sql = f"SELECT {kolommen} FROM {tabel} {where}"
+        with self._lock:
+            return pd.read_sql_query(sql, self._db, params=params)
+
+    def read(self, worksheet):
+        return self._query(worksheet)
+
+    def version(self, worksheet):
+        # data_version stijgt bij commits van andere verbindingen, _writes bij de eigen
+        with self._lock:
+            extern = self._db.execute("PRAGMA data_version").fetchone()[0]
+            return extern, self._writes[worksheet]
+
+    def count(self, worksheet):
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.TABELLEN[worksheet]}").fetchone()[0]
+
+    def read_user(self, worksheet, email):
+        kolom = EMAIL_KOLOM[worksheet]
+        order = " ORDER BY Datum" if worksheet != WS_USERS else ""
+        return self._query(worksheet, f"WHERE {kolom} = ?{order}", (normalize_email(email),))
+
+    def _prepare(self, worksheet, rows):
+        df = rows.reindex(columns=KOLOMMEN[worksheet]).copy()
+        kolom = EMAIL_KOLOM[worksheet]
+        df[kolom] = df[kolom].map(normalize_email)
+        if "Datum" in df.columns:
+            datums = parse_datum(df["Datum"])
+            fout = datums.isna()
+            if fout.any():
+                # Niets stil weglaten: de oproeper (WriteQueue, migratie) moet het weten
+                voorbeelden = ", ".join(repr(v) for v in df.loc[fout, "Datum"].head(3))
+                raise StoreError(f"{worksheet}: {int(fout.sum())} rij(en) zonder leesbare Datum "
+                                 f"({voorbeelden}); niets weggeschreven.")
+            df["Datum"] = datums.map(lambda d: d.isoformat(sep=" "))
+        # NaN -> None zodat SQLite NULL opslaat
+        return df.astype(object).where(df.notna(), None)
+
+    def append(self, worksheet, rows):
+        df = self._prepare(worksheet, rows)
+        if df.empty:
+            return 0
+        tabel = self.TABELLEN[worksheet]
+        kolommen = list(df.columns)
+        sql = f"INSERT INTO {tabel} ({', '.join(kolommen)}) VALUES ({', '.join('?' * len(kolommen))})"
+        with self._lock:
+            with self._db:
+                self._db.executemany(sql, df.itertuples(index=False, name=None))
+            self._writes[worksheet] += 1
+        return len(df)
+
+    def upsert(self, worksheet, rows, keys=None):
+        keys = keys or SLEUTELS[worksheet]
+        df = self._prepare(worksheet, rows).drop_duplicates(subset=keys, keep="last")
+        if df.empty:
+            return 0
+        tabel = self.TABELLEN[worksheet]
+        kolommen = list(df.columns)
+        delete_sql = f"DELETE FROM {tabel} WHERE " + " AND ".join(f"{k} = ?" for k in keys)
+        insert_sql = f"INSERT INTO {tabel} ({', '.join(kolommen)}) VALUES ({', '.join('?' * len(kolommen))})"
+        with self._lock:
+            with self._db:
+                self._db.executemany(delete_sql, df[keys].itertuples(index=False, name=None))
+                self._db.executemany(insert_sql, df.itertuples(index=False, name=None))
+            self._writes[worksheet] += 1
+        return len(df)
+
+
+# -------------------------------------------------
+# LEGACY CSV (ALLEEN LEZEN)
+# -------------------------------------------------
+class LegacyCsvStore(RegistratieStore):
+    """
+    De oude per-leerkracht bestanden: data/<naam>_lessons.csv en data/<naam>_day.csv.
+
+    De bestanden worden parallel ingelezen (thread pool) en per bestand gecachet op
+    (mtime, grootte), zodat een volgende read() enkel gewijzigde bestanden opnieuw
+    leest. compact() bundelt alles in één Parquet-bestand met per rij het bronbestand
+    (kolom BRON) en per bronbestand de signatuur (manifest). read() gebruikt uit de
+    bundel enkel de rijen van bestanden die nog bestaan en niet veranderd zijn;
+    gewijzigde bestanden worden opnieuw als CSV gelezen, verwijderde vallen weg.
+    failed[ws] bevat per bestand de reden waarom het niet te parsen was.
+    """
+    name = "legacy_csv"
+
+    PATRONEN = {WS_DAG: "*_day.csv", WS_LESSEN: "*_lessons.csv"}
+    COMPACT = {WS_DAG: "legacy_day.parquet", WS_LESSEN: "legacy_lessons.parquet"}
+    BRON = "_bron"
+
+    def __init__(self, data_dir, max_workers=8):
+        self.data_dir = data_dir
+        self.max_workers = max_workers
+        self.failed = {}
+        self._lock = threading.Lock()
+        self._files = {}       # pad -> (signatuur, DataFrame of None, fout of None)
+        self._combined = {}    # ws -> (sleutel, DataFrame)
+        self._compacted = {}   # ws -> (signatuur, manifest, DataFrame)
+
+    @staticmethod
+    def _signature(path):
+        info = os.stat(path)
+        return (info.st_mtime_ns, info.st_size)
+
+    def _compact_path(self, worksheet):
+        return os.path.join(self.data_dir, self.COMPACT[worksheet])
+
+    def _load_compacted(self, worksheet):
+        """Het gebundelde Parquet-bestand en zijn manifest {bestandsnaam: signatuur}."""
+        path = self._compact_path(worksheet)
+        if not os.path.exists(path) or not os.path.exists(path + ".json"):
+            return {}, None
+        # Bundel en manifest samen: compact() vervangt ze na elkaar
+        sig = (self._signature(path), self._signature(path + ".json"))
+        cached = self._compacted.get(worksheet)
+        if cached and cached[0] == sig:
+            return cached[1], cached[2]
+        df = pd.read_parquet(path)
+        with open(path + ".json", encoding="utf-8") as f:
+            manifest = {naam: tuple(v) for naam, v in json.load(f).items()}
+        if self.BRON not in df.columns:
+            # Bundel van vóór de bronkolom: rijen niet toe te wijzen, dus alles als CSV lezen
+            manifest, df = {}, None
+        self._compacted[worksheet] = (sig, manifest, df)
+        return manifest, df
+
+    def _read_files(self, paden):
+        """Leest de gegeven CSV's parallel en bewaart resultaat of fout per bestand."""
+        if not paden:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(paden))) as pool:
+            futures = {pool.submit(pd.read_csv, p): (p, sig) for p, sig in paden}
+            for fut in as_completed(futures):
+                p, sig = futures[fut]
+                try:
+                    self._files[p] = (sig, fut.result(), None)
+                except (OSError, ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+                    self._files[p] = (sig, None, f"{type(e).__name__}: {e}")
+
+    def _sources(self, worksheet):
+        """
+        (geldig manifest, gebundelde frame, {pad: signatuur} van de CSV's die nog gelezen
+        moeten, fouten). Geldig zijn de gebundelde bestanden die nog bestaan met dezelfde
+        signatuur; enkel hun rijen uit de bundel tellen nog mee.
+        """
+        fouten = {}
+        try:
+            manifest, compact_df = self._load_compacted(worksheet)
+        except (OSError, ValueError, ImportError) as e:
+            fouten[self._compact_path(worksheet)] = f"{type(e).__name__}: {e}"
+            manifest, compact_df = {}, None
+        geldig = {}
+        signaturen = {}
+        for p in sorted(glob.glob(os.path.join(self.data_dir, self.PATRONEN[worksheet]))):
+            try:
+                sig = self._signature(p)
+            except OSError as e:
+                fouten[p] = f"{type(e).__name__}: {e}"
+                continue
+            naam = os.path.basename(p)
+            # Ongewijzigd en al gebundeld: niet opnieuw als CSV lezen
+            if manifest.get(naam) == sig:
+                geldig[naam] = sig
+            else:
+                signaturen[p] = sig
+        return geldig, compact_df, signaturen, fouten
+
+    def _bundle_rows(self, compact_df, geldig):
+        """De rijen uit de bundel van bestanden die nog geldig zijn (met bronkolom)."""
+        if compact_df is None or not geldig:
+            return None
+        return compact_df[compact_df[self.BRON].isin(list(geldig))]
+
+    def version(self, worksheet):
+        """Verandert enkel als een bestand (of de bundel) verandert, verschijnt of verdwijnt."""
+        if worksheet not in self.PATRONEN:
+            return 0
+        with self._lock:
+            geldig, compact_df, signaturen, _ = self._sources(worksheet)
+            cached = self._compacted.get(worksheet)
+            bundel = cached[0] if cached and compact_df is not None else None
+        return hash((bundel, tuple(sorted(geldig.items())), tuple(signaturen.items())))
+
+    def read(self, worksheet):
+        if worksheet not in self.PATRONEN:
+            return lege_frame(worksheet)
+        with self._lock:
+            geldig, compact_df, signaturen, fouten = self._sources(worksheet)
+            sleutel = (tuple(signaturen.items()), id(compact_df), tuple(geldig))
+            cached = self._combined.get(worksheet)
+            if cached and cached[0] == sleutel and not fouten:
+                return cached[1]
+
+            self._read_files([(p, sig) for p, sig in signaturen.items()
+                              if self._files.get(p, (None,))[0] != sig])
+
+            frames = []
+            gebundeld = self._bundle_rows(compact_df, geldig)
+            if gebundeld is not None:
+                frames.append(gebundeld.drop(columns=self.BRON))
+            for p in signaturen:
+                _, df, fout = self._files[p]
+                if fout is not None:
+                    fouten[p] = fout
+                elif not df.empty:
+                    frames.append(df)
+            self.failed[worksheet] = fouten
+
+            combined = pd.concat(frames, ignore_index=True) if frames else lege_frame(worksheet)
+            self._combined[worksheet] = (sleutel, combined)
+            return combined
+
+    def compact(self, worksheet):
+        """
+        Bundelt alle leesbare CSV's (en de nog geldige rijen van een eerdere bundel) in
+        één Parquet-bestand. Geeft het aantal nieuw gebundelde CSV-bestanden terug.
+        """
+        self.read(worksheet)
+        with self._lock:
+            geldig, compact_df, signaturen, _ = self._sources(worksheet)
+            frames = []
+            gebundeld = self._bundle_rows(compact_df, geldig)
+            if gebundeld is not None:
+                frames.append(gebundeld)
+            gelukt = {}
+            for p, sig in signaturen.items():
+                bestand = self._files.get(p)
+                if bestand is None or bestand[0] != sig or bestand[2] is not None:
+                    continue
+                gelukt[os.path.basename(p)] = sig
+                if not bestand[1].empty:
+                    frames.append(bestand[1].assign(**{self.BRON: os.path.basename(p)}))
+            manifest = {**geldig, **gelukt}
+            out = (pd.concat(frames, ignore_index=True) if frames
+                   else lege_frame(worksheet).assign(**{self.BRON: pd.Series(dtype=object)}))
+            # Gemengde object-kolommen als tekst opslaan (Parquet eist één type per kolom)
+            for col in out.columns[out.dtypes == object]:
+                out[col] = out[col].astype("string")
+            path = self._compact_path(worksheet)
+            try:
+                out.to_parquet(path + ".tmp", index=False)
+            except ImportError as e:
+                raise StoreError(f"Parquet-ondersteuning (pyarrow) ontbreekt: {e}") from e
+            with open(path + ".json.tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(path + ".tmp", path)
+            os.replace(path + ".json.tmp", path + ".json")
+            return len(gelukt)
+
+    def append(self, worksheet, rows):
+        raise StoreError("De legacy CSV-bestanden zijn alleen-lezen.")
+
+    def upsert(self, worksheet, rows, keys=None):
+        raise StoreError("De legacy CSV-bestanden zijn alleen-lezen.")
+
+
+# -------------------------------------------------
+# PARTITIE PER LEERKRACHT
+# -------------------------------------------------
+class EmailPartition:
+    """
+    Rij-offsets per genormaliseerd e-mailadres van één frame. De e-mails worden
+    één keer genormaliseerd bij het opbouwen; daarna is rows_for() een take() van
+    enkel de rijen van die leerkracht.
+    """
+
+    def __init__(self, df, kolom):
+        self.kolom = kolom
+        self.n = 0
+        self.offsets = {}
+        self.extend(df)
+
+    def extend(self, rows):
+        """Voegt de offsets toe van rijen die achteraan de frame bijkomen."""
+        if len(rows) and self.kolom in rows.columns:
+            emails = rows[self.kolom].astype(str).str.strip().str.lower()
+            for email, idx in emails.groupby(emails.to_numpy(), sort=False).indices.items():
+                nieuw = idx + self.n
+                oud = self.offsets.get(email)
+                self.offsets[email] = nieuw if oud is None else np.concatenate([oud, nieuw])
+        self.n += len(rows)
+
+    def rows_for(self, df, email):
+        idx = self.offsets.get(normalize_email(email))
+        if idx is None:
+            return df.iloc[0:0].reset_index(drop=True)
+        return df.take(idx).reset_index(drop=True)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+# -------------------------------------------------
+# STALE-WHILE-REVALIDATE CACHE
+# -------------------------------------------------
+class CachedStore(RegistratieStore):
+    """
+    Cache per werkblad rond een andere backend (typisch SheetsStore).
+
+    read() geeft altijd meteen de gecachte frame terug. Is die ouder dan max_age,
+    of ongeldig gemaakt door een eigen schrijfactie, dan wordt hij op de achtergrond
+    ververst. Enkel de allereerste read() van een werkblad wacht op de backend.
+    version(ws) stijgt enkel als de inhoud van de gecachte frame verandert (eigen
+    append/upsert, of een refresh met andere rijen volgens inhoud_digest) en kan dus
+    dienen als sleutel voor afgeleide caches.
+
+    Per frame hoort een EmailPartition: read_user() kopieert enkel de rijen van die
+    leerkracht in plaats van het hele werkblad te filteren.
+    """
+
+    def __init__(self, inner, max_age=30.0):
+        self.inner = inner
+        self.name = f"cached_{inner.name}"
+        self.max_age = max_age
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._frames = {}      # ws -> DataFrame
+        self._fetched = {}     # ws -> time.monotonic() van laatste fetch
+        self._versions = {}    # ws -> int
+        self._digests = {}     # ws -> inhoud_digest van de gecachte frame (lui)
+        self._partitions = {}  # ws -> EmailPartition (lui opgebouwd)
+        self._refreshing = set()
+
+    def version(self, worksheet):
+        with self._lock:
+            return self._versions.get(worksheet, 0)
+
+    def _digest_pair(self, worksheet, vorige, df):
+        """(digest van de gecachte frame, digest van df), of None als de lengte al verschilt."""
+        if vorige is None or len(vorige) != len(df):
+            return None
+        with self._lock:
+            digest = self._digests.get(worksheet)
+        return (digest or inhoud_digest(vorige)), inhoud_digest(df)
+
+    def _fetch(self, worksheet):
+        with self._lock:
+            start_version = self._versions.get(worksheet, 0)
+            vorige = self._frames.get(worksheet)
+        df = self.inner.read(worksheet)
+        # Buiten de lock hashen; bij een verschillend aantal rijen is dat niet nodig
+        digests = self._digest_pair(worksheet, vorige, df)
+        ongewijzigd = digests is not None and digests[0] == digests[1]
+        with self._lock:
+            self._refreshing.discard(worksheet)
+            # Tijdens het ophalen ongeldig gemaakt: deze frame kan een append missen
+            verouderd = worksheet in self._frames and self._versions.get(worksheet, 0) != start_version
+            if not verouderd:
+                self._fetched[worksheet] = time.monotonic()
+                if ongewijzigd and self._frames.get(worksheet) is vorige:
+                    # Zelfde rijen: frame, partitie en versie houden (afgeleide caches blijven geldig)
+                    df = vorige
+                else:
+                    self._frames[worksheet] = df
+                    self._partitions.pop(worksheet, None)
+                    self._versions[worksheet] = start_version + 1
+                if digests is not None:
+                    self._digests[worksheet] = digests[1]
+                else:
+                    self._digests.pop(worksheet, None)
+        if verouderd:
+            self._refresh_async(worksheet)
+            return self.read(worksheet)
+        return df
+
+    def _refresh_async(self, worksheet):
+        with self._lock:
+            if worksheet in self._refreshing:
+                return
+            self._refreshing.add(worksheet)
+
+        def _run():
+            try:
+                self._fetch(worksheet)
+                self.last_error = None
+            except Exception as e:
+                # Oude frame blijft staan; volgende read() probeert opnieuw
+                self.last_error = f"{type(e).__name__}: {e}"
+                with self._lock:
+                    self._refreshing.discard(worksheet)
+
+        threading.Thread(target=_run, name=f"lkm-refresh-{worksheet}", daemon=True).start()
+
+    def read(self, worksheet):
+        with self._lock:
+            df = self._frames.get(worksheet)
+            fetched = self._fetched.get(worksheet)
+        if df is None:
+            return self._fetch(worksheet)
+        if fetched is None or time.monotonic() - fetched > self.max_age:
+            self._refresh_async(worksheet)
+        return df
+
+    def read_user(self, worksheet, email):
+        df = self.read(worksheet)
+        with self._lock:
+            # Altijd de frame en partitie van dezelfde versie samen gebruiken
+            df = self._frames.get(worksheet, df)
+            partition = self._partitions.get(worksheet)
+            if partition is None:
+                partition = EmailPartition(df, EMAIL_KOLOM[worksheet])
+                if self._frames.get(worksheet) is df:
+                    self._partitions[worksheet] = partition
+            return partition.rows_for(df, email)
+
+    def invalidate(self, worksheet, appended=None):
+        """
+        Markeert enkel dit werkblad als verouderd. Met appended worden de nieuwe rijen
+        meteen aan de gecachte frame toegevoegd, zodat ze niet even verdwijnen tot de
+        achtergrond-refresh klaar is.
+        """
+        with self._lock:
+            df = self._frames.get(worksheet)
+            if df is not None and appended is not None and not appended.empty:
+                self._frames[worksheet] = pd.concat([df, appended], ignore_index=True)
+                partition = self._partitions.get(worksheet)
+                if partition is not None:
+                    partition.extend(appended)
+                self._digests.pop(worksheet, None)
+            self._fetched[worksheet] = None
+            self._versions[worksheet] = self._versions.get(worksheet, 0) + 1
+        self._refresh_async(worksheet)
+
+    def append(self, worksheet, rows):
+        aantal = self.inner.append(worksheet, rows)
+        self.invalidate(worksheet, appended=rows)
+        return aantal
+
+    def upsert(self, worksheet, rows, keys=None):
+        aantal = self.inner.upsert(worksheet, rows, keys)
+        with self._lock:
+            self._frames.pop(worksheet, None)
+            self._partitions.pop(worksheet, None)
+            self._digests.pop(worksheet, None)
+            self._versions[worksheet] = self._versions.get(worksheet, 0) + 1
+        return aantal
+
+
+# -------------------------------------------------
+# WRITE-BEHIND QUEUE
+# -------------------------------------------------
+class WriteQueue:
+    """
+    Eén achtergrond-schrijver per proces. submit() zet rijen in de wachtrij en keert
+    meteen terug; de schrijver bundelt alles wat binnen flush_interval binnenkomt per
+    werkblad tot één append() op de backend.
+
+    Versies: elke submit krijgt een ticket (werkblad, volgnummer). version(ws) is het
+    hoogste volgnummer dat al in de backend staat, dus committed(ticket) zegt of een
+    registratie al weggeschreven is. Zolang dat niet zo is, levert pending() de rijen
+    zodat de gebruiker zijn eigen registratie meteen ziet.
+
+    Een bundel die na max_attempts pogingen nog altijd faalt, blokkeert de wachtrij
+    niet: ze gaat naar dead_letters (en als CSV naar dead_letter_dir, indien opgegeven)
+    en failed(ticket) geeft de fout terug, zodat de app de gebruiker kan waarschuwen.
+    """
+
+    def __init__(self, store, flush_interval=1.0, max_batch=500, max_backoff=60.0,
+                 max_attempts=6, dead_letter_dir=None):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.dead_letter_dir = dead_letter_dir
+        self.last_error = None
+        self.dead_letters = []  # (ws, volgnummers, rows, fout) die niet weg te schrijven waren
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._submitted = {}   # ws -> laatst uitgedeeld volgnummer
+        self._committed = {}   # ws -> laatst weggeschreven volgnummer
+        self._pending = []     # (ws, volgnummer, rows) nog niet weggeschreven
+        self._failed = {}      # (ws, volgnummer) -> fout, voor bundels in dead_letters
+        self._listeners = []
+        self._thread = threading.Thread(target=self._run, name="lkm-write-queue", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush, 10)
+
+    # --- Publieke API ---
+    def submit(self, worksheet, rows):
+        with self._lock:
+            seq = self._submitted.get(worksheet, 0) + 1
+            self._submitted[worksheet] = seq
+            self._pending.append((worksheet, seq, rows))
+        self._queue.put((worksheet, seq, rows))
+        return worksheet, seq
+
+    def version(self, worksheet):
+        with self._lock:
+            return self._committed.get(worksheet, 0)
+
+    def committed(self, ticket):
+        worksheet, seq = ticket
+        return self.version(worksheet) >= seq and self.failed(ticket) is None
+
+    def failed(self, ticket):
+        """De fout waarmee deze registratie opgegeven werd, of None."""
+        with self._lock:
+            return self._failed.get(tuple(ticket))
+
+    def pending(self, worksheet, email=None):
+        """Rijen die nog niet weggeschreven zijn (optioneel van één gebruiker)."""
+        with self._lock:
+            frames = [rows for ws, _, rows in self._pending if ws == worksheet]
+        if not frames:
+            return lege_frame(worksheet)
+        df = pd.concat(frames, ignore_index=True)
+        if email is not None:
+            kolom = EMAIL_KOLOM[worksheet]
+            df = df[df[kolom].astype(str).str.strip().str.lower() == normalize_email(email)]
+        return df.reset_index(drop=True)
+
+    def add_listener(self, callback):
+        """callback(worksheet, rows) wordt opgeroepen na elke geslaagde append."""
+        self._listeners.append(callback)
+
+    def flush(self, timeout=None):
+        """Wacht tot alles weggeschreven is. Geeft False terug bij een timeout."""
+        einde = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return True
+            if einde is not None and time.monotonic() > einde:
+                return False
+            time.sleep(0.05)
+
+    # --- Schrijver ---
+    def _collect(self):
+        """Blokkeert op het eerste item en verzamelt daarna tot flush_interval verstreken is."""
+        batch = [self._queue.get()]
+        einde = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            rest = einde - time.monotonic()
+            if rest <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=rest))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, ws, rows):
+        """append() met backoff; geeft None terug als het lukte, anders de laatste fout."""
+        backoff = min(1.0, self.max_backoff)
+        for poging in range(1, self.max_attempts + 1):
+            try:
+                self.store.append(ws, rows)
+                return None
+            except Exception as e:
+                fout = f"{type(e).__name__}: {e}"
+                self.last_error = fout
+                if poging < self.max_attempts:
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+        return fout
+
+    def _dead_letter(self, ws, seqs, rows, fout):
+        """Zet een opgegeven bundel opzij (geheugen + optioneel CSV) zodat de rest verder kan."""
+        self.dead_letters.append((ws, seqs, rows, fout))
+        if not self.dead_letter_dir:
+            return
+        try:
+            os.makedirs(self.dead_letter_dir, exist_ok=True)
+            pad = os.path.join(self.dead_letter_dir, f"{ws}_{time.strftime('%Y%m%d-%H%M%S')}_{seqs[0]}.csv")
+            rows.to_csv(pad, index=False)
+        except OSError as e:
+            self.last_error = f"{fout} (niet lokaal bewaard: {type(e).__name__}: {e})"
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            per_ws = {}
+            for ws, seq, rows in batch:
+                per_ws.setdefault(ws, []).append((seq, rows))
+            for ws, items in per_ws.items():
+                rows = pd.concat([r for _, r in items], ignore_index=True)
+                seqs = [seq for seq, _ in items]
+                # Opnieuw proberen met backoff (quota, netwerk); rijen blijven zolang in pending()
+                fout = self._write(ws, rows)
+                if fout is not None:
+                    self.last_error = None
+                    self._dead_letter(ws, seqs, rows, fout)
+                    with self._lock:
+                        self._failed.update({(ws, seq): fout for seq in seqs})
+                        self._pending = [p for p in self._pending if not (p[0] == ws and p[1] in seqs)]
+                    continue
+                self.last_error = None
+                # Eerst de listeners (caches), pas daarna uit pending halen: zo is een
+                # registratie op elk moment zichtbaar in de cache of in pending()
+                for callback in self._listeners:
+                    try:
+                        callback(ws, rows)
+                    except Exception as e:
+                        self.last_error = f"listener: {type(e).__name__}: {e}"
+                hoogste = max(seqs)
+                with self._lock:
+                    self._committed[ws] = max(self._committed.get(ws, 0), hoogste)
+                    self._pending = [p for p in self._pending if not (p[0] == ws and p[1] <= hoogste)]
+
+
+# -------------------------------------------------
+# FABRIEK & MIGRATIE
+# -------------------------------------------------
+def open_store(backend, **opties):
+    """
+    Maakt de gevraagde backend aan.
+    backend: "sheets" (conn=..., spreadsheet=..., cache_max_age=...), "sqlite" (path=...)
+    of "legacy_csv" (data_dir=...). Sheets krijgt standaard een CachedStore errond.
+    """
+    if backend == "sheets":
+        store = SheetsStore(opties["conn"], opties["spreadsheet"])
+        max_age = opties.get("cache_max_age", 30.0)
+        return CachedStore(store, max_age=float(max_age)) if max_age is not None else store
+    if backend == "sqlite":
+        return SQLiteStore(opties["path"])
+    if backend == "legacy_csv":
+        return LegacyCsvStore(opties["data_dir"])
+    raise StoreError(f"Onbekende opslag-backend: {backend}")
+
+
+def copy_worksheets(bron, doel, worksheets=(WS_USERS, WS_DAG, WS_LESSEN)):
+    """
+    Kopieert alle rijen van de ene backend naar de andere (bv. Sheets -> SQLite).
+    Geeft per werkblad het aantal rijen terug dat het doel effectief wegschreef
+    (bij Users na het samenvoegen van dubbele e-mails).
+    """
+    aantallen = {}
+    for ws in worksheets:
+        df = bron.read(ws)
+        if df.empty:
+            aantallen[ws] = 0
+        elif ws == WS_USERS:
+            aantallen[ws] = doel.upsert(ws, df)
+        else:
+            aantallen[ws] = doel.append(ws, df)
+    return aantallen
+
+
+if __name__ == "__main__":
+    # Onderhoud vanaf de commandolijn:
+    #   python storage.py compact [data_dir]      legacy CSV's bundelen in Parquet
+    #   python storage.py migrate <sqlite_pad>    legacy CSV's kopiëren naar SQLite
+    import sys
+
+    actie = sys.argv[1] if len(sys.argv) > 1 else ""
+    if actie == "compact":
+        legacy = LegacyCsvStore(sys.argv[2] if len(sys.argv) > 2 else "data")
+        for ws in (WS_DAG, WS_LESSEN):
+            print(f"{ws}: {legacy.compact(ws)} bestand(en) gebundeld")
+            for pad, fout in legacy.failed.get(ws, {}).items():
+                print(f"  overgeslagen: {pad} ({fout})")
+    elif actie == "migrate" and len(sys.argv) > 2:
+        for ws, aantal in copy_worksheets(LegacyCsvStore("data"), SQLiteStore(sys.argv[2]), (WS_DAG, WS_LESSEN)).items():
+            print(f"{ws}: {aantal} rij(en) gekopieerd")
+    else:
+        print(__doc__)
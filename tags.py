@@ -0,0 +1,107 @@
+"""
+Compacte codering van de Positief/Negatief-tags.
+
+De vocabulaire is gesloten (8 positieve + 7 negatieve stemmingen), dus elke les past
+in één uint16-bitmasker: bit i staat voor de i-de (kolom, tag) uit bit_layout().
+De tekstvorm ("Actief, Veilig") blijft enkel bestaan voor het werkblad; tellingen
+per klas of periode worden kolomsommen over de multi-hot matrix, zonder explode.
+"""
+import numpy as np
+import pandas as pd
+
+POS_MOODS = ["Inspirerend","Motiverend","Actief","Verbonden","Respectvol","Gefocust","Veilig","Energiek"]
+NEG_MOODS = ["Demotiverend","Passief","Onrespectvol","Chaotisch","Afgeleid","Rumoerig","Onveilig"]
+VOCABULAIRE = {"Positief": POS_MOODS, "Negatief": NEG_MOODS}
+
+MASK_KOLOM = "TagMask"
+
+
+def bit_layout(vocabulaire=VOCABULAIRE):
+    """[(kolom, tag), ...] in bitvolgorde."""
+    layout = [(kolom, woord) for kolom, woorden in vocabulaire.items() for woord in woorden]
+    if len(layout) > 16:
+        raise ValueError(f"{len(layout)} tags passen niet in een 16-bit masker")
+    return layout
+
+
+def encode_tags(df, vocabulaire=VOCABULAIRE):
+    """
+    Bitmasker (uint16) per rij uit de tekstkolommen. Tags buiten de vocabulaire
+    vallen weg. Elke unieke tekst wordt maar één keer gesplitst (factorize).
+    """
+    mask = np.zeros(len(df), dtype=np.uint16)
+    bit = 0
+    for kolom, woorden in vocabulaire.items():
+        if kolom in df.columns:
+            bits = {woord: np.uint16(1 << (bit + i)) for i, woord in enumerate(woorden)}
+            codes, uniek = pd.factorize(df[kolom].fillna("").astype(str))
+            per_tekst = np.array(
+                [np.bitwise_or.reduce([bits.get(t.strip(), np.uint16(0)) for t in tekst.split(",")], dtype=np.uint16)
+                 for tekst in uniek], dtype=np.uint16)
+            if len(per_tekst):
+                mask |= per_tekst[codes]
+        bit += len(woorden)
+    return mask
+
+
+def decode_tags(mask, kolom, vocabulaire=VOCABULAIRE):
+    """Terug naar de werkbladvorm ('a, b') voor één kolom."""
+    layout = bit_layout(vocabulaire)
+    mask = int(mask)
+    return ", ".join(woord for i, (k, woord) in enumerate(layout) if k == kolom and mask >> i & 1)
+
+
+def tag_mask(df, vocabulaire=VOCABULAIRE):
+    """Het masker van df: de kolom TagMask als die volledig is, anders nu berekend."""
+    if MASK_KOLOM in df.columns and not df[MASK_KOLOM].isna().any():
+        return df[MASK_KOLOM].to_numpy(dtype=np.uint16)
+    return encode_tags(df, vocabulaire)
+
+
+def with_tag_mask(df, vocabulaire=VOCABULAIRE):
+    """df met (volledige) kolom TagMask; bij het inladen één keer oproepen."""
+    if MASK_KOLOM in df.columns and not df[MASK_KOLOM].isna().any():
+        return df
+    return df.assign(**{MASK_KOLOM: encode_tags(df, vocabulaire)})
+
+
+def multi_hot(mask, n_bits):
+    """uint8-matrix (rijen x n_bits) met een 1 voor elke gezette bit."""
+    mask = np.asarray(mask, dtype=np.uint16)
+    return ((mask[:, None] >> np.arange(n_bits, dtype=np.uint16)) & 1).astype(np.uint8)
+
+
+def tag_count_matrix(df, groep, vocabulaire=VOCABULAIRE):
+    """
+    (groepen, matrix): matrix[g, bit] = aantal lessen van groep g met die tag.
+    Eén np.bincount over de (groepcode, bit)-paren; groepen zijn gesorteerd.
+    """
+    layout = bit_layout(vocabulaire)
+    codes, groepen = pd.factorize(df[groep].astype(str), sort=True)
+    hot = multi_hot(tag_mask(df, vocabulaire), len(layout))
+    rij, bit = np.nonzero(hot)
+    paren = codes[rij].astype(np.int64) * len(layout) + bit
+    matrix = np.bincount(paren, minlength=len(groepen) * len(layout)).reshape(len(groepen), len(layout))
+    return list(groepen), matrix
+
+
+def tag_counts(df, groep=None, vocabulaire=VOCABULAIRE):
+    """
+    Aantal lessen per tag, als lange tabel [groep], Kolom, Tag, Aantal (enkel > 0).
+    groep: optionele kolomnaam (bv. 'Klas') om per groep te tellen.
+    """
+    layout = bit_layout(vocabulaire)
+    if groep is None:
+        matrix = multi_hot(tag_mask(df, vocabulaire), len(layout)).sum(axis=0, dtype=np.int64)[None, :]
+        groepen = [None]
+    else:
+        groepen, matrix = tag_count_matrix(df, groep, vocabulaire)
+    g_idx, t_idx = np.nonzero(matrix)
+    lang = pd.DataFrame({
+        "Kolom": [layout[t][0] for t in t_idx],
+        "Tag": [layout[t][1] for t in t_idx],
+        "Aantal": matrix[g_idx, t_idx].astype("int64"),
+    })
+    if groep is not None:
+        lang.insert(0, groep, [groepen[g] for g in g_idx])
+    return lang
@@ -0,0 +1,5 @@
+"""De modules van de app staan plat in de repo-root; maak ze importeerbaar voor pytest."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
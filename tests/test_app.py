@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import timing
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "reflectietool.py")
+
+
+@pytest.fixture
+def sessie(monkeypatch, tmp_path):
+    """
+    sessie(email) -> AppTest die automatisch inlogt (?user=) tegen de nep-Sheets.
+    Elke afgewerkte rerun komt in sessie.runs (via de JSON-log van timing.py).
+    """
+    for naam, waarde in dict(LKM_STORAGE="sheets", LKM_SHEETS_MODE="fake", LKM_FAKE_DATASET="klein",
+                             LKM_FAKE_LATENCY="0", LKM_TIMING_LOG="off").items():
+        monkeypatch.setenv(naam, waarde)
+    monkeypatch.chdir(tmp_path)
+    runs = []
+    monkeypatch.setattr(timing, "_log", runs.append)
+
+    def nieuw(email):
+        at = AppTest.from_file(APP, default_timeout=300)
+        at.query_params["user"] = email
+        return at
+
+    nieuw.runs = runs
+    return nieuw
+
+
+def top_spans(rerun):
+    return {s.pad for s in rerun.spans if s.diepte == 0}
+
+
+def test_director_tabs_are_fragments_that_rerun_cleanly(sessie):
+    at = sessie("directeur@school.test")
+    at.run()
+    assert not at.exception
+    volledig = sessie.runs[-1]
+    assert (volledig.rol, volledig.soort) == ("director", "script")
+    assert {"tab.klasstatistieken", "tab.welzijn", "tab.cultuur", "tab.eindrapporten"} <= top_spans(volledig)
+
+    # Filters van de tabbladen: geen fouten, en de figuren blijven er
+    grafieken = len(at.get("plotly_chart"))
+    klas = next(c for c in at.checkbox if c.key.startswith("s_chk_"))
+    klas.uncheck().run()
+    at.selectbox(key="w_filt").set_value("Volledig schooljaar").run()
+    at.radio(key="t1_per").set_value("Afgelopen maand").run()
+    assert not at.exception
+    assert len(at.get("plotly_chart")) == grafieken
+    assert at.checkbox(key=klas.key).value is False
+
+
+TEACHER_TABS = {"🧠 Daggevoel": "tab.daggevoel", "📝 Lesregistratie": "tab.lesregistratie",
+                "📊 Visualisaties": "tab.visualisaties", "📄 rapport genereren": "tab.rapport"}
+
+
+@pytest.mark.parametrize("label", list(TEACHER_TABS))
+def test_teacher_rerun_renders_only_the_open_tab(sessie, label):
+    at = sessie("leerkracht001@school.test")
+    at.run()
+    # AppTest kan niet op een tab klikken: de tabstatus zetten zoals de browser ze stuurt
+    at.session_state["teacher_tab"] = label
+    at.run()
+
+    assert not at.exception
+    spans = top_spans(sessie.runs[-1])
+    assert spans & set(TEACHER_TABS.values()) == {TEACHER_TABS[label]}
+    # Eigen daggevoel en lessen laden enkel voor Visualisaties en het rapport
+    laadt_data = {"data.daggevoel", "data.lessen"} <= spans
+    assert laadt_data == (TEACHER_TABS[label] in ("tab.visualisaties", "tab.rapport"))
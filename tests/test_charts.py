@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_sankey import referentie_links, synthetische_lessen
+from charts import NIVEAUS, draw_class_sankey, draw_sankey_butterfly, histogram_density, score_histograms
+from tags import tag_counts, with_tag_mask
+
+
+def nodes_en_links(fig):
+    sankey = fig.data[0]
+    return list(sankey.node.label), list(sankey.link.source), list(sankey.link.target), list(sankey.link.value)
+
+
+@pytest.mark.parametrize("n, seed", [(5000, 42), (40, 7), (1, 3)])
+def test_butterfly_sankey_matches_reference(n, seed):
+    df = synthetische_lessen(n, seed=seed)
+
+    assert nodes_en_links(draw_sankey_butterfly(df)) == referentie_links(df)
+    assert nodes_en_links(draw_sankey_butterfly(with_tag_mask(df))) == referentie_links(df)
+
+
+def test_class_sankey_from_counts_has_reference_nodes_and_links():
+    df = synthetische_lessen(2000)
+    klassen = sorted(df["Klas"].unique())
+    labels, *links = nodes_en_links(draw_class_sankey(tag_counts(df, "Klas"), klassen))
+    ref_labels, *ref_links = referentie_links(df)
+
+    # Zelfde nodes; de links komen uit de cube in een andere volgorde
+    assert labels == ref_labels
+    assert sorted(zip(*links)) == sorted(zip(*ref_links))
+
+
+def test_sankey_without_lessons_is_none():
+    assert draw_sankey_butterfly(synthetische_lessen(0)) is None
+
+
+# --- Violin/ridgeline uit histogrammen ---
+def rij_dichtheid(scores, x):
+    """Referentie: Gauss-KDE rechtstreeks over de ruwe scores (zoals go.Violin), genormaliseerd op 1."""
+    scores = np.asarray(scores, dtype=float)
+    std = scores.std(ddof=1) if len(scores) > 1 else 0.0
+    q1, q3 = np.quantile(scores, [0.25, 0.75], method="inverted_cdf")
+    spreiding = min(std, (q3 - q1) / 1.349) if q3 > q1 else std
+    bandbreedte = max(1.059 * spreiding * len(scores) ** -0.2, 0.15) if spreiding > 0 else 0.3
+    y = np.exp(-0.5 * ((x[None, :] - scores[:, None]) / bandbreedte) ** 2).sum(axis=0)
+    return y / y.max()
+
+
+def test_score_histograms_match_per_row_counts():
+    rnd = np.random.default_rng(1)
+    df = pd.DataFrame({"Klas": rnd.choice(["1A", "2B", "3C"], 500), "Lesaanpak": rnd.integers(1, 6, 500).astype(float)})
+    df.loc[:4, "Lesaanpak"] = [0, 6, np.nan, 2.4, 4.6]  # buiten 1-5 of geen geheel getal
+
+    geldig = df[df["Lesaanpak"].round().between(1, 5)]
+    verwacht = pd.crosstab(geldig["Klas"], geldig["Lesaanpak"].round().astype(int)).reindex(columns=NIVEAUS, fill_value=0)
+    hist = score_histograms(df, "Lesaanpak")
+
+    assert hist.index.tolist() == ["1A", "2B", "3C"]
+    assert np.array_equal(hist.to_numpy(), verwacht.to_numpy())
+    assert hist.to_numpy().sum() == len(df) - 3
+
+
+@pytest.mark.parametrize("scores", [[3] * 20, [1, 5], [1, 2, 2, 3, 3, 3, 4, 5], list(np.random.default_rng(2).integers(1, 6, 400))])
+def test_histogram_density_matches_per_row_kde(scores):
+    counts = np.bincount(scores, minlength=6)[1:]
+    x, y = histogram_density(counts)
+    volledig = np.linspace(0.5, 5.5, 81)
+    referentie = rij_dichtheid(scores, volledig)
+
+    zichtbaar = referentie >= 0.005
+    assert np.allclose(x, volledig[zichtbaar])
+    assert np.allclose(y, referentie[zichtbaar])
+
+
+def test_histogram_density_of_empty_histogram_is_empty():
+    x, y = histogram_density([0, 0, 0, 0, 0])
+    assert len(x) == len(y) == 0
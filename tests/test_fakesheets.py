@@ -0,0 +1,61 @@
+import json
+
+import pandas as pd
+import pytest
+
+from fakesheets import FakeApiError, FakeSheetsConnection, QuotaError, RecordingConnection, parse_latency, synthetic_school
+from storage import WS_DAG, WS_LESSEN, WS_USERS, SheetsStore
+
+
+def test_synthetic_school_is_reproducible_and_can_be_dirty():
+    een = synthetic_school(leerkrachten=3, dagen=5, einde="2025-01-10")
+    twee = synthetic_school(leerkrachten=3, dagen=5, einde="2025-01-10")
+
+    assert sorted(een) == ["0", "Lessons", "Users"]
+    assert all(een[tab].equals(twee[tab]) for tab in een)
+    assert een["Users"]["role"].tolist() == ["teacher"] * 3 + ["director"]
+    vuil = synthetic_school(leerkrachten=3, dagen=20, vuil=0.5, einde="2025-01-10")
+    assert (vuil["0"]["Datum"] == "onbekend").any()
+
+
+def test_parse_latency():
+    assert parse_latency("0.3") == (0.3, 0.3)
+    assert parse_latency("0.2-0.8") == (0.2, 0.8)
+    assert parse_latency(None) == (0.0, 0.0)
+
+
+def test_quota_is_per_minute_and_per_kind():
+    conn = FakeSheetsConnection({"Users": synthetic_school(1, 1)["Users"]}, quota_per_minute=2)
+    conn.read(worksheet="Users")
+    conn.read(worksheet="Users")
+    with pytest.raises(QuotaError, match="429"):
+        conn.read(worksheet="Users")
+    # Schrijven heeft een eigen budget
+    conn.update(worksheet="Users", data=conn.worksheet_frame("Users"))
+
+    assert (conn.stats["read"], conn.stats["update"], conn.stats["quota"]) == (2, 1, 1)
+
+
+def test_error_rate_raises_service_errors():
+    conn = FakeSheetsConnection({}, error_rate=1.0, seed=1)
+    with pytest.raises(FakeApiError, match="503"):
+        conn.read(worksheet=0)
+    assert conn.stats["error"] == 1
+
+
+def test_record_then_replay_gives_the_same_responses(tmp_path):
+    bron = FakeSheetsConnection(synthetic_school(leerkrachten=3, dagen=5, einde="2025-01-10"))
+    opname = RecordingConnection(bron, str(tmp_path))
+    store = SheetsStore(opname, "sheet")
+    gelezen = {ws: store.read(ws) for ws in (WS_USERS, WS_DAG, WS_LESSEN)}
+    store.append(WS_DAG, gelezen[WS_DAG].head(1))
+
+    oproepen = [json.loads(r) for r in (tmp_path / "calls.jsonl").read_text().splitlines()]
+    assert [o["op"] for o in oproepen] == ["read", "read", "read", "row_values", "append_rows"]
+    assert oproepen[-1]["rows"] == 1
+
+    replay = FakeSheetsConnection.from_recording(str(tmp_path))
+    opnieuw = SheetsStore(replay, "sheet")
+    for ws, df in gelezen.items():
+        pd.testing.assert_frame_equal(opnieuw.read(ws), df)
+    assert len(replay.latencies["read"]) == 4 and len(replay.latencies["write"]) == 1
@@ -0,0 +1,44 @@
+import plotly.graph_objects as go
+import plotly.io as pio
+import pytest
+from plotly.tools import return_figure_from_figure_or_data
+
+from figure_cache import FigureCache, GedeeldeFiguur
+
+
+def lijn():
+    fig = go.Figure(go.Scatter(x=[1, 2, 3], y=[3, 1, 2]))
+    fig.update_layout(height=300)
+    return fig
+
+
+def test_figure_cache_builds_once_and_keeps_none():
+    cache = FigureCache(max_entries=2)
+    fig = cache.get("trend", 1, ("30d",), lijn)
+    assert isinstance(fig, GedeeldeFiguur)
+    assert cache.get("trend", 1, ("30d",), lambda: 1 / 0) is fig
+    assert cache.get("leeg", 1, (), lambda: None) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_shared_figure_serializes_like_the_original_for_streamlit():
+    # Zoals st.plotly_chart: to_dict() van een Figure, daarna to_json zonder validatie
+    gedeeld = FigureCache().get("trend", 1, (), lijn)
+    naar_browser = lambda f: pio.to_json(return_figure_from_figure_or_data(f, True), validate=False)
+    assert naar_browser(gedeeld) == naar_browser(lijn())
+
+
+def test_shared_figure_is_read_only():
+    gedeeld = FigureCache().get("trend", 1, (), lijn)
+    with pytest.raises(AttributeError):
+        gedeeld.update_layout(height=500)
+    with pytest.raises(AttributeError):
+        gedeeld.layout.height = 500
+    with pytest.raises(AttributeError):
+        gedeeld.add_trace(go.Bar())
+    gedeeld.to_dict()["layout"]["height"] = 500
+    assert gedeeld.to_dict()["layout"]["height"] == 300
+
+    kopie = gedeeld.kopie()
+    kopie.update_layout(height=500)
+    assert kopie.layout.height == 500
@@ -0,0 +1,21 @@
+import pytest
+
+from benchmarks import import_budget
+
+
+@pytest.mark.parametrize("scenario", list(import_budget.GEBRUIKER))
+def test_cold_page_loads_no_forbidden_modules(scenario):
+    # Enkel wat geladen wordt; de tijd hangt van de machine af en meet het script zelf
+    resultaat = import_budget.meet(scenario)
+
+    assert resultaat["fout"] is None
+    assert set(resultaat["geladen"]) & set(import_budget.VERBODEN[scenario]) == set()
+
+
+def test_budget_check_reports_errors_modules_and_time():
+    resultaat = {"scenario": "login", "fout": "KeyError: 'x'", "geladen": ["reportlab"], "koud_ms": 2000}
+
+    assert import_budget.controleer(resultaat, {"login": 1300}) == [
+        "login: fout in de app: KeyError: 'x'", "login: laadt reportlab", "login: koude start 2000 ms > budget 1300 ms"]
+    assert import_budget.controleer(dict(resultaat, fout=None, geladen=["plotly.express"], koud_ms=900),
+                                    {"login": 1300}) == ["login: laadt plotly.express"]
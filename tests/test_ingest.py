@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from ingest import IngestCache, concat_typed, ingest, parse_datum
+from storage import WS_DAG, WS_LESSEN
+from tags import MASK_KOLOM, decode_tags
+
+
+def dagen(**kolommen):
+    n = len(next(iter(kolommen.values())))
+    basis = {"Email": ["a@school.test"] * n, "Datum": ["2025-01-06"] * n, "Energie": [3] * n, "Stress": [3] * n}
+    return pd.DataFrame({**basis, **kolommen})
+
+
+def lessen(klassen, positief=None):
+    n = len(klassen)
+    return pd.DataFrame({"Email": ["a@school.test"] * n, "Datum": ["2025-01-06"] * n, "Klas": klassen,
+                         "Lesaanpak": [4] * n, "Klasmanagement": [3] * n,
+                         "Positief": positief or [""] * n, "Negatief": [""] * n})
+
+
+def test_parse_datum_mixes_iso_and_day_first():
+    tekst = pd.Series(["2024-01-05 10:00:00", "2024-01-06", "2024-01-07 10:00:00.123456",
+                       "08/01/2024", " 9-1-2024 ", "", None, "gisteren"])
+
+    assert parse_datum(tekst).tolist()[:5] == [
+        pd.Timestamp("2024-01-05 10:00"), pd.Timestamp("2024-01-06"), pd.Timestamp("2024-01-07 10:00:00.123456"),
+        pd.Timestamp("2024-01-08"), pd.Timestamp("2024-01-09")]
+    assert parse_datum(tekst)[5:].isna().all()
+
+
+def test_scores_are_coerced_to_int8_and_invalid_rows_dropped_and_counted():
+    raw = dagen(Energie=["3", 4.0, 6, "x", 2.5, 5], Stress=[2, "5", 3, 3, 3, None],
+                Datum=["2025-01-06", "07/01/2025", "2025-01-08", "2025-01-09", "2025-01-10", "2025-01-11"])
+    raw.loc[5, "Rust"] = 4  # oude rij met enkel Rust
+    typed = ingest(WS_DAG, raw)
+
+    assert typed.dtypes.to_dict() == {"Email": "category", "Datum": "datetime64[ns]", "Energie": "int8",
+                                      "Stress": "int8", "Rust": "int8"}
+    assert typed["Energie"].tolist() == [3, 4, 5]
+    assert typed["Stress"].tolist() == [2, 5, 2]
+    assert typed["Rust"].tolist() == [4, 1, 4]
+    rapport = typed.attrs["ingest"]
+    assert (rapport.rows_in, rapport.rows_out, rapport.dropped) == (6, 3, {"energie": 3})
+
+
+def test_lessons_need_a_class_and_get_a_tag_mask():
+    typed = ingest(WS_LESSEN, lessen(["1A", " ", None, "2B "], positief=["Actief, Veilig", "", "", "Onbekend"]))
+
+    assert typed["Klas"].tolist() == ["1A", "2B"]
+    assert [decode_tags(m, "Positief") for m in typed[MASK_KOLOM]] == ["Actief, Veilig", ""]
+    assert typed.attrs["ingest"].dropped == {"klas": 2}
+
+
+def test_ingested_frame_refuses_in_place_writes():
+    typed = ingest(WS_DAG, dagen(Energie=[3, 4]))
+
+    with pytest.raises(ValueError, match="read-only"):
+        typed.loc[0, "Energie"] = 5
+    with pytest.raises(ValueError, match="read-only"):
+        typed["Email"].cat.codes.to_numpy()[0] = 1
+    # Een view op een kopie mag wel
+    kopie = typed.copy()
+    kopie.loc[0, "Energie"] = 5
+    assert typed["Energie"].tolist() == [3, 4]
+
+
+def test_concat_typed_keeps_categoricals_and_reports():
+    oud = ingest(WS_LESSEN, lessen(["1A", "2B"]))
+    nieuw = ingest(WS_LESSEN, lessen(["3C", None]))
+    samen = concat_typed(WS_LESSEN, oud, nieuw)
+
+    assert isinstance(samen["Klas"].dtype, pd.CategoricalDtype)
+    assert isinstance(samen["Email"].dtype, pd.CategoricalDtype)
+    assert samen["Klas"].tolist() == ["1A", "2B", "3C"]
+    assert samen[MASK_KOLOM].dtype == "uint16"
+    rapport = samen.attrs["ingest"]
+    assert (rapport.rows_in, rapport.rows_out, rapport.dropped) == (4, 3, {"klas": 1})
+    with pytest.raises(ValueError, match="read-only"):
+        samen.loc[0, "Lesaanpak"] = 1
+
+
+def test_ingest_cache_parses_each_raw_frame_once():
+    cache = IngestCache()
+    raw = dagen(Energie=[3])
+
+    assert cache.get(WS_DAG, raw) is cache.get(WS_DAG, raw)
+    assert cache.get(WS_DAG, raw.copy()) is not cache.get(WS_DAG, raw)
@@ -0,0 +1,41 @@
+import os
+
+import pandas as pd
+
+from storage import WS_DAG, LegacyCsvStore
+
+
+def schrijf(pad, rijen):
+    pd.DataFrame(rijen, columns=["Email", "Datum", "Energie", "Rust", "Stress"]).to_csv(pad, index=False)
+    # mtime expliciet verschuiven: twee schrijfacties binnen dezelfde tik blijven zo te onderscheiden
+    info = os.stat(pad)
+    os.utime(pad, ns=(info.st_atime_ns, info.st_mtime_ns + 1_000_000_000))
+
+
+def rij(email, dag):
+    return [email, f"2024-03-{dag:02d}", 3, 3, 3]
+
+
+def test_compacted_rows_follow_edits_and_deletes(tmp_path):
+    schrijf(tmp_path / "an_day.csv", [rij("an@school.test", 1), rij("an@school.test", 2)])
+    schrijf(tmp_path / "bo_day.csv", [rij("bo@school.test", 1)])
+    legacy = LegacyCsvStore(str(tmp_path))
+    assert legacy.compact(WS_DAG) == 2
+    assert len(LegacyCsvStore(str(tmp_path)).read(WS_DAG)) == 3
+
+    # Gewijzigd na het bundelen: de nieuwe CSV vervangt de gebundelde rijen
+    schrijf(tmp_path / "an_day.csv", [rij("an@school.test", d) for d in (1, 2, 3)])
+    df = legacy.read(WS_DAG)
+    assert len(df) == 4
+    assert sorted(df["Email"].value_counts().items()) == [("an@school.test", 3), ("bo@school.test", 1)]
+    assert "_bron" not in df.columns
+
+    # Verwijderd na het bundelen: de rijen verdwijnen mee
+    os.remove(tmp_path / "bo_day.csv")
+    assert legacy.read(WS_DAG)["Email"].unique().tolist() == ["an@school.test"]
+
+    # Opnieuw bundelen neemt de wijziging mee en laat de verwijderde rijen vallen
+    assert legacy.compact(WS_DAG) == 1
+    opnieuw = LegacyCsvStore(str(tmp_path)).read(WS_DAG)
+    assert len(opnieuw) == 3
+    assert opnieuw["Datum"].tolist() == ["2024-03-01", "2024-03-02", "2024-03-03"]
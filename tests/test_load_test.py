@@ -0,0 +1,52 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks import load_test
+
+
+def test_regression_check_flags_only_slower_p95():
+    baseline = {"tabs": {"leerkracht/Daggevoel": {"p95_ms": 100.0}, "directie/Welzijn": {"p95_ms": 200.0}}}
+    resultaat = {"tabs": {"leerkracht/Daggevoel": {"p95_ms": 130.0}, "directie/Welzijn": {"p95_ms": 240.0},
+                          "leerkracht/Rapport": {"p95_ms": 5000.0}}}
+
+    assert load_test.vergelijk(resultaat, baseline, 0.25) == [("leerkracht/Daggevoel", 100.0, 130.0)]
+    assert load_test.vergelijk(resultaat, baseline, 0.5) == []
+
+
+def test_step_records_duration_and_first_error():
+    class Pagina:
+        exception = []
+
+        def run(self):
+            pass
+
+    meting = load_test.Meting()
+    assert meting.stap("leerkracht", "Daggevoel", Pagina(), lambda: None)
+    assert not meting.stap("leerkracht", "Daggevoel", Pagina(), lambda: load_test._knop(SimpleNamespace(button=[]), "Opslaan"))
+
+    assert len(meting.duur[("leerkracht", "Daggevoel")]) == 2
+    assert meting.fouten[("leerkracht", "Daggevoel")] == 1
+    assert "knop 'Opslaan'" in meting.eerste_fout[("leerkracht", "Daggevoel")]
+
+
+def test_one_teacher_and_one_director_run_headless(monkeypatch, tmp_path):
+    # main() zet deze variabelen en wisselt van map; monkeypatch zet alles achteraf terug
+    for naam in ("LKM_STORAGE", "LKM_SHEETS_MODE", "LKM_FAKE_DATASET", "LKM_FAKE_LATENCY", "LKM_FAKE_QUOTA",
+                 "LKM_FAKE_ERROR_RATE", "LKM_FAKE_SEED", "LKM_TIMING_LOG"):
+        monkeypatch.setenv(naam, "")
+    monkeypatch.setenv("LKM_TIMING_LOG", "off")
+    monkeypatch.chdir(tmp_path)
+    opties = SimpleNamespace(teachers=1, directors=1, duration=0, ramp=0, dataset="klein", latency="0", quota=0,
+                             error_rate=0.0, think=(0, 0), pdf=0.0, nieuw=0.0, seed=42)
+
+    resultaat = load_test.main(opties)
+
+    tabs = resultaat["tabs"]
+    assert {"leerkracht/Inloggen", "leerkracht/Daggevoel", "leerkracht/Lesregistratie", "directie/Inloggen",
+            "directie/Statistieken", "directie/Welzijn"} <= set(tabs)
+    assert {naam: r["eerste_fout"] for naam, r in tabs.items() if r["fouten"]} == {}
+    assert resultaat["tellers"].get("login_mislukt", 0) == 0
+    assert all(r["verloren"] == 0 for r in resultaat["schrijven"].values())
+    assert resultaat["schrijven"]["Daggevoel"]["in_sheet"] == 1
@@ -0,0 +1,56 @@
+import threading
+
+import pandas as pd
+
+from rapport_jobs import ReportJobs, period_start, report_key
+
+
+def bouw(waarde, progress=None, problems=None):
+    return waarde
+
+
+def test_report_jobs_calls_on_evict_for_results_leaving_the_lru():
+    weg = []
+    jobs = ReportJobs(max_workers=1, max_entries=2, on_evict=lambda key, waarde: weg.append((key, waarde)))
+    for i in range(4):
+        jobs.submit(f"k{i}", bouw, f"v{i}").result(timeout=10)
+
+    assert weg == [("k0", "v0"), ("k1", "v1")]
+    assert sorted(jobs.values()) == ["v2", "v3"]
+
+
+def test_report_key_follows_content_not_identity():
+    df = pd.DataFrame({"Datum": ["2025-01-06", "2025-01-07"], "Energie": [3, 4]})
+
+    assert report_key("a@school.test", df, "Laatste 30 dagen") == report_key("a@school.test", df.copy(), "Laatste 30 dagen")
+    gewijzigd = df.copy()
+    gewijzigd.loc[1, "Energie"] = 5
+    assert report_key("a@school.test", gewijzigd, "Laatste 30 dagen") != report_key("a@school.test", df, "Laatste 30 dagen")
+    assert report_key("a@school.test", df, "Huidig Schooljaar") != report_key("a@school.test", df, "Laatste 30 dagen")
+
+
+def test_same_key_shares_one_job_and_problems_are_not_cached():
+    bezig = threading.Event()
+    oproepen = []
+
+    def traag(waarde, progress=None, problems=None):
+        oproepen.append(waarde)
+        bezig.wait(10)
+        problems.append("grafiek ontbreekt")
+        return waarde
+
+    jobs = ReportJobs(max_workers=2)
+    eerste = jobs.submit("k", traag, "pdf")
+    assert jobs.submit("k", traag, "pdf") is eerste
+    bezig.set()
+
+    assert eerste.result(timeout=10) == "pdf"
+    assert oproepen == ["pdf"]
+    assert eerste.problems == ["grafiek ontbreekt"]
+    assert jobs.get("k") is None
+
+
+def test_period_start_school_year_begins_in_september():
+    assert period_start("Huidig Schooljaar", pd.Timestamp("2025-03-10")) == pd.Timestamp("2024-09-01")
+    assert period_start("Huidig Schooljaar", pd.Timestamp("2025-10-10")) == pd.Timestamp("2025-09-01")
+    assert period_start("Laatste 2 weken", pd.Timestamp("2025-03-15")) == pd.Timestamp("2025-03-01")
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import plotly.graph_objects as go
+import pytest
+
+import render_pool
+from render_pool import PlotlyRenderPool, RenderError
+
+
+class NepRenderer:
+    """Staat in voor een kaleido-scope: telt exports, kan blokkeren of falen."""
+
+    def __init__(self, wacht=None, fout=None):
+        self.wacht = wacht
+        self.fout = fout
+        self.exports = 0
+        self.afgesloten = False
+
+    def transform(self, figuur, format=None, width=None, height=None, scale=None):
+        self.exports += 1
+        if self.wacht is not None:
+            self.wacht()
+        if self.fout is not None:
+            raise self.fout
+        return f"{format}:{width}x{height}".encode()
+
+    def _shutdown_kaleido(self):
+        self.afgesloten = True
+
+
+class NepFabriek:
+    """Vervangt _new_scope: elke nieuwe renderer is een NepRenderer met de huidige opties."""
+
+    def __init__(self):
+        self.gemaakt = []
+        self.opties = {}
+
+    def __call__(self):
+        self.gemaakt.append(NepRenderer(**self.opties))
+        return self.gemaakt[-1]
+
+
+@pytest.fixture
+def renderers(monkeypatch):
+    fabriek = NepFabriek()
+    monkeypatch.setattr(render_pool, "_new_scope", fabriek)
+    return fabriek
+
+
+def figuur(y=(1, 2, 3)):
+    return go.Figure(go.Bar(y=list(y)))
+
+
+def test_cache_key_depends_on_figure_and_export_settings(tmp_path, renderers):
+    pool = PlotlyRenderPool(size=1, cache_dir=str(tmp_path))
+
+    assert pool.render(figuur(), width=100, height=50) == b"png:100x50"
+    assert pool.render(figuur(), width=100, height=50) == b"png:100x50"
+    assert renderers.gemaakt[0].exports == 1
+    pool.render(figuur(), width=200, height=50)
+    pool.render(figuur((3, 2, 1)), width=100, height=50)
+    assert renderers.gemaakt[0].exports == 3
+    assert len(list(tmp_path.glob("*.png"))) == 3
+
+    # Een nieuwe pool op dezelfde map rastert niets opnieuw
+    PlotlyRenderPool(size=1, cache_dir=str(tmp_path)).render(figuur(), width=100, height=50)
+    assert len(renderers.gemaakt) == 1
+
+
+def test_timeout_replaces_the_stuck_renderer(renderers):
+    los = threading.Event()
+    renderers.opties["wacht"] = lambda: los.wait(10)
+    pool = PlotlyRenderPool(size=1, timeout=0.2)
+
+    with pytest.raises(RenderError, match="langer dan"):
+        pool.render(figuur())
+    los.set()
+    assert renderers.gemaakt[0].afgesloten
+
+    renderers.opties.clear()
+    assert pool.render(figuur((4,))) == b"png:NonexNone"
+    assert len(renderers.gemaakt) == 2
+
+
+def test_renderer_error_is_a_render_error_and_frees_the_slot(renderers):
+    renderers.opties["fout"] = ValueError("kapotte figuur")
+    pool = PlotlyRenderPool(size=1, timeout=5)
+
+    with pytest.raises(RenderError, match="ValueError: kapotte figuur"):
+        pool.render(figuur())
+    assert renderers.gemaakt[0].afgesloten
+
+    renderers.opties.clear()
+    assert pool.render(figuur()) == b"png:NonexNone"
+
+
+def test_close_waits_for_running_export(renderers):
+    bezig, los = threading.Event(), threading.Event()
+    renderers.opties["wacht"] = lambda: (bezig.set(), los.wait(10))
+    pool = PlotlyRenderPool(size=1, timeout=10)
+    resultaat = []
+    export = threading.Thread(target=lambda: resultaat.append(pool.render(figuur())))
+    export.start()
+    assert bezig.wait(10)
+
+    sluiter = threading.Thread(target=pool.close)
+    sluiter.start()
+    time.sleep(0.2)
+    assert sluiter.is_alive() and not renderers.gemaakt[0].afgesloten
+
+    los.set()
+    export.join(10)
+    sluiter.join(10)
+    assert resultaat == [b"png:NonexNone"]
+    assert renderers.gemaakt[0].afgesloten
+    with pytest.raises(RenderError, match="afgesloten"):
+        pool.render(figuur((9,)))
+
+
+def test_relative_cache_dir_survives_a_change_of_working_dir(tmp_path, monkeypatch, renderers):
+    monkeypatch.chdir(tmp_path)
+    pool = PlotlyRenderPool(size=1, cache_dir="png")
+    elders = tmp_path / "elders"
+    elders.mkdir()
+    monkeypatch.chdir(elders)
+    pool.render(figuur())
+
+    assert len(list((tmp_path / "png").glob("*.png"))) == 1
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rollup import Benchmarks, DaySeries, LessonCube
+from tags import VOCABULAIRE
+
+
+def lessen(*scores, klas="1A"):
+    return pd.DataFrame([{"Email": "a@school.test", "Datum": f"2025-01-{i + 6:02d}", "Klas": klas,
+                          "Lesaanpak": s, "Klasmanagement": s, "Positief": "", "Negatief": ""}
+                         for i, s in enumerate(scores)])
+
+
+def test_cube_sync_follows_content_version_not_row_count():
+    bron = {"df": lessen(2, 4), "versie": 1}
+    cube = LessonCube(VOCABULAIRE)
+    cube.sync(lambda: bron["versie"], lambda: bron["df"])
+    assert cube.summary()["Lesaanpak"] == 3
+
+    # Zelfde versie: niet opnieuw laden
+    cube.sync(lambda: bron["versie"], lambda: 1 / 0)
+
+    # Aangepaste rij, zelfde aantal rijen: nieuwe versie, dus herbouwd
+    bron.update(df=lessen(4, 4), versie=2)
+    cube.sync(lambda: bron["versie"], lambda: bron["df"])
+    assert cube.summary() == {"n": 2, "Lesaanpak": 4, "Klasmanagement": 4}
+
+
+def test_cube_add_frame_skips_rows_a_sync_already_loaded():
+    cube = LessonCube(VOCABULAIRE)
+    cube.sync(lambda: 1, lambda: lessen(2))
+    # Eigen append: de cube telt de rij op en kent daarna de nieuwe versie
+    cube.add_frame(lessen(4), source_version=2)
+    assert cube.summary()["n"] == 2
+    cube.sync(lambda: 2, lambda: 1 / 0)
+
+    # De sync zag de rij al (versie 3): de listener telt ze niet nog eens
+    cube.sync(lambda: 3, lambda: lessen(2, 4, 5))
+    cube.add_frame(lessen(5), source_version=3)
+    assert cube.summary()["n"] == 3
+
+
+def test_benchmark_report_has_school_and_per_class_means():
+    benchmarks = Benchmarks(LessonCube(VOCABULAIRE))
+    benchmarks.cube.sync(lambda: 1, lambda: pd.concat([lessen(2, 4), lessen(5, klas="2B")]))
+    rapport = benchmarks.report()
+
+    assert rapport["Lesaanpak"] == (2 + 4 + 5) / 3
+    assert rapport["klassen"] == {"1A": {"n": 2, "Lesaanpak": 3, "Klasmanagement": 3},
+                                  "2B": {"n": 1, "Lesaanpak": 5, "Klasmanagement": 5}}
+
+
+def daggevoel():
+    """Getypeerd daggevoel zoals SchoolData het deelt (meerdere leerkrachten per dag, gaten tussen de dagen)."""
+    from fakesheets import synthetic_school
+    from ingest import ingest
+    return ingest("Daggevoel", synthetic_school(leerkrachten=6, dagen=60, seed=7)["0"])
+
+
+DAG, UUR = pd.Timedelta(days=1), pd.Timedelta(hours=1)
+
+
+@pytest.mark.parametrize("start, end", [
+    (None, None), ("2000-01-01", None), (None, "2000-01-01"),
+    (-14 * DAG, None), (-28 * DAG, -14 * DAG), (-10 * DAG, -10 * DAG), (-3 * DAG - 12 * UUR, -DAG + 6 * UUR),
+])
+def test_day_series_windows_match_the_pandas_filter(start, end):
+    df = daggevoel()
+    laatste = df["Datum"].max().normalize()
+    # Timedelta-grenzen tellen terug vanaf de laatste dag met registraties
+    grens = lambda g: laatste + g if isinstance(g, pd.Timedelta) else g
+    start, end = grens(start), grens(end)
+
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["Datum"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["Datum"] < pd.Timestamp(end)
+    verwacht = df[mask]
+
+    uit = DaySeries.from_frame(df).summary(start, end)
+    assert uit["n"] == len(verwacht)
+    for s in DaySeries.SCORES:
+        if verwacht.empty:
+            assert np.isnan(uit[s])
+        else:
+            assert uit[s] == pytest.approx(verwacht[s].mean())
+
+
+@pytest.mark.parametrize("freq", ["D", "W", "M"])
+def test_day_series_trend_matches_groupby(freq):
+    df = daggevoel()
+    start = df["Datum"].max().normalize() - 40 * DAG
+    sel = df[df["Datum"] >= start]
+    periode = sel["Datum"].dt.normalize() if freq == "D" else sel["Datum"].dt.to_period(freq).dt.start_time
+    verwacht = sel.groupby(periode)[list(DaySeries.SCORES)].agg(["mean", "size"])
+
+    uit = DaySeries.from_frame(df).trend(start, freq=freq)
+    assert list(uit["Datum"]) == list(verwacht.index)
+    assert list(uit["n"]) == list(verwacht[("Energie", "size")])
+    for s in DaySeries.SCORES:
+        assert np.allclose(uit[s], verwacht[(s, "mean")])
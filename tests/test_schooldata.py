@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from fakesheets import FakeSheetsConnection
+from schooldata import SchoolData
+from storage import WS_DAG, WS_LESSEN, CachedStore, SheetsStore, SQLiteStore, WriteQueue
+
+
+def dag(email, datum, energie=3):
+    return pd.DataFrame({"Email": [email], "Datum": [datum], "Energie": [energie], "Rust": [3], "Stress": [3]})
+
+
+@pytest.fixture
+def school():
+    tab = pd.concat([dag("a@school.test", "2025-01-06"), dag("b@school.test", "2025-01-06")], ignore_index=True)
+    conn = FakeSheetsConnection({"0": tab})
+    # Geen achtergrond-refresh tijdens de test: enkel eigen schrijfacties veranderen de cache
+    store = CachedStore(SheetsStore(conn, "sheet"), max_age=3600)
+    return conn, store, SchoolData(store, worksheets=(WS_DAG, WS_LESSEN))
+
+
+def test_unchanged_version_is_not_read_or_parsed_again(school):
+    conn, store, data = school
+    eerste = data.frame(WS_DAG)
+    for _ in range(3):
+        assert data.frame(WS_DAG) is eerste
+        data.read_user(WS_DAG, "a@school.test")
+
+    assert data.stats["ingest"] == 1
+    assert conn.stats["read"] == 1
+
+
+def test_queued_append_shows_up_without_another_read(school):
+    conn, store, data = school
+    queue = WriteQueue(store, flush_interval=0.01)
+    queue.add_listener(data.on_append)
+    assert len(data.read_user(WS_DAG, "a@school.test")) == 1
+    reeks = data.day_series("a@school.test")
+    gelezen = []
+    lees = store.read
+    store.read = lambda ws: gelezen.append(ws) or lees(ws)
+
+    queue.submit(WS_DAG, dag("A@School.test", "2025-01-07", energie=5))
+    assert queue.flush(timeout=10)
+
+    rijen = data.read_user(WS_DAG, "a@school.test")
+    assert rijen["Energie"].tolist() == [3, 5]
+    assert rijen["Datum"].tolist() == [pd.Timestamp("2025-01-06"), pd.Timestamp("2025-01-07")]
+    assert len(data.read_user(WS_DAG, "b@school.test")) == 1
+    assert data.version(WS_DAG) == store.version(WS_DAG)
+    assert data.day_series("a@school.test") is not reeks
+    assert (data.stats["ingest"], data.stats["append"]) == (1, 1)
+    # SchoolData las de store niet opnieuw (de CachedStore mag zelf op de achtergrond verifiëren)
+    assert gelezen == []
+
+
+def test_sqlite_backend_is_only_reloaded_after_a_foreign_write(tmp_path):
+    pad = str(tmp_path / "lkm.db")
+    store = SQLiteStore(pad)
+    store.append(WS_DAG, dag("a@school.test", "2025-01-06"))
+    data = SchoolData(store, refresh_interval=0.001, worksheets=(WS_DAG,))
+
+    assert len(data.frame(WS_DAG)) == 1
+    data.frame(WS_DAG)
+    assert data.stats["ingest"] == 1
+
+    SQLiteStore(pad).append(WS_DAG, dag("b@school.test", "2025-01-06"))
+    assert len(data.frame(WS_DAG)) == 2
+    assert data.stats["ingest"] == 2
@@ -0,0 +1,227 @@
+import pandas as pd
+import pytest
+
+from fakesheets import FakeSheetsConnection
+from storage import (WS_DAG, WS_LESSEN, WS_USERS, CachedStore, EmailPartition, SheetsStore, SQLiteStore,
+                     StoreError, WriteQueue, copy_worksheets)
+
+
+def dag_rij(email="a@school.test", datum="2025-01-06", energie=3):
+    return pd.DataFrame({"Email": [email], "Datum": [datum], "Energie": [energie],
+                         "Rust": [3], "Stress": [3]})
+
+
+class GeheugenStore:
+    """Minimale backend: onthoudt elke append(); faalt voor e-mails in `weigeren`."""
+
+    def __init__(self, weigeren=()):
+        self.appends = []
+        self.weigeren = set(weigeren)
+
+    def append(self, worksheet, rows):
+        if self.weigeren & set(rows["Email"]):
+            raise ConnectionError("quota")
+        self.appends.append((worksheet, rows))
+
+
+def test_write_queue_dead_letters_failing_batch_and_keeps_flowing(tmp_path):
+    store = GeheugenStore(weigeren={"kapot@school.test"})
+    wq = WriteQueue(store, flush_interval=0.01, max_attempts=2, max_backoff=0.01,
+                    dead_letter_dir=str(tmp_path))
+    slecht = wq.submit(WS_DAG, dag_rij("kapot@school.test"))
+    assert wq.flush(timeout=10)
+    goed = wq.submit(WS_DAG, dag_rij())
+    assert wq.flush(timeout=10)
+
+    assert wq.committed(goed) and wq.failed(goed) is None
+    assert not wq.committed(slecht)
+    assert "ConnectionError" in wq.failed(slecht)
+    assert len(wq.dead_letters) == 1
+    assert len(store.appends) == 1
+    assert wq.pending(WS_DAG).empty
+    bewaard = list(tmp_path.glob("*.csv"))
+    assert len(bewaard) == 1
+    assert pd.read_csv(bewaard[0])["Email"].tolist() == ["kapot@school.test"]
+
+
+@pytest.mark.parametrize("fast_append", [True, False])
+def test_sheets_append_with_and_without_private_client(fast_append):
+    conn = FakeSheetsConnection({"0": dag_rij(datum="2025-01-06")}, fast_append=fast_append)
+    SheetsStore(conn, "sheet").append(WS_DAG, dag_rij(datum="2025-01-07"))
+
+    assert conn.worksheet_frame(0)["Datum"].tolist() == ["2025-01-06", "2025-01-07"]
+    assert conn.stats["append" if fast_append else "update"] == 1
+
+
+def test_sheets_append_falls_back_when_private_helper_changed():
+    conn = FakeSheetsConnection({"0": dag_rij(datum="2025-01-06")})
+    conn.client._select_worksheet = lambda worksheet: None  # andere signatuur
+    SheetsStore(conn, "sheet").append(WS_DAG, dag_rij(datum="2025-01-07"))
+
+    assert len(conn.worksheet_frame(0)) == 2
+    assert conn.stats["update"] == 1
+
+
+def test_sheets_append_follows_reordered_header():
+    conn = FakeSheetsConnection({"0": dag_rij(datum="2025-01-06")})
+    store = SheetsStore(conn, "sheet")
+    store.append(WS_DAG, dag_rij(datum="2025-01-07", energie=1))
+    # Iemand versleept kolommen in de sheet
+    conn.update(worksheet=0, data=conn.worksheet_frame(0)[["Energie", "Stress", "Rust", "Datum", "Email"]])
+    store.append(WS_DAG, dag_rij(datum="2025-01-08", energie=5))
+
+    df = conn.worksheet_frame(0)
+    assert list(df.columns) == ["Energie", "Stress", "Rust", "Datum", "Email"]
+    assert df["Datum"].tolist() == ["2025-01-06", "2025-01-07", "2025-01-08"]
+    assert df["Energie"].astype(int).tolist() == [3, 1, 5]
+    assert conn.stats["append"] == 2
+
+
+def cached_sheets(tabs):
+    conn = FakeSheetsConnection(tabs)
+    return conn, CachedStore(SheetsStore(conn, "sheet"), max_age=0)
+
+
+def test_cached_store_version_stays_on_unchanged_refresh():
+    conn, store = cached_sheets({"0": pd.concat([dag_rij(datum=d) for d in ("2025-01-06", "2025-01-07")])})
+    eerste = store.read(WS_DAG)
+    versie = store.version(WS_DAG)
+    for _ in range(3):
+        store._fetch(WS_DAG)
+    assert store.version(WS_DAG) == versie
+    assert store.read(WS_DAG) is eerste
+
+    # Zelfde aantal rijen, andere inhoud: wel een nieuwe versie
+    conn.update(worksheet=0, data=pd.concat([dag_rij(datum=d, energie=5) for d in ("2025-01-06", "2025-01-07")]))
+    store._fetch(WS_DAG)
+    assert store.version(WS_DAG) == versie + 1
+
+
+def test_cached_store_refresh_after_own_append_keeps_version():
+    # De sheet geeft de rijen anders getypeerd terug (lege tags als NaN): geen extra versie
+    les = pd.DataFrame([{"Email": "a@school.test", "Datum": "2025-01-06 10:00:00", "Klas": "1A",
+                         "Lesaanpak": 4, "Klasmanagement": 3, "Positief": "", "Negatief": "Onrustig"}])
+    conn, store = cached_sheets({"Lessons": les})
+    store.read(WS_LESSEN)
+    store.append(WS_LESSEN, les.assign(Datum="2025-01-07 10:00:00"))
+    versie = store.version(WS_LESSEN)
+    store._fetch(WS_LESSEN)
+    assert store.version(WS_LESSEN) == versie
+    assert len(store.read(WS_LESSEN)) == 2
+
+
+def test_write_queue_appends_each_row_once_to_cache_and_sheet():
+    conn, store = cached_sheets({"0": dag_rij(datum="2025-01-06")})
+    store.read(WS_DAG)
+    wq = WriteQueue(store, flush_interval=0.01)
+    tickets = [wq.submit(WS_DAG, dag_rij(email=f"l{i}@school.test", datum="2025-01-07")) for i in range(5)]
+    assert wq.flush(timeout=10)
+
+    assert all(wq.committed(t) for t in tickets)
+    assert conn.stats["append"] == 1
+    assert len(conn.worksheet_frame(0)) == 6
+    assert len(store.read(WS_DAG)) == 6
+    assert len(store.read_user(WS_DAG, "l3@school.test")) == 1
+
+
+# --- Partitie per leerkracht ---
+def test_email_partition_lookup_and_extend():
+    df = pd.concat([dag_rij("a@school.test", "2025-01-06"), dag_rij(" B@School.test", "2025-01-06"),
+                    dag_rij("A@school.test", "2025-01-07")], ignore_index=True)
+    partitie = EmailPartition(df, "Email")
+
+    assert partitie.rows_for(df, " a@SCHOOL.test")["Datum"].tolist() == ["2025-01-06", "2025-01-07"]
+    assert partitie.rows_for(df, "c@school.test").empty
+    assert list(partitie.rows_for(df, "c@school.test").columns) == list(df.columns)
+
+    nieuw = pd.concat([dag_rij("b@school.test", "2025-01-08"), dag_rij("c@school.test", "2025-01-08")],
+                      ignore_index=True)
+    partitie.extend(nieuw)
+    samen = pd.concat([df, nieuw], ignore_index=True)
+    assert partitie.rows_for(samen, "b@school.test")["Datum"].tolist() == ["2025-01-06", "2025-01-08"]
+    assert len(partitie.rows_for(samen, "c@school.test")) == 1
+    assert len(partitie) == 3 and partitie.n == 5
+
+
+def test_cached_store_read_user_includes_own_append():
+    conn, store = cached_sheets({"0": pd.concat([dag_rij("a@school.test"), dag_rij("b@school.test")],
+                                                ignore_index=True)})
+    assert len(store.read_user(WS_DAG, "a@school.test")) == 1
+    store.append(WS_DAG, dag_rij("A@school.test", "2025-01-07"))
+
+    assert store.read_user(WS_DAG, "a@school.test")["Datum"].tolist() == ["2025-01-06", "2025-01-07"]
+    assert len(store.read_user(WS_DAG, "b@school.test")) == 1
+
+
+# --- SQLite ---
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return SQLiteStore(str(tmp_path / "lkm.db"))
+
+
+def test_sqlite_normalises_email_on_write_and_lookup(sqlite_store):
+    sqlite_store.append(WS_DAG, dag_rij(email="  An.Peeters@School.TEST "))
+
+    assert sqlite_store.read(WS_DAG)["Email"].tolist() == ["an.peeters@school.test"]
+    assert len(sqlite_store.read_user(WS_DAG, "AN.PEETERS@school.test")) == 1
+    assert sqlite_store.read_user(WS_DAG, "iemand@school.test").empty
+
+
+def test_sqlite_keeps_mixed_date_formats(sqlite_store):
+    rijen = pd.concat([dag_rij(datum="2024-01-05 10:00:00"), dag_rij(datum="2024-01-06"),
+                       dag_rij(datum="2024-01-07 10:00:00.123456"), dag_rij(datum="2024-01-08 09:00:00"),
+                       dag_rij(datum="09/01/2024")], ignore_index=True)
+
+    assert sqlite_store.append(WS_DAG, rijen) == 5
+    assert sqlite_store.read(WS_DAG)["Datum"].tolist() == [
+        "2024-01-05 10:00:00", "2024-01-06 00:00:00", "2024-01-07 10:00:00.123456",
+        "2024-01-08 09:00:00", "2024-01-09 00:00:00"]
+
+
+def test_sqlite_refuses_batch_with_unparseable_date(sqlite_store):
+    rijen = pd.concat([dag_rij(datum="2024-01-05"), dag_rij(datum="gisteren")], ignore_index=True)
+
+    with pytest.raises(StoreError, match="gisteren"):
+        sqlite_store.append(WS_DAG, rijen)
+    assert sqlite_store.count(WS_DAG) == 0
+
+
+def test_sqlite_upsert_replaces_on_keys(sqlite_store):
+    sqlite_store.append(WS_DAG, pd.concat([dag_rij(datum="2024-01-05", energie=2),
+                                           dag_rij(datum="2024-01-06", energie=2)], ignore_index=True))
+    # Zelfde dag in een ander formaat en e-mail in hoofdletters: zelfde sleutel
+    aantal = sqlite_store.upsert(WS_DAG, pd.concat([dag_rij(email="A@School.test", datum="2024-01-05 00:00:00", energie=5),
+                                                    dag_rij(datum="2024-01-07", energie=4)], ignore_index=True))
+
+    df = sqlite_store.read_user(WS_DAG, "a@school.test")
+    assert aantal == 2
+    assert df["Datum"].str[:10].tolist() == ["2024-01-05", "2024-01-06", "2024-01-07"]
+    assert df["Energie"].tolist() == [5, 2, 4]
+
+
+def test_copy_worksheets_reports_rows_written(sqlite_store):
+    users = pd.DataFrame({"email": ["a@school.test", "A@school.test ", "b@school.test"],
+                          "password": ["x", "y", "z"], "role": ["teacher"] * 3})
+    conn = FakeSheetsConnection({"Users": users, "0": pd.concat([dag_rij(datum="2024-01-05"), dag_rij(datum="06/01/2024")],
+                                                                 ignore_index=True)})
+
+    aantallen = copy_worksheets(SheetsStore(conn, "sheet"), sqlite_store, (WS_USERS, WS_DAG, WS_LESSEN))
+
+    assert aantallen == {WS_USERS: 2, WS_DAG: 2, WS_LESSEN: 0}
+    assert sqlite_store.count(WS_USERS) == 2
+    assert sqlite_store.read_user(WS_USERS, "a@school.test")["password"].tolist() == ["y"]
+
+
+def test_sqlite_version_changes_only_on_writes(sqlite_store):
+    begin = sqlite_store.version(WS_DAG)
+    sqlite_store.read(WS_DAG)
+    assert sqlite_store.version(WS_DAG) == begin
+
+    sqlite_store.append(WS_DAG, dag_rij())
+    na_append = sqlite_store.version(WS_DAG)
+    assert na_append != begin
+    assert sqlite_store.version(WS_LESSEN)[1] == 0
+
+    # Schrijfactie van een ander proces (andere verbinding op hetzelfde bestand)
+    SQLiteStore(sqlite_store.path).append(WS_DAG, dag_rij(datum="2025-01-07"))
+    assert sqlite_store.version(WS_DAG) != na_append
@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from tags import MASK_KOLOM, NEG_MOODS, POS_MOODS, bit_layout, decode_tags, encode_tags, tag_counts, with_tag_mask
+
+
+def lessen(*paren, klas="1A"):
+    return pd.DataFrame({"Klas": klas, "Positief": [p for p, _ in paren], "Negatief": [n for _, n in paren]})
+
+
+def test_mask_round_trips_to_sheet_form():
+    df = lessen(("Actief, Veilig", "Rumoerig"), ("", "Passief, Onveilig"), ("Inspirerend", ""))
+    mask = encode_tags(df)
+
+    assert mask.dtype == "uint16"
+    assert [decode_tags(m, "Positief") for m in mask] == ["Actief, Veilig", "", "Inspirerend"]
+    assert [decode_tags(m, "Negatief") for m in mask] == ["Rumoerig", "Passief, Onveilig", ""]
+
+
+def test_every_tag_gets_its_own_bit():
+    alles = lessen((", ".join(POS_MOODS), ", ".join(NEG_MOODS)))
+
+    assert int(encode_tags(alles)[0]) == (1 << len(bit_layout())) - 1
+    assert decode_tags(encode_tags(alles)[0], "Positief") == ", ".join(POS_MOODS)
+
+
+def test_unknown_tags_spaces_and_missing_values_are_ignored():
+    df = lessen((" Actief ,Onbekend", None), ("Rumoerig", "Rumoerig"))
+    mask = encode_tags(df)
+
+    assert decode_tags(mask[0], "Positief") == "Actief"
+    assert decode_tags(mask[0], "Negatief") == ""
+    # Een negatieve tag in de kolom Positief telt niet als positief
+    assert decode_tags(mask[1], "Positief") == ""
+    assert decode_tags(mask[1], "Negatief") == "Rumoerig"
+
+
+def test_vocabulary_must_fit_in_sixteen_bits():
+    with pytest.raises(ValueError, match="16-bit"):
+        bit_layout({"Positief": [f"t{i}" for i in range(17)]})
+
+
+def test_tag_counts_match_explode_per_class():
+    df = pd.concat([lessen(("Actief, Veilig", "Rumoerig"), ("Actief", ""), klas="1A"),
+                    lessen(("Veilig", "Rumoerig, Chaotisch"), klas="2B")], ignore_index=True)
+    df = with_tag_mask(df)
+    assert MASK_KOLOM in df.columns
+
+    verwacht = []
+    for kolom in ("Positief", "Negatief"):
+        lang = df.assign(Tag=df[kolom].str.split(",")).explode("Tag")
+        lang["Tag"] = lang["Tag"].str.strip()
+        lang = lang[lang["Tag"] != ""]
+        verwacht.append(lang.groupby(["Klas", "Tag"]).size().rename("Aantal").reset_index().assign(Kolom=kolom))
+    verwacht = pd.concat(verwacht)[["Klas", "Kolom", "Tag", "Aantal"]]
+
+    sleutel = ["Klas", "Kolom", "Tag"]
+    assert tag_counts(df, "Klas").sort_values(sleutel).reset_index(drop=True).equals(
+        verwacht.sort_values(sleutel).reset_index(drop=True))
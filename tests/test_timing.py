@@ -0,0 +1,109 @@
+import json
+import logging
+
+import pytest
+
+import timing
+from timing import Rerun, TimingStats, current, finish, fragment, span, start_rerun
+
+
+@pytest.fixture(autouse=True)
+def geen_lopende_rerun():
+    yield
+    timing._huidig.rerun = None
+
+
+def run(sessie, rol, duren, stats):
+    """Een afgewerkte rerun met vaste duur per span (seconden)."""
+    rerun = Rerun(sessie, rol)
+    for naam, duur in duren.items():
+        rerun.record(naam, duur)
+    rerun.close()
+    rerun.duur = sum(duren.values())
+    stats.add(rerun)
+    return rerun
+
+
+def test_nested_spans_get_paths_and_depth():
+    rerun = start_rerun("s1", "teacher")
+    with span("tab.visualisaties"):
+        with span("chart.trend"):
+            pass
+    with span("pdf"):
+        pass
+    assert finish() is rerun
+
+    assert [(s.pad, s.diepte) for s in rerun.ordered()] == [
+        ("tab.visualisaties", 0), ("tab.visualisaties/chart.trend", 1), ("pdf", 0)]
+    assert rerun.status == "ok" and current() is None
+    assert rerun.table()["span"].str.strip().tolist() == ["tab.visualisaties", "chart.trend", "pdf"]
+
+
+def test_span_outside_a_rerun_records_nothing():
+    with span("achtergrond"):
+        pass
+    assert current() is None and finish() is None
+
+
+def test_stats_aggregate_per_role_and_span_over_sessions():
+    stats = TimingStats(window=3)
+    for i, ms in enumerate([10, 20, 30, 40]):
+        run(f"leerkracht{i}", "teacher", {"data": ms / 1000}, stats)
+    run("directie", "director", {"data": 0.5}, stats)
+
+    tabel = stats.percentiles("teacher").set_index("span")
+    # Enkel de laatste 3 metingen per (rol, span) tellen
+    assert tabel.loc["data", "n"] == 3
+    assert tabel.loc["data", "p50"] == 30.0
+    assert tabel.loc["data", "max"] == 40.0
+    assert set(stats.percentiles()["rol"]) == {"teacher", "director"}
+    assert stats.last("leerkracht3").spans[0].pad == "data"
+
+
+def test_unfinished_rerun_is_closed_as_interrupted():
+    stats = TimingStats()
+    eerste = start_rerun("s1", "teacher", stats)
+    tweede = start_rerun("s1", "teacher", stats)
+
+    assert eerste.status == "onderbroken"
+    assert stats.last("s1") is eerste
+    finish()
+    assert stats.last("s1") is tweede and tweede.status == "ok"
+
+
+def test_fragment_is_a_span_in_a_run_and_its_own_rerun_alone():
+    stats = TimingStats()
+
+    @fragment("tab.welzijn", "s1", "director", stats)
+    def welzijn():
+        return current()
+
+    start_rerun("s1", "director", stats)
+    binnen = welzijn()
+    finish()
+    assert binnen.soort == "script"
+    assert [s.pad for s in stats.last("s1").spans] == ["tab.welzijn"]
+
+    alleen = welzijn()
+    assert alleen.soort == "fragment" and alleen.klaar
+    assert stats.last("s1") is alleen
+    assert "<fragment>" in stats.percentiles("director")["span"].tolist()
+
+
+def test_finished_rerun_is_logged_as_one_json_line(caplog):
+    timing.configure_logging("off")
+    timing.logger.setLevel(logging.INFO)
+    timing.logger.propagate = True
+    try:
+        with caplog.at_level(logging.INFO, logger="lkm.timing"):
+            start_rerun("s1", "teacher")
+            with span("auth"):
+                pass
+            finish()
+    finally:
+        timing.configure_logging("off")
+        timing.logger.propagate = True
+
+    record = json.loads(caplog.records[-1].getMessage())
+    assert (record["sessie"], record["rol"], record["status"]) == ("s1", "teacher", "ok")
+    assert [s["span"] for s in record["spans"]] == ["auth"]
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from fakesheets import FakeSheetsConnection
+from storage import WS_USERS, SheetsStore
+from users import UserDirectory, UserExistsError
+
+
+def users_tab(*emails):
+    return pd.DataFrame({"email": list(emails), "password": ["h"] * len(emails), "role": ["teacher"] * len(emails)})
+
+
+def test_login_lookup_is_normalised_and_served_from_memory():
+    conn = FakeSheetsConnection({"Users": users_tab(" An@School.test ")})
+    users = UserDirectory(SheetsStore(conn, "sheet"))
+
+    assert users.get("AN@school.TEST")["email"] == "an@school.test"
+    assert users.get("an@school.test")["role"] == "teacher"
+    assert conn.stats["read"] == 1
+
+
+def test_register_is_visible_at_once_and_rejects_duplicates():
+    conn = FakeSheetsConnection({"Users": users_tab("an@school.test")})
+    users = UserDirectory(SheetsStore(conn, "sheet"))
+
+    users.register("Bert@School.test", "h2", "director")
+
+    assert users.get("bert@school.test") == {"email": "bert@school.test", "password": "h2", "role": "director"}
+    assert conn.worksheet_frame("Users")["email"].tolist() == ["an@school.test", "bert@school.test"]
+    with pytest.raises(UserExistsError):
+        users.register("BERT@school.test", "h3", "teacher")
+    assert len(users) == 2
+
+
+def test_unknown_email_reloads_at_most_once_per_interval():
+    conn = FakeSheetsConnection({"Users": users_tab("an@school.test")})
+    users = UserDirectory(SheetsStore(conn, "sheet"), miss_refresh=3600)
+    assert users.get("an@school.test") is not None
+    # Geregistreerd via een ander proces
+    SheetsStore(conn, "sheet").append(WS_USERS, users_tab("cis@school.test"))
+
+    assert users.get("cis@school.test") is None
+    users.miss_refresh = 0
+    assert users.get("cis@school.test") is not None
+    assert conn.stats["read"] == 2
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import wordclouds
+from wordclouds import WordcloudCache
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Vervangt het echte renderen: geeft een PNG-stand-in terug en onthoudt elke oproep."""
+    oproepen = []
+
+    def render(frequenties, width, height):
+        oproepen.append(frequenties)
+        return repr(sorted(frequenties)).encode()
+
+    monkeypatch.setattr(wordclouds, "render_wordcloud_png", render)
+    return oproepen
+
+
+A = [("Rust", "Positief", 3)]
+B = [("Lawaai", "Negatief", 1)]
+C = [("Rust", "Positief", 4)]
+
+
+def test_memory_lru_evicts_least_recently_used(renders):
+    cache = WordcloudCache(max_entries=2)
+    cache.get_png(A)
+    cache.get_png(B)
+    cache.get_png(A)  # A is nu het recentst gebruikt
+    cache.get_png(C)  # B valt eruit
+
+    assert len(renders) == 3
+    cache.get_png(A)
+    assert len(renders) == 3 and cache.hits == 2
+    cache.get_png(B)
+    assert len(renders) == 4
+
+
+def test_signature_ignores_order_but_not_counts():
+    cache = WordcloudCache()
+
+    assert cache.signature(A + B) == cache.signature(B + A)
+    assert cache.signature(A) != cache.signature(C)
+
+
+def test_disk_cache_survives_restart_and_drops_oldest_files(tmp_path, renders):
+    cache = WordcloudCache(max_entries=1, cache_dir=str(tmp_path), max_files=2)
+    png_a = cache.get_png(A)
+    cache.get_png(B)
+    pad = {naam: tmp_path / f"{cache.signature(freq)}.png" for naam, freq in (("A", A), ("B", B), ("C", C))}
+    os.utime(pad["A"], (1_000, 1_000))
+    os.utime(pad["B"], (2_000, 2_000))
+
+    # Nieuw proces, leeg geheugen: A komt van schijf (en wordt weer recent), B is nu het oudst
+    herstart = WordcloudCache(max_entries=1, cache_dir=str(tmp_path), max_files=2)
+    assert herstart.get_png(A) == png_a
+    assert len(renders) == 2
+    herstart.get_png(C)
+
+    assert len(renders) == 3
+    assert pad["A"].exists() and pad["C"].exists() and not pad["B"].exists()
+
+
+def test_relative_cache_dir_survives_a_change_of_working_dir(tmp_path, monkeypatch, renders):
+    monkeypatch.chdir(tmp_path)
+    cache = WordcloudCache(cache_dir="wolken")
+    elders = tmp_path / "elders"
+    elders.mkdir()
+    monkeypatch.chdir(elders)
+    cache.get_png(A)
+
+    assert len(list((tmp_path / "wolken").glob("*.png"))) == 1
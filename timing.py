@@ -0,0 +1,250 @@
+"""
+Tijdsmeting per rerun.
+
+Elke scriptrun (en elke fragment-rerun) is één Rerun met geneste spans: auth, data
+laden, elke tab, elke grafiek, de PDF. Na afloop gaat de run als één JSON-regel naar
+de logger 'lkm.timing' (met sessie en rol) en naar TimingStats, die per (rol, span)
+de laatste metingen bijhoudt voor percentielen over alle sessies heen.
+
+    rerun = start_rerun(sessie, rol, stats)
+    with span("data"):
+        ...
+    finish()
+
+span() buiten een rerun (achtergronddraden, batch, benchmarks) doet niets en kost
+bijna niets. Deze module kent Streamlit niet; reflectietool.py levert sessie en rol.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("lkm.timing")
+_huidig = threading.local()  # de lopende Rerun van deze (script)draad
+
+
+@dataclass
+class Span:
+    pad: str       # 'tab.visualisaties/chart.trend'
+    start: float   # seconden na de start van de rerun
+    duur: float    # seconden
+    diepte: int
+
+
+class Rerun:
+    def __init__(self, sessie, rol=None, soort="script"):
+        self.sessie = sessie
+        self.rol = rol
+        self.soort = soort
+        self.tijdstip = time.time()
+        self.status = "bezig"
+        self.duur = None
+        self.spans = []
+        self._start = time.perf_counter()
+        self._stapel = []
+
+    @property
+    def klaar(self):
+        return self.duur is not None
+
+    def record(self, naam, duur, start=None):
+        """Een al gemeten stuk (bv. een PDF-sectie uit een achtergrondjob) onder de huidige span."""
+        if start is None:
+            # Tijdstip van registreren: zo blijven achteraf toegevoegde stukken in hun volgorde
+            start = time.perf_counter() - self._start
+        self.spans.append(Span("/".join(self._stapel + [naam]), start, duur, len(self._stapel)))
+
+    def close(self, status="ok"):
+        if not self.klaar:
+            self.duur = time.perf_counter() - self._start
+            self.status = status
+        return self
+
+    def as_record(self):
+        return {
+            "ts": round(self.tijdstip, 3),
+            "sessie": self.sessie,
+            "rol": self.rol or "anoniem",
+            "soort": self.soort,
+            "status": self.status,
+            "ms": round((self.duur or 0) * 1000, 1),
+            "spans": [{"span": s.pad, "ms": round(s.duur * 1000, 1)} for s in self.ordered()],
+        }
+
+    def ordered(self):
+        """Spans in de volgorde waarin ze startten (ouder voor kind)."""
+        return sorted(self.spans, key=lambda s: (s.start, s.diepte))
+
+    def table(self):
+        """Uitsplitsing voor het debugpaneel: span, ms en aandeel in de hele run."""
+        totaal = self.duur or (time.perf_counter() - self._start)
+        return pd.DataFrame({
+            "span": [" " * s.diepte + s.pad.rsplit("/", 1)[-1] for s in self.ordered()],
+            "ms": [round(s.duur * 1000, 1) for s in self.ordered()],
+            "%": [round(100 * s.duur / totaal) if totaal else 0 for s in self.ordered()],
+        })
+
+
+class TimingStats:
+    """
+    Rollende metingen per (rol, span) over alle sessies van het proces, plus de laatst
+    afgewerkte en de nog lopende rerun per sessie. Thread-safe; één per proces.
+    """
+
+    def __init__(self, window=200, max_sessions=512):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._metingen = {}             # (rol, span) -> deque met seconden
+        self._laatste = OrderedDict()   # sessie -> laatst afgewerkte Rerun
+        self._open = {}                 # sessie -> lopende Rerun
+
+    def begin(self, rerun):
+        """Nieuwe run van een sessie; een vorige die nooit afliep (st.rerun, onderbroken) sluiten we af."""
+        with self._lock:
+            vorige = self._open.pop(rerun.sessie, None)
+            if rerun.soort == "script":
+                self._open[rerun.sessie] = rerun
+        if vorige is not None and not vorige.klaar:
+            self.add(vorige.close("onderbroken"))
+
+    def add(self, rerun):
+        rol = rerun.rol or "anoniem"
+        with self._lock:
+            if self._open.get(rerun.sessie) is rerun:
+                del self._open[rerun.sessie]
+            self._meet(rol, f"<{rerun.soort}>", rerun.duur)
+            for s in rerun.spans:
+                self._meet(rol, s.pad, s.duur)
+            self._laatste[rerun.sessie] = rerun
+            self._laatste.move_to_end(rerun.sessie)
+            while len(self._laatste) > self.max_sessions:
+                self._laatste.popitem(last=False)
+        _log(rerun)
+
+    def _meet(self, rol, pad, duur):
+        reeks = self._metingen.get((rol, pad))
+        if reeks is None:
+            reeks = self._metingen[(rol, pad)] = deque(maxlen=self.window)
+        reeks.append(duur)
+
+    def last(self, sessie):
+        with self._lock:
+            return self._laatste.get(sessie)
+
+    def percentiles(self, rol=None):
+        """p50/p95/max (ms) per span over de laatste `window` metingen."""
+        with self._lock:
+            reeksen = [(r, p, np.fromiter(d, float)) for (r, p), d in self._metingen.items() if rol in (None, r)]
+        rijen = [{"rol": r, "span": p, "n": len(d),
+                  "p50": round(float(np.percentile(d, 50)) * 1000, 1),
+                  "p95": round(float(np.percentile(d, 95)) * 1000, 1),
+                  "max": round(float(d.max()) * 1000, 1)} for r, p, d in reeksen if len(d)]
+        kolommen = ["rol", "span", "n", "p50", "p95", "max"]
+        return pd.DataFrame(rijen, columns=kolommen).sort_values(["rol", "p95"], ascending=[True, False],
+                                                                  ignore_index=True)
+
+
+# --- Rerun van de huidige draad ---
+def current():
+    """De lopende Rerun van deze draad, of None."""
+    rerun = getattr(_huidig, "rerun", None)
+    return rerun if rerun is not None and not rerun.klaar else None
+
+
+def start_rerun(sessie, rol=None, stats=None, soort="script"):
+    rerun = Rerun(sessie, rol, soort)
+    rerun.stats = stats
+    if stats is not None:
+        stats.begin(rerun)
+    _huidig.rerun = rerun
+    return rerun
+
+
+def finish(status="ok"):
+    """Sluit de lopende rerun van deze draad af (loggen + in de statistieken)."""
+    rerun = current()
+    if rerun is None:
+        return None
+    rerun.close(status)
+    if rerun.stats is not None:
+        rerun.stats.add(rerun)
+    else:
+        _log(rerun)
+    return rerun
+
+
+@contextmanager
+def span(naam):
+    rerun = current()
+    if rerun is None:
+        yield
+        return
+    rerun._stapel.append(naam)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duur = time.perf_counter() - start
+        rerun._stapel.pop()
+        rerun.record(naam, duur, start - rerun._start)
+
+
+def record(naam, duur):
+    """Al gemeten duur toevoegen aan de lopende rerun (niets als er geen is)."""
+    rerun = current()
+    if rerun is not None:
+        rerun.record(naam, duur)
+
+
+def fragment(naam, sessie, rol, stats):
+    """
+    Decorator voor st.fragment-functies. Binnen een volledige run is het een gewone
+    span; herlaadt enkel het fragment, dan meet het een eigen rerun (soort 'fragment').
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if current() is not None:
+                with span(naam):
+                    return fn(*args, **kwargs)
+            start_rerun(sessie, rol, stats, soort="fragment")
+            try:
+                with span(naam):
+                    return fn(*args, **kwargs)
+            finally:
+                finish()
+        return wrapper
+    return decorator
+
+
+# --- JSON-logs ---
+def _log(rerun):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(rerun.as_record(), ensure_ascii=False))
+
+
+def configure_logging(bestemming="stderr"):
+    """
+    JSON-regels van 'lkm.timing' naar stderr, naar een bestand (pad) of nergens ('off').
+    Meermaals oproepen vervangt de vorige handler.
+    """
+    for handler in [h for h in logger.handlers if getattr(h, "_lkm_timing", False)]:
+        logger.removeHandler(handler)
+        handler.close()
+    if not bestemming or str(bestemming).lower() in ("off", "uit", "0", "false"):
+        logger.setLevel(logging.WARNING)
+        return
+    handler = logging.StreamHandler() if bestemming == "stderr" else logging.FileHandler(bestemming, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler._lkm_timing = True
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
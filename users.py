@@ -0,0 +1,89 @@
+"""
+Gebruikersregister van de Leerkrachtenmonitor.
+
+Eén register per proces: een dict op genormaliseerd e-mailadres, één keer geladen
+uit het 'Users' werkblad. Inloggen is daardoor een dict-lookup en een rerun van een
+ingelogde gebruiker leest het werkblad niet opnieuw.
+"""
+import threading
+import time
+
+import pandas as pd
+
+from storage import WS_USERS, KOLOMMEN, normalize_email
+
+
+class UserExistsError(Exception):
+    pass
+
+
+class UserDirectory:
+    """
+    get(email) zoekt in het geheugen. Een onbekend adres triggert hoogstens één keer
+    per miss_refresh seconden een herlaadbeurt (iemand kan via een ander proces
+    geregistreerd zijn). register() schrijft naar de backend en werkt het register
+    meteen bij.
+    """
+
+    def __init__(self, store, miss_refresh=30.0):
+        self.store = store
+        self.miss_refresh = miss_refresh
+        self._lock = threading.Lock()
+        self._users = None
+        self._loaded_at = 0.0
+        self._store_version = None
+
+    def _backend_version(self):
+        version = getattr(self.store, "version", None)
+        return version(WS_USERS) if version else None
+
+    def refresh(self):
+        df = self.store.read(WS_USERS)
+        users = {}
+        for rec in df.reindex(columns=KOLOMMEN[WS_USERS]).to_dict("records"):
+            if pd.isna(rec["email"]):
+                continue
+            rec["email"] = normalize_email(rec["email"])
+            users[rec["email"]] = rec
+        with self._lock:
+            self._users = users
+            self._loaded_at = time.monotonic()
+            self._store_version = self._backend_version()
+        return users
+
+    def _ensure_loaded(self):
+        with self._lock:
+            loaded = self._users is not None
+            changed = self._store_version != self._backend_version()
+        if not loaded or changed:
+            self.refresh()
+
+    def get(self, email):
+        """Gebruiker als dict (kopie), of None."""
+        email = normalize_email(email)
+        self._ensure_loaded()
+        with self._lock:
+            rec = self._users.get(email)
+            stale = time.monotonic() - self._loaded_at > self.miss_refresh
+        if rec is None and stale:
+            rec = self.refresh().get(email)
+        return dict(rec) if rec is not None else None
+
+    def exists(self, email):
+        return self.get(email) is not None
+
+    def register(self, email, password_hash, role):
+        email = normalize_email(email)
+        if self.exists(email):
+            raise UserExistsError(email)
+        rec = {"email": email, "password": password_hash, "role": role}
+        # Append (geen herschrijving): twee gelijktijdige registraties overschrijven elkaar niet
+        self.store.append(WS_USERS, pd.DataFrame([rec], columns=KOLOMMEN[WS_USERS]))
+        with self._lock:
+            self._users[email] = rec
+            self._store_version = self._backend_version()
+        return dict(rec)
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._users)
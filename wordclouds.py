@@ -0,0 +1,119 @@
+"""
+Trefwoordenwolken voor de Positief/Negatief-tags.
+
+Met een vaste vocabulaire en random_state=42 hangt het beeld enkel af van de
+frequenties per tag. WordcloudCache bewaart daarom de gerenderde PNG onder een
+hash van die frequenties (LRU in het geheugen, met een kopie op schijf), zodat
+een rerun met dezelfde tags geen layout of rasterisatie meer doet.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from tags import tag_counts
+
+KLEUR_POSITIEF = "#2ecc71"
+KLEUR_NEGATIEF = "#e74c3c"
+
+
+def tag_frequencies(dataframe):
+    """
+    Telt de tags in Positief/Negatief (via het bitmasker). Geeft [(label, type, aantal), ...]
+    gesorteerd op label, of None als de kolommen ontbreken.
+    """
+    # Check of de kolommen bestaan
+    if "Positief" not in dataframe.columns or "Negatief" not in dataframe.columns:
+        return None
+    counts = tag_counts(dataframe).sort_values("Tag")
+    return [(r.Tag, r.Kolom, int(r.Aantal)) for r in counts.itertuples(index=False)]
+
+
+def render_wordcloud_png(frequenties, width=800, height=350):
+    """Wolk voor [(label, type, aantal), ...] als PNG-bytes (groen = positief, rood = negatief)."""
+    from wordcloud import WordCloud
+    import matplotlib.pyplot as plt
+
+    words_freq = {label: aantal for label, _, aantal in frequenties}
+    color_map = {label: (KLEUR_POSITIEF if soort == "Positief" else KLEUR_NEGATIEF) for label, soort, _ in frequenties}
+
+    wc = WordCloud(width=width, height=height, background_color="white", random_state=42).generate_from_frequencies(words_freq)
+    fig_wc, ax = plt.subplots(figsize=(10, 4))
+    ax.imshow(wc.recolor(color_func=lambda word, **kwargs: color_map.get(word, "black")), interpolation="bilinear")
+    ax.axis("off")
+    buf = io.BytesIO()
+    fig_wc.savefig(buf, format="png", dpi=100, bbox_inches="tight")
+    plt.close(fig_wc)
+    return buf.getvalue()
+
+
+class WordcloudCache:
+    """
+    LRU van gerenderde wolken: max_entries in het geheugen en (optioneel) hoogstens
+    max_files PNG's in cache_dir, zodat ook een herstart niets opnieuw moet renderen.
+    Op schijf verdwijnen de langst niet gebruikte bestanden eerst (mtime).
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, max_files=1000, width=800, height=350):
+        self.max_entries = max_entries
+        self.max_files = max_files
+        # Absoluut vastleggen: de cache leeft zo lang als het proces, ook als de werkmap wijzigt
+        self.cache_dir = os.path.abspath(cache_dir) if cache_dir else None
+        self.width, self.height = width, height
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def signature(self, frequenties):
+        h = hashlib.sha256(json.dumps(sorted(frequenties)).encode())
+        h.update(f"|{self.width}x{self.height}".encode())
+        return h.hexdigest()
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._entries[key] = png
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_png(self, frequenties):
+        """PNG voor deze frequenties; rendert enkel als hij nog niet gekend is."""
+        key = self.signature(frequenties)
+        with self._lock:
+            png = self._entries.get(key)
+            if png is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return png
+
+        path = os.path.join(self.cache_dir, f"{key}.png") if self.cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                png = f.read()
+            os.utime(path)
+            self.hits += 1
+        else:
+            png = render_wordcloud_png(frequenties, self.width, self.height)
+            self.misses += 1
+            if path:
+                with open(f"{path}.{threading.get_ident()}.tmp", "wb") as f:
+                    f.write(png)
+                os.replace(f"{path}.{threading.get_ident()}.tmp", path)
+                self._prune_disk()
+        self._remember(key, png)
+        return png
+
+    def _prune_disk(self):
+        bestanden = [os.path.join(self.cache_dir, n) for n in os.listdir(self.cache_dir) if n.endswith(".png")]
+        if len(bestanden) <= self.max_files:
+            return
+        bestanden.sort(key=os.path.getmtime)
+        for oud in bestanden[:len(bestanden) - self.max_files]:
+            try:
+                os.remove(oud)
+            except OSError:
+                pass